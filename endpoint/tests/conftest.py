@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# yos_endpoint lit sa configuration à l'import : environnement isolé avant tout import
+os.environ["ARCHIVES_DIR"] = tempfile.mkdtemp(prefix="yos-tests-")
+os.environ["YOS_API_KEY"] = "test-key"
+for _key in ("OPENAI_API_KEY", "NOTION_API_KEY", "PINECONE_API_KEY"):
+    os.environ.pop(_key, None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import yos_endpoint as y  # noqa: E402
+
+API_HEADERS = {"Authorization": "Bearer test-key"}
+
+def fake_embeddings(texts):
+    """Embeddings déterministes (un vecteur par texte), sans appel réseau."""
+    out = []
+    for text in texts:
+        rng = np.random.default_rng(abs(hash(text)) % (2 ** 32))
+        out.append(rng.standard_normal(y.EMBED_DIMENSION).tolist())
+    return out
+
+@pytest.fixture
+def yos(tmp_path, monkeypatch):
+    """Module yos_endpoint avec des stores neufs sous un ARCHIVES_DIR temporaire."""
+    archives = str(tmp_path)
+    monkeypatch.setattr(y, "ARCHIVES_DIR", archives)
+    monkeypatch.setattr(y, "SPOOL_DIR", os.path.join(archives, "spool"))
+    monkeypatch.setattr(y, "MMM_INDEX_FILE", os.path.join(archives, "mmm_index.json"))
+    monkeypatch.setattr(y, "_embed_cache", y._EmbeddingCache(os.path.join(archives, "embed.sqlite3"), 64))
+    monkeypatch.setattr(y, "_mmm_store", y._MMMStore(os.path.join(archives, "mmm_store"), y.EMBED_DIMENSION))
+    monkeypatch.setattr(y, "_mmm_ivf", y._MMMIvfStore(os.path.join(archives, "mmm_ivf"), y.EMBED_DIMENSION))
+    monkeypatch.setattr(y, "_mmm_lexical", y._MMMLexicalIndex(os.path.join(archives, "lexical.sqlite3")))
+    monkeypatch.setattr(y, "_mmm_manifest", y._MMMManifest(os.path.join(archives, "manifest.sqlite3")))
+    monkeypatch.setattr(y, "_archive_index", y._ArchiveIndex(os.path.join(archives, "archives.sqlite3")))
+    monkeypatch.setattr(y, "_push_fingerprints", y._PushFingerprints(os.path.join(archives, "pushes.sqlite3")))
+    monkeypatch.setattr(y, "_near_duplicates", y._NearDuplicateIndex(
+        os.path.join(archives, "near_dup.sqlite3"), y.NEAR_DUP_BANDS, y.NEAR_DUP_ROWS))
+    monkeypatch.setattr(y, "_blob_store", y._BlobStore(os.path.join(archives, "blobs"), "gzip"))
+    monkeypatch.setattr(y, "_search_cache", y._SearchCache(32, 60))
+    monkeypatch.setattr(y, "_mmm_jobs", y._MMMJobQueue(os.path.join(archives, "jobs.sqlite3"),
+                                                        {"index": y.mmm_index_record}))
+    monkeypatch.setattr(y, "_embed_texts", fake_embeddings)
+    return y
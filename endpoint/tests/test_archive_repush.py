@@ -0,0 +1,131 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import API_HEADERS
+
+TURNS = [f"Tour {i} : une réponse assez longue pour remplir la conversation." for i in range(12)]
+
+
+def _push(client, content, action="archive", turn_count=None):
+    resp = client.post("/api/archive", headers=API_HEADERS, json={
+        "title": "Conversation", "url": "https://chat.example/c/1", "source": "Claude",
+        "action": action, "content_full": content, "turn_count": turn_count,
+    })
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+@pytest.fixture
+def client(yos):
+    return TestClient(yos.app)
+
+
+def test_exact_repush_reuses_archive(client):
+    first = _push(client, "\n".join(TURNS[:6]), turn_count=6)
+    second = _push(client, "\n".join(TURNS[:6]), turn_count=6)
+    assert second["archive_id"] == first["archive_id"]
+    assert "already completed" in second["message"]
+
+
+def test_extended_repush_keeps_archive_id(client):
+    first = _push(client, "\n".join(TURNS[:6]), turn_count=6)
+    extended = _push(client, "\n".join(TURNS[:10]), turn_count=10)
+    assert extended["archive_id"] == first["archive_id"]
+    assert "extended" in extended["message"]
+    changed = _push(client, "Autre début\n" + "\n".join(TURNS[:10]), turn_count=11)
+    assert changed["archive_id"] != first["archive_id"]
+
+
+@pytest.fixture
+def upstreams(yos, monkeypatch):
+    """OpenAI et Notion simulés au niveau des helpers du module."""
+    state = {"insights_ok": True, "finalize_ok": True, "extended": 0}
+
+    async def fake_extract(content, title):
+        return {"summary": f"résumé {len(content)}", "decisions": [title]} if state["insights_ok"] else None
+
+    async def fake_create(item, insights=None, with_children=True, content=None, background_tasks=None):
+        return {"id": "page-1", "url": "https://notion.so/page-1"}
+
+    async def fake_finalize(page_id, item, insights=None, content=None):
+        return state["finalize_ok"]
+
+    async def fake_extend(page_id, item, insights, delta_insights, delta):
+        state["extended"] += 1
+        return True
+
+    monkeypatch.setattr(yos, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(yos, "NOTION_API_KEY", "secret-test")
+    monkeypatch.setattr(yos, "_extract_insights", fake_extract)
+    monkeypatch.setattr(yos, "create_notion_page", fake_create)
+    monkeypatch.setattr(yos, "finalize_notion_page", fake_finalize)
+    monkeypatch.setattr(yos, "extend_notion_page", fake_extend)
+    return state
+
+
+def test_failed_delta_insights_do_not_reappend_notion_blocks(client, upstreams):
+    _push(client, "\n".join(TURNS[:6]), action="push", turn_count=6)
+    upstreams["insights_ok"] = False
+    _push(client, "\n".join(TURNS[:10]), action="push", turn_count=10)
+    assert upstreams["extended"] == 0  # delta non envoyé : l'empreinte n'a pas avancé
+    upstreams["insights_ok"] = True
+    _push(client, "\n".join(TURNS[:10]), action="push", turn_count=10)
+    assert upstreams["extended"] == 1
+    assert "already completed" in _push(client, "\n".join(TURNS[:10]), action="push", turn_count=10)["message"]
+    assert upstreams["extended"] == 1
+
+
+def test_failed_notion_finalize_is_not_recorded_as_complete(client, upstreams):
+    upstreams["finalize_ok"] = False
+    first = _push(client, "\n".join(TURNS[:6]), action="push", turn_count=6)
+    retry = _push(client, "\n".join(TURNS[:6]), action="push", turn_count=6)
+    assert "already completed" not in retry["message"]
+    upstreams["finalize_ok"] = True
+    _push(client, "\n".join(TURNS[:6]), action="push", turn_count=6)
+    assert "already completed" in _push(client, "\n".join(TURNS[:6]), action="push", turn_count=6)["message"]
+    assert first["archive_id"]
+
+
+def test_partial_insights_are_not_recorded_as_complete(client, upstreams, yos, monkeypatch):
+    state = {"partial": True}
+
+    async def fake_extract(content, title):
+        insights = {"summary": "résumé", "decisions": [title]}
+        return dict(insights, partial=True) if state["partial"] else insights
+
+    monkeypatch.setattr(yos, "_extract_insights", fake_extract)
+    first = _push(client, "\n".join(TURNS[:6]), action="push", turn_count=6)
+    assert first["insights"]["partial"] is True
+    retry = _push(client, "\n".join(TURNS[:6]), action="push", turn_count=6)
+    assert "already completed" not in retry["message"]
+    state["partial"] = False
+    _push(client, "\n".join(TURNS[:6]), action="push", turn_count=6)
+    assert "already completed" in _push(client, "\n".join(TURNS[:6]), action="push", turn_count=6)["message"]
+
+
+def test_partial_delta_insights_are_not_appended(client, upstreams, yos, monkeypatch):
+    _push(client, "\n".join(TURNS[:6]), action="push", turn_count=6)
+
+    async def partial_extract(content, title):
+        return {"summary": "suite", "partial": True}
+
+    monkeypatch.setattr(yos, "_extract_insights", partial_extract)
+    _push(client, "\n".join(TURNS[:10]), action="push", turn_count=10)
+    assert upstreams["extended"] == 0
+
+
+def test_failed_map_segment_marks_insights_partial(yos, monkeypatch):
+    calls = []
+
+    async def fake_chat(system, user, max_tokens=1500):
+        calls.append(system)
+        if system == yos.PUSH_SYSTEM_PROMPT and "Segment 2/" in user:
+            raise RuntimeError("timeout")
+        return {"summary": "ok", "decisions": [str(len(calls))]}
+
+    monkeypatch.setattr(yos, "_chat_json", fake_chat)
+    content = "\n".join(["x" * 200] * (3 * yos.INSIGHTS_SEGMENT_CHARS // 200))
+    insights = yos.asyncio.run(yos._extract_insights(content, "Longue conversation"))
+    assert insights["partial"] is True
+    assert not yos._insights_complete(insights)
+    assert yos._insights_complete({"summary": "ok"})
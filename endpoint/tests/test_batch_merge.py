@@ -0,0 +1,35 @@
+import pytest
+
+
+def _hit(archive_id, score, **extra):
+    return dict({"archive_id": archive_id, "score": score, "title": archive_id}, **extra)
+
+
+@pytest.fixture
+def cluster(yos):
+    signature, shingles = yos.minhash_signature("Le même verbatim archivé deux fois. " * 20)
+    yos._near_duplicates.add("a1", signature, shingles, "c1")
+    yos._near_duplicates.add("a2", signature, shingles, "c1")
+
+
+def test_merged_results_collapse_across_queries(yos, cluster):
+    per_query = [[_hit("a1", 0.9), _hit("a3", 0.5)], [_hit("a2", 0.8, duplicates=["a4"])]]
+    merged = yos._merge_batch_results(per_query, collapse=True)
+    assert [r["archive_id"] for r in merged] == ["a1", "a3"]
+    assert merged[0]["duplicates"] == ["a2", "a4"]
+    assert per_query[1][0]["duplicates"] == ["a4"]  # résultats par requête inchangés
+
+
+def test_merged_results_keep_duplicates_without_collapse(yos, cluster):
+    per_query = [[_hit("a1", 0.9)], [_hit("a2", 0.8)]]
+    merged = yos._merge_batch_results(per_query)
+    assert [r["archive_id"] for r in merged] == ["a1", "a2"]
+
+
+def test_merge_ranks_instead_of_comparing_raw_scores(yos):
+    bm25 = [_hit("lex1", 12.0, backend="lexical"), _hit("lex2", 11.0, backend="lexical")]
+    cosine = [_hit("sem1", 0.9, backend="local-ivf"), _hit("lex2", 0.4, backend="local-ivf")]
+    merged = yos._merge_batch_results([bm25, cosine])
+    assert [r["archive_id"] for r in merged] == ["lex2", "lex1", "sem1"]
+    assert [r["backend"] for r in merged] == ["lexical", "lexical", "local-ivf"]
+    assert merged[0]["score"] == round(2 / (yos.MMM_RRF_K + 2), 6)
@@ -0,0 +1,26 @@
+import numpy as np
+
+
+def test_lru_keeps_float32_arrays_and_returns_lists(yos, tmp_path):
+    cache = yos._EmbeddingCache(str(tmp_path / "embed.sqlite3"), 2)
+    vector = np.random.default_rng(0).standard_normal(1536).tolist()
+    cache.put("m", "bonjour", vector)
+
+    (stored,) = cache._lru.values()
+    assert stored.dtype == np.float32
+    assert cache.stats()["memory_bytes"] == 1536 * 4
+
+    hit = cache.get("m", "bonjour")
+    assert isinstance(hit, list)
+    assert np.allclose(hit, vector, atol=1e-6)
+
+
+def test_lru_is_bounded_and_disk_hits_are_remembered(yos, tmp_path):
+    cache = yos._EmbeddingCache(str(tmp_path / "embed.sqlite3"), 2)
+    for i in range(3):
+        cache.put("m", f"t{i}", [float(i)] * 4)
+    assert len(cache._lru) == 2
+    assert cache.get("m", "t0") == [0.0] * 4
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get("m", "t0") == [0.0] * 4
+    assert cache.stats()["memory_hits"] == 1
@@ -0,0 +1,114 @@
+import time
+
+RECORD = {"archive_id": "a1", "title": "Plan de migration", "summary": "Passer le store en IVF"}
+
+
+def _run_next(queue):
+    job = queue._claim()
+    assert job is not None
+    queue._run(job)
+    return job[0]
+
+
+def _job(queue, job_id):
+    row = queue._db().execute("SELECT status, attempts, next_run_at, last_error FROM jobs WHERE id = ?",
+                              (job_id,)).fetchone()
+    return dict(zip(("status", "attempts", "next_run_at", "last_error"), row))
+
+
+def test_indexed_record_is_done(yos):
+    job_id = yos._mmm_jobs.enqueue("index", RECORD)
+    _run_next(yos._mmm_jobs)
+    assert _job(yos._mmm_jobs, job_id)["status"] == "done"
+    assert yos._mmm_store.count() == 1
+
+
+def test_transient_failure_is_retried_with_backoff(yos, monkeypatch):
+    monkeypatch.setattr(yos, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(yos, "_embed_texts", lambda texts: [None] * len(texts))
+    job_id = yos._mmm_jobs.enqueue("index", RECORD)
+    _run_next(yos._mmm_jobs)
+    job = _job(yos._mmm_jobs, job_id)
+    assert job["status"] == "queued"
+    assert job["attempts"] == 1
+    assert job["next_run_at"] > time.time()
+    assert yos._mmm_jobs.depth() == 1
+
+
+def test_transient_failure_gives_up_after_max_attempts(yos, monkeypatch):
+    monkeypatch.setattr(yos, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(yos, "MMM_JOB_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(yos, "_embed_texts", lambda texts: [None] * len(texts))
+    job_id = yos._mmm_jobs.enqueue("index", RECORD)
+    for _ in range(2):
+        _run_next(yos._mmm_jobs)
+        yos._mmm_jobs._db().execute("UPDATE jobs SET next_run_at = 0 WHERE id = ?", (job_id,))
+    assert _job(yos._mmm_jobs, job_id)["status"] == "failed"
+
+
+def test_missing_openai_key_fails_permanently(yos, monkeypatch):
+    monkeypatch.setattr(yos, "OPENAI_API_KEY", None)
+    monkeypatch.setattr(yos, "_embed_texts", lambda texts: [None] * len(texts))  # comportement sans clé
+    job_id = yos._mmm_jobs.enqueue("index", RECORD)
+    _run_next(yos._mmm_jobs)
+    job = _job(yos._mmm_jobs, job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 1
+    assert "OPENAI_API_KEY" in job["last_error"]
+    assert yos._mmm_jobs.depth() == 0
+    assert [r["archive_id"] for r in yos._mmm_lexical.search("migration", 5)] == ["a1"]
+
+
+def test_record_without_text_is_skipped(yos):
+    job_id = yos._mmm_jobs.enqueue("index", {"archive_id": "empty"})
+    _run_next(yos._mmm_jobs)
+    assert _job(yos._mmm_jobs, job_id)["status"] == "done"
+    assert yos._mmm_jobs.depth() == 0
+
+
+def test_unknown_job_kind_fails_permanently(yos):
+    job_id = yos._mmm_jobs.enqueue("reticulate", {})
+    _run_next(yos._mmm_jobs)
+    job = _job(yos._mmm_jobs, job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 1
+
+
+def test_enqueue_never_exceeds_capacity(yos, monkeypatch):
+    import threading
+
+    monkeypatch.setattr(yos, "MMM_QUEUE_MAX", 5)
+    accepted, rejected = [], []
+
+    def producer():
+        for _ in range(10):
+            try:
+                accepted.append(yos._mmm_jobs.enqueue("index", RECORD))
+            except yos._QueueFull:
+                rejected.append(1)
+
+    threads = [threading.Thread(target=producer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(accepted) == 5
+    assert len(rejected) == 35
+    assert yos._mmm_jobs.depth() == 5
+
+
+def test_rejected_indexing_is_reported_to_the_caller(yos, monkeypatch):
+    from fastapi.testclient import TestClient
+    from conftest import API_HEADERS
+
+    client = TestClient(yos.app)
+    body = {"title": "t", "source": "Claude", "action": "archive", "content_full": "bonjour"}
+    resp = client.post("/api/archive", headers=API_HEADERS, json=body)
+    assert resp.json()["mmm_indexed"] == "queued"
+
+    monkeypatch.setattr(yos, "_check_queue_capacity", lambda: None)  # file remplie entre-temps
+    monkeypatch.setattr(yos, "MMM_QUEUE_MAX", 1)
+    resp = client.post("/api/archive", headers=API_HEADERS, json=dict(body, content_full="autre"))
+    assert resp.status_code == 200
+    assert resp.json()["mmm_indexed"] == "rejected"
+    assert yos._mmm_jobs.depth() == 1
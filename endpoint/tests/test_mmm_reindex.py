@@ -0,0 +1,50 @@
+import json
+import os
+
+
+def _write_archive(y, archive_id, title, **extra):
+    record = {"archive_id": archive_id, "title": title, "source": "Claude",
+              "archived_at": "2026-01-02T03:04:05+00:00", **extra}
+    with open(os.path.join(y.ARCHIVES_DIR, f"{archive_id}.json"), "w", encoding="utf-8") as f:
+        json.dump(record, f)
+    return record
+
+
+def test_plan_classifies_new_changed_and_orphans(yos):
+    backend = yos._mmm_backend_name()
+    _write_archive(yos, "a1", "Premier")
+    _write_archive(yos, "a2", "Second")
+    plan = yos.mmm_reindex_plan(backend)
+    assert sorted(plan["new"]) == ["a1.json", "a2.json"]
+    assert yos.mmm_reindex(plan["new"], backend, plan) == 2
+
+    plan = yos.mmm_reindex_plan(backend)
+    assert plan["new"] == plan["changed"] == plan["orphans"] == []
+    assert plan["unchanged"] == 2
+
+    _write_archive(yos, "a1", "Premier, renommé")
+    os.remove(os.path.join(yos.ARCHIVES_DIR, "a2.json"))
+    plan = yos.mmm_reindex_plan(backend)
+    assert plan["changed"] == ["a1.json"]
+    assert plan["orphans"] == ["a2"]
+
+
+def test_push_only_archive_is_not_an_orphan(yos):
+    backend = yos._mmm_backend_name()
+    assert yos.mmm_index_record({"archive_id": "push-only-1", "title": "Push seul", "source": "Claude"})
+    assert yos._mmm_store.count() == 1
+
+    plan = yos.mmm_reindex_plan(backend)
+    assert plan["orphans"] == []
+    yos.mmm_reindex([], backend, plan)
+    assert yos._mmm_store.count() == 1
+    assert [r["archive_id"] for r in yos._mmm_lexical.search("push", 5)] == ["push-only-1"]
+
+
+def test_enqueued_local_archive_is_linked_to_its_file(yos):
+    record = _write_archive(yos, "local-1", "Archive locale")
+    yos._enqueue_mmm(record, None, os.path.join(yos.ARCHIVES_DIR, "local-1.json"))
+    kind, payload = yos._mmm_jobs._db().execute("SELECT kind, payload FROM jobs").fetchone()
+    assert yos.mmm_index_record(json.loads(payload))
+    os.remove(os.path.join(yos.ARCHIVES_DIR, "local-1.json"))
+    assert yos.mmm_reindex_plan(yos._mmm_backend_name())["orphans"] == ["local-1"]
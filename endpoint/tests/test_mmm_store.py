@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+
+def _vector(dim, seed):
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32).tolist()
+
+
+def test_dimension_change_starts_an_empty_generation(yos, tmp_path):
+    directory = str(tmp_path / "store")
+    store = yos._MMMStore(directory, 8)
+    store.upsert_many([(f"a{i}", {"archive_id": f"a{i}"}, _vector(8, i)) for i in range(3)])
+    assert store.count() == 3
+
+    reduced = yos._MMMStore(directory, 4)
+    assert reduced.count() == 0
+    reduced.upsert("b", {"archive_id": "b"}, _vector(4, 9))
+    hits = reduced.search(_vector(4, 9), top_k=1)
+    assert [entry["archive_id"] for _, entry in hits] == ["b"]
+
+    reopened = yos._MMMStore(directory, 4)
+    assert reopened.count() == 1
+
+
+def test_dimension_change_marks_manifest_entries_stale(yos, monkeypatch):
+    record = {"archive_id": "a1", "title": "t", "summary": "s", "local_file": "a1.json"}
+    with open(f"{yos.ARCHIVES_DIR}/a1.json", "w", encoding="utf-8") as f:
+        yos.json.dump(record, f)
+    assert yos._mmm_index_records([record]) == 1
+
+    monkeypatch.setattr(yos, "EMBED_MODEL_KEY", f"{yos.EMBED_MODEL}@768")
+    plan = yos.mmm_reindex_plan(yos._mmm_backend_name())
+    assert plan["stale"] == ["a1.json"]
+
+
+def _fill(store, ids, dim=8):
+    store.upsert_many([(a, {"archive_id": a}, _vector(dim, i)) for i, a in enumerate(ids)])
+
+
+def test_torn_append_is_cut_before_new_writes(yos, tmp_path):
+    directory = str(tmp_path / "store")
+    store = yos._MMMStore(directory, 8)
+    _fill(store, ["a0", "a1", "a2"])
+    # Crash au milieu d'un append : vecteur partiel et ligne de métadonnées sans fin
+    with open(store._vectors_path(0), "ab") as f:
+        f.write(b"\0" * 13)
+    with open(store._meta_path(0), "a", encoding="utf-8") as f:
+        f.write('{"archive_id": "torn", "ti')
+
+    recovered = yos._MMMStore(directory, 8)
+    assert recovered.count() == 3
+    _fill(recovered, [f"b{i}" for i in range(5)])
+    recovered.delete("a0")
+    assert recovered.count() == 7
+
+    reopened = yos._MMMStore(directory, 8)
+    assert reopened.count() == 7
+    assert sorted(e["archive_id"] for e in reopened.entries()) == ["a1", "a2"] + [f"b{i}" for i in range(5)]
+    assert os.path.getsize(reopened._vectors_path(0)) == 8 * 8 * 4
+    hits = reopened.search(_vector(8, 4), top_k=1)
+    assert [entry["archive_id"] for _, entry in hits] == ["b4"]
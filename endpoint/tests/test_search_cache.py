@@ -0,0 +1,103 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import API_HEADERS, fake_embeddings
+
+RECORD = {"archive_id": "a1", "title": "Plan de migration", "summary": "Passer le store en IVF"}
+
+
+@pytest.fixture
+def client(yos):
+    yos.mmm_index_records([RECORD])
+    return TestClient(yos.app)
+
+
+@pytest.fixture
+def embeddings_up(yos, monkeypatch):
+    async def embed(text):
+        return fake_embeddings([text])[0]
+    monkeypatch.setattr(yos, "_embed_text_async", embed)
+
+
+def _search(client, query, **params):
+    resp = client.post("/api/mmm/search", json=dict(query=query, **params), headers=API_HEADERS)
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def test_semantic_response_is_cached(yos, client, embeddings_up):
+    first = _search(client, "migration")
+    assert first["results"][0]["archive_id"] == "a1"
+    assert _search(client, "migration") == first
+    stats = yos._search_cache.stats()
+    assert stats["entries"] == 1
+    assert stats["hits"] == 1
+
+
+@pytest.mark.parametrize("query,count", [("migration", 1), ("introuvable", 0)])
+def test_lexical_fallback_is_not_cached(yos, client, query, count):
+    # Sans clé OpenAI, la requête n'a pas d'embedding : bascule lexicale
+    assert _search(client, query)["count"] == count
+    response = _search(client, query)
+    assert response["count"] == count
+    assert response["degraded"] is True
+    stats = yos._search_cache.stats()
+    assert stats["entries"] == 0
+    assert stats["hits"] == 0
+
+
+def test_explicit_lexical_mode_is_cached(yos, client):
+    assert _search(client, "introuvable", mode="lexical")["count"] == 0
+    _search(client, "introuvable", mode="lexical")
+    assert yos._search_cache.stats()["hits"] == 1
+
+
+def test_fallback_recovers_once_embeddings_return(yos, client, monkeypatch):
+    _search(client, "migration")
+    async def embed(text):
+        return fake_embeddings([text])[0]
+    monkeypatch.setattr(yos, "_embed_text_async", embed)
+    results = _search(client, "migration")["results"]
+    assert results[0]["backend"] != "lexical"
+
+
+@pytest.mark.parametrize("path,body", [
+    ("/api/mmm/search", {"query": "migration"}),
+    ("/api/mmm/search/batch", {"queries": ["migration"]}),
+])
+@pytest.mark.parametrize("nprobe", [0, -3])
+def test_nprobe_must_be_positive(client, path, body, nprobe):
+    resp = client.post(path, json=dict(body, nprobe=nprobe), headers=API_HEADERS)
+    assert resp.status_code == 422
+
+
+class _Match:
+    def __init__(self, archive_id):
+        self.id, self.score, self.metadata = archive_id, 0.9, {"title": archive_id}
+
+
+class _PineconeIndex:
+    def query(self, **kwargs):
+        return type("Resp", (), {"matches": [_Match("a1")]})()
+
+
+def test_local_fallback_during_pinecone_outage_is_not_cached(yos, client, embeddings_up, monkeypatch):
+    monkeypatch.setattr(yos, "_PINECONE_AVAILABLE", True)
+    monkeypatch.setattr(yos, "PINECONE_API_KEY", "pc-test")
+    monkeypatch.setattr(yos, "_get_pinecone_index", lambda: None)  # disjoncteur ouvert
+    degraded = _search(client, "migration")
+    assert degraded["degraded"] is True
+    assert degraded["results"][0]["backend"] == "json-fallback"
+    assert yos._search_cache.stats()["entries"] == 0
+
+    monkeypatch.setattr(yos, "_get_pinecone_index", lambda: _PineconeIndex())  # Pinecone rétabli
+    recovered = _search(client, "migration")
+    assert "degraded" not in recovered
+    assert recovered["results"][0]["backend"] == "pinecone"
+    assert yos._search_cache.stats()["entries"] == 1
+
+
+def test_local_store_without_pinecone_is_not_degraded(yos, client, embeddings_up):
+    response = _search(client, "migration")
+    assert "degraded" not in response
+    assert yos._search_cache.stats()["entries"] == 1
@@ -0,0 +1,40 @@
+from conftest import fake_embeddings
+
+RECORDS = [
+    {"archive_id": "utc", "title": "Plan de migration", "summary": "migration IVF",
+     "archived_at": "2024-05-01T23:30:00+00:00"},
+    {"archive_id": "paris", "title": "Plan de migration bis", "summary": "migration IVF",
+     "archived_at": "2024-05-02T00:30:00+02:00"},  # 2024-05-01T22:30Z
+]
+
+
+def _lexical_ids(yos, filters):
+    return sorted(r["archive_id"] for r in yos._mmm_lexical.search("migration", 10, filters))
+
+
+def _vector_ids(yos, filters):
+    query = fake_embeddings(["migration"])[0]
+    return sorted(r["archive_id"] for r in yos.mmm_search_by_vector(query, 10, None, filters))
+
+
+def test_lexical_and_vector_date_windows_agree(yos):
+    yos.mmm_index_records(RECORDS)
+    for date_from, date_to, expected in [
+        ("2024-05-01T23:00:00+00:00", None, ["utc"]),
+        ("2024-05-02T01:00:00+02:00", None, ["utc"]),
+        (None, "2024-05-01T23:00:00Z", ["paris"]),
+        (None, "2024-05-01", ["paris", "utc"]),
+        ("2024-05-02", None, []),
+    ]:
+        filters = yos._search_filters(date_from=date_from, date_to=date_to)
+        assert _lexical_ids(yos, filters) == expected, (date_from, date_to)
+        assert _vector_ids(yos, filters) == expected, (date_from, date_to)
+
+
+def test_lexical_index_without_timestamps_is_backfilled(yos):
+    yos.mmm_index_records(RECORDS)
+    path = yos._mmm_lexical.db_path
+    yos._mmm_lexical._db().execute("ALTER TABLE doc_ids DROP COLUMN archived_ts")
+    reopened = yos._MMMLexicalIndex(path)
+    filters = yos._search_filters(date_from="2024-05-01T23:00:00Z")
+    assert [r["archive_id"] for r in reopened.search("migration", 10, filters)] == ["utc"]
@@ -0,0 +1,68 @@
+import gzip
+import os
+import zlib
+
+import pytest
+import zstandard
+from fastapi.testclient import TestClient
+
+from conftest import API_HEADERS
+
+PARAMS = {"title": "t", "source": "claude", "action": "archive"}
+
+
+@pytest.fixture
+def client(yos, monkeypatch):
+    monkeypatch.setattr(yos, "MAX_CONTENT_BYTES", 4 * 1024 * 1024)
+    return TestClient(yos.app)
+
+
+def _post(client, body, encoding):
+    headers = dict(API_HEADERS, **{"Content-Encoding": encoding})
+    return client.post("/api/archive/stream", params=PARAMS, content=body, headers=headers)
+
+
+def _spool_is_empty(yos):
+    return not os.path.isdir(yos.SPOOL_DIR) or not os.listdir(yos.SPOOL_DIR)
+
+
+@pytest.mark.parametrize("compress,encoding", [
+    (gzip.compress, "gzip"),
+    (zlib.compress, "deflate"),
+    (lambda b: zstandard.ZstdCompressor().compress(b), "zstd"),
+])
+def test_decompression_bomb_is_rejected(yos, client, compress, encoding):
+    bomb = compress(b"\0" * (64 * 1024 * 1024))
+    assert len(bomb) < 1024 * 1024
+    resp = _post(client, bomb, encoding)
+    assert resp.status_code == 413
+    assert _spool_is_empty(yos)
+
+
+def test_inflate_output_is_bounded(yos):
+    bomb = zstandard.ZstdCompressor().compress(b"\0" * (64 * 1024 * 1024))
+    pieces = yos._inflate(yos._body_decompressor("zstd"), bomb)
+    assert max(len(p) for p in pieces) <= 4 * 1024 * 1024
+    pieces = yos._inflate(yos._body_decompressor("gzip"), gzip.compress(b"\0" * (16 * 1024 * 1024)))
+    assert max(len(p) for p in pieces) <= yos.BODY_INFLATE_STEP
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_corrupt_body_is_a_client_error(yos, client, encoding):
+    resp = _post(client, b"definitely not compressed" * 10, encoding)
+    assert resp.status_code == 400
+    assert _spool_is_empty(yos)
+
+
+def test_unknown_encoding_is_unsupported(client):
+    assert _post(client, b"x", "br").status_code == 415
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_compressed_body_is_archived(yos, client, encoding):
+    text = "Bonjour YOS. " * 100_000
+    body = gzip.compress(text.encode()) if encoding == "gzip" else zstandard.ZstdCompressor().compress(text.encode())
+    resp = _post(client, body, encoding)
+    assert resp.status_code == 200, resp.text
+    archive_id = resp.json()["archive_id"]
+    assert os.path.exists(os.path.join(yos.ARCHIVES_DIR, f"{archive_id}.json"))
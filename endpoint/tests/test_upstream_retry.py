@@ -0,0 +1,126 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+
+def _upstream(yos, statuses, calls):
+    def handler(request):
+        calls.append(request.method)
+        status = statuses.pop(0) if statuses else 200
+        return httpx.Response(status, headers={"Retry-After": "0"}, json={})
+
+    upstream = yos._AsyncUpstream("https://upstream.test", 2, dict, max_retries=3)
+    upstream._client = httpx.AsyncClient(base_url=upstream.base_url,
+                                         transport=httpx.MockTransport(handler))
+    return upstream
+
+
+@pytest.mark.parametrize("status", [502, 503, 504])
+def test_post_is_not_replayed_after_gateway_error(yos, status):
+    calls = []
+    upstream = _upstream(yos, [status], calls)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(upstream.request("POST", "/pages", timeout=5, json={}))
+    assert calls == ["POST"]
+    assert upstream.retries == 0
+
+
+def test_non_idempotent_patch_is_not_replayed_after_gateway_error(yos):
+    calls = []
+    upstream = _upstream(yos, [503], calls)
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(upstream.request("PATCH", "/blocks/x/children", timeout=5, idempotent=False, json={}))
+    assert calls == ["PATCH"]
+
+
+@pytest.mark.parametrize("method,idempotent", [("POST", None), ("PATCH", False)])
+def test_non_idempotent_request_is_replayed_after_429(yos, method, idempotent):
+    calls = []
+    upstream = _upstream(yos, [429], calls)
+    resp = asyncio.run(upstream.request(method, "/x", timeout=5, idempotent=idempotent, json={}))
+    assert resp.status_code == 200
+    assert calls == [method, method]
+
+
+def test_idempotent_request_is_replayed_after_gateway_error(yos):
+    calls = []
+    upstream = _upstream(yos, [503, 502], calls)
+    resp = asyncio.run(upstream.request("PATCH", "/pages/x", timeout=5, json={}))
+    assert resp.status_code == 200
+    assert calls == ["PATCH", "PATCH", "PATCH"]
+    assert upstream.retries == 2
+
+
+class _FakeNotionPage:
+    """Enfants d'une page ; chaque PATCH suit le script : "ok", "lost" (5xx, non
+    appliqué) ou "applied" (5xx renvoyé après écriture)."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.children = []
+        self.patches = 0
+
+    def handler(self, request):
+        if request.method == "PATCH":
+            self.patches += 1
+            outcome = self.script.pop(0) if self.script else "ok"
+            added = []
+            if outcome != "lost":
+                for block in json.loads(request.content)["children"]:
+                    added.append(dict(block, id=f"b{len(self.children)}"))
+                    self.children.append(added[-1])
+            if outcome == "ok":
+                return httpx.Response(200, json={"results": added})
+            return httpx.Response(502, json={})
+        start = 0
+        cursor = request.url.params.get("start_cursor")
+        if cursor:
+            start = next(i for i, b in enumerate(self.children) if b["id"] == cursor)
+        size = int(request.url.params.get("page_size", 100))
+        page = self.children[start:start + size]
+        more = start + size < len(self.children)
+        return httpx.Response(200, json={"results": page, "has_more": more,
+                                         "next_cursor": self.children[start + size]["id"] if more else None})
+
+
+@pytest.fixture
+def notion(yos, monkeypatch):
+    def make(script):
+        page = _FakeNotionPage(script)
+        upstream = yos._AsyncUpstream("https://notion.test", 2, dict, max_retries=3)
+        upstream._client = httpx.AsyncClient(base_url=upstream.base_url,
+                                             transport=httpx.MockTransport(page.handler))
+        monkeypatch.setattr(yos, "_notion_http", upstream)
+        return page
+    return make
+
+
+def _paragraphs(n, prefix="p"):
+    return [{"object": "block", "type": "paragraph",
+             "paragraph": {"rich_text": [{"type": "text", "text": {"content": f"{prefix}{i}"}}]}}
+            for i in range(n)]
+
+
+def test_append_is_not_replayed_when_the_write_was_applied(yos, notion):
+    page = notion(["ok", "applied"])
+    assert asyncio.run(yos.append_notion_blocks("page", _paragraphs(250))) == 250
+    assert len(page.children) == 250
+    assert page.patches == 3
+    assert [yos._block_signature(b)[1] for b in page.children] == [f"p{i}" for i in range(250)]
+
+
+def test_append_is_resent_when_the_write_was_lost(yos, notion):
+    page = notion(["lost"])
+    assert asyncio.run(yos.append_notion_blocks("page", _paragraphs(30))) == 30
+    assert len(page.children) == 30
+    assert page.patches == 2
+
+
+def test_first_append_checks_the_whole_page(yos, notion):
+    page = notion(["applied"])
+    page.children = [dict(b, id=f"old{i}") for i, b in enumerate(_paragraphs(150, "old"))]
+    asyncio.run(yos.append_notion_blocks("page", _paragraphs(5)))
+    assert len(page.children) == 155
+    assert page.patches == 1
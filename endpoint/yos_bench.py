@@ -0,0 +1,473 @@
+"""
+YOS Endpoint — banc de charge avec upstreams locaux.
+
+Démarre des stubs OpenAI et Notion (latence et erreurs injectables), lance
+yos_endpoint dans un sous-processus uvicorn pointé vers ces stubs (backend
+vectoriel local-ivf à la place de Pinecone), puis rejoue un mélange de
+requêtes archive / search / list à une concurrence cible. Le résultat —
+latences p50/p95/p99, débit, RSS du processus endpoint par scénario — est
+écrit en JSON pour être suivi dans le temps.
+
+Hors périmètre : le chemin Pinecone (disjoncteur, upserts batchés, bascule
+des recherches vers le store local) n'est pas exercé — aucun stub Pinecone,
+et PINECONE_API_KEY est retiré de l'environnement de l'endpoint. Avec
+--env MMM_BACKEND=pinecone, seul le store local de repli (json-fallback)
+est mesuré, disjoncteur au repos.
+
+Exemple :
+  python yos_bench.py --scenario archive --scenario search --scenario mixed \\
+      --concurrency 16 --duration 30 --openai-latency 0.4 --notion-error-rate 0.05 \\
+      --output bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import zlib
+import random
+import shutil
+import socket
+import asyncio
+import argparse
+import tempfile
+import datetime
+import platform
+import threading
+import subprocess
+from typing import List, Optional, Dict, Any
+
+import httpx
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+ENDPOINT_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_API_KEY = "yos-bench"
+
+# Mélanges de trafic : poids par opération
+SCENARIOS: Dict[str, Dict[str, float]] = {
+    "archive": {"archive": 1.0},
+    "search": {"search": 1.0},
+    "list": {"list": 1.0},
+    "mixed": {"archive": 0.2, "search": 0.6, "list": 0.2},
+}
+
+WORDS = ("mémoire archive notion pinecone embedding vecteur recherche insight décision canon todo "
+         "conversation snapshot latence débit cache index shard requête réponse modèle prompt "
+         "contexte segment résumé entité projet yos hub archiver endpoint benchmark stub").split()
+
+# ============================================================
+# Stubs upstream
+# ============================================================
+
+class _StubBehavior:
+    """Latence (moyenne ± jitter) et taux d'erreurs d'un upstream simulé."""
+
+    def __init__(self, latency: float, jitter: float, error_rate: float, error_status: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.calls = 0
+        self.errors = 0
+
+    async def delay(self) -> Optional[JSONResponse]:
+        """Attend la latence simulée ; retourne une réponse d'erreur si une erreur est injectée."""
+        self.calls += 1
+        if self.latency > 0:
+            spread = self.latency * self.jitter
+            await asyncio.sleep(max(0.0, random.uniform(self.latency - spread, self.latency + spread)))
+        if self.error_rate > 0 and random.random() < self.error_rate:
+            self.errors += 1
+            return JSONResponse({"error": "injected"}, status_code=self.error_status,
+                                headers={"Retry-After": "0"} if self.error_status == 429 else None)
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "errors": self.errors}
+
+def _fake_embedding(text: str, dim: int) -> List[float]:
+    """Vecteur déterministe par texte : deux requêtes identiques donnent le même embedding."""
+    rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+    return rng.standard_normal(dim).astype(np.float32).round(5).tolist()
+
+def _fake_insights(title: str) -> Dict[str, Any]:
+    return {
+        "summary": f"Résumé simulé de {title}",
+        "decisions": [f"Décision {random.randint(1, 50)}"],
+        "canons": [],
+        "todos": [f"TODO {random.randint(1, 50)}"],
+        "entities": random.sample(WORDS, 3),
+        "insights": [f"Insight {random.randint(1, 50)}"],
+    }
+
+def build_stub_app(openai: _StubBehavior, embeddings: _StubBehavior, notion: _StubBehavior) -> FastAPI:
+    """Application unique servant /openai (API OpenAI) et /notion (API Notion)."""
+    stub = FastAPI(title="YOS bench stubs")
+
+    @stub.post("/openai/embeddings")
+    async def stub_embeddings(request: Request):
+        body = await request.json()
+        error = await embeddings.delay()
+        if error:
+            return error
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dim = body.get("dimensions", 1536)
+        return {"object": "list", "model": body.get("model"),
+                "data": [{"object": "embedding", "index": i, "embedding": _fake_embedding(t, dim)}
+                         for i, t in enumerate(inputs)]}
+
+    @stub.post("/openai/chat/completions")
+    async def stub_chat(request: Request):
+        body = await request.json()
+        error = await openai.delay()
+        if error:
+            return error
+        title = body["messages"][-1]["content"][:60] if body.get("messages") else ""
+        return {"choices": [{"index": 0, "message": {"role": "assistant",
+                                                     "content": json.dumps(_fake_insights(title))}}]}
+
+    @stub.post("/notion/pages")
+    async def stub_create_page(request: Request):
+        await request.body()
+        error = await notion.delay()
+        if error:
+            return error
+        page_id = str(uuid.uuid4())
+        return {"object": "page", "id": page_id, "url": f"https://notion.so/bench-{page_id.replace('-', '')}"}
+
+    @stub.patch("/notion/pages/{page_id}")
+    async def stub_update_page(page_id: str, request: Request):
+        await request.body()
+        return await notion.delay() or {"object": "page", "id": page_id}
+
+    @stub.patch("/notion/blocks/{block_id}/children")
+    async def stub_append_blocks(block_id: str, request: Request):
+        await request.body()
+        return await notion.delay() or {"object": "list", "results": []}
+
+    return stub
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_stub_server(app: FastAPI, port: int) -> uvicorn.Server:
+    """Sert les stubs dans un thread du banc (boucle asyncio dédiée)."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           access_log=False))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("stub server did not start")
+        time.sleep(0.05)
+    return server
+
+# ============================================================
+# Endpoint sous test
+# ============================================================
+
+def start_endpoint(port: int, stub_port: int, archives_dir: str, extra_env: Dict[str, str],
+                   log_path: str) -> subprocess.Popen:
+    """Lance yos_endpoint (uvicorn) dans un sous-processus, configuré vers les stubs."""
+    env = dict(os.environ)
+    env.pop("PINECONE_API_KEY", None)
+    env.update({
+        "ARCHIVES_DIR": archives_dir,
+        "MMM_INDEX_FILE": os.path.join(archives_dir, "mmm_index.json"),
+        "YOS_API_KEY": BENCH_API_KEY,
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{stub_port}/openai",
+        "NOTION_API_KEY": "secret-bench",
+        "NOTION_BASE_URL": f"http://127.0.0.1:{stub_port}/notion",
+        "MMM_BACKEND": "local-ivf",  # faux backend vectoriel : store local, pas de Pinecone
+    })
+    env.update(extra_env)
+    log = open(log_path, "ab")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "yos_endpoint:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=ENDPOINT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"endpoint exited with code {proc.returncode} (see {log_path})")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"endpoint did not become healthy (see {log_path})")
+
+def process_rss_mb(pid: int) -> Optional[float]:
+    """RSS courant d'un processus (Linux : /proc), None si indisponible."""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+class _RssSampler:
+    """Échantillonne le RSS du processus endpoint pendant un scénario (pic observé)."""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            rss = process_rss_mb(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0.0, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+# ============================================================
+# Générateur de charge
+# ============================================================
+
+def _random_text(words: int) -> str:
+    lines, line = [], []
+    for _ in range(words):
+        line.append(random.choice(WORDS))
+        if len(line) >= 16:
+            lines.append(" ".join(line))
+            line = []
+    lines.append(" ".join(line))
+    return "\n".join(lines)
+
+class _LoadDriver:
+    """Rejoue un mélange d'opérations contre l'endpoint avec N workers concurrents."""
+
+    def __init__(self, base_url: str, args: argparse.Namespace):
+        self.base_url = base_url
+        self.args = args
+        self.headers = {"Authorization": f"Bearer {BENCH_API_KEY}"}
+
+    async def _archive(self, client: httpx.AsyncClient) -> httpx.Response:
+        payload = {
+            "title": f"Bench {random.choice(WORDS)} {uuid.uuid4().hex[:8]}",
+            "url": f"https://chat.example/{uuid.uuid4().hex}",
+            "source": random.choice(["ChatGPT", "Claude", "Gemini", "Perplexity"]),
+            "action": self.args.archive_action,
+            "content_full": _random_text(self.args.content_words),
+            "content_summary": _random_text(30),
+            "tags": ["bench"],
+            "turn_count": random.randint(2, 60),
+        }
+        return await client.post("/api/archive", json=payload)
+
+    async def _search(self, client: httpx.AsyncClient) -> httpx.Response:
+        query = " ".join(random.sample(WORDS, 3))
+        return await client.post("/api/mmm/search", json={"query": query, "top_k": 5, "mode": self.args.search_mode})
+
+    async def _list(self, client: httpx.AsyncClient) -> httpx.Response:
+        return await client.get("/api/archives", params={"limit": 50})
+
+    async def seed(self, count: int) -> None:
+        """Archives initiales (les recherches et listings portent sur un corpus non vide)."""
+        async with httpx.AsyncClient(base_url=self.base_url, headers=self.headers, timeout=120) as client:
+            sem = asyncio.Semaphore(self.args.concurrency)
+
+            async def _one():
+                async with sem:
+                    await self._archive(client)
+            await asyncio.gather(*(_one() for _ in range(count)))
+
+    async def run(self, mix: Dict[str, float]) -> Dict[str, Any]:
+        ops = {"archive": self._archive, "search": self._search, "list": self._list}
+        names = list(mix)
+        weights = [mix[n] for n in names]
+        samples: Dict[str, List[float]] = {n: [] for n in names}
+        errors: Dict[str, int] = {n: 0 for n in names}
+        deadline = time.perf_counter() + self.args.duration
+        budget = [self.args.requests]  # partagé entre workers (0 = limité par la durée)
+
+        async def _worker(client: httpx.AsyncClient):
+            while time.perf_counter() < deadline:
+                if self.args.requests:
+                    if budget[0] <= 0:
+                        return
+                    budget[0] -= 1
+                name = random.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    resp = await ops[name](client)
+                    ok = resp.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                samples[name].append(time.perf_counter() - started)
+                if not ok:
+                    errors[name] += 1
+
+        limits = httpx.Limits(max_connections=self.args.concurrency, max_keepalive_connections=self.args.concurrency)
+        async with httpx.AsyncClient(base_url=self.base_url, headers=self.headers, timeout=120,
+                                     limits=limits) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(_worker(client) for _ in range(self.args.concurrency)))
+            elapsed = time.perf_counter() - started
+        all_samples = [s for values in samples.values() for s in values]
+        return {
+            "requests": len(all_samples),
+            "errors": sum(errors.values()),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(all_samples) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": latency_summary(all_samples),
+            "operations": {
+                n: {"requests": len(samples[n]), "errors": errors[n], "latency_ms": latency_summary(samples[n])}
+                for n in names
+            },
+        }
+
+def latency_summary(samples: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max/moyenne en millisecondes."""
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None, "mean": None}
+    values = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(float(p50), 2), "p95": round(float(p95), 2), "p99": round(float(p99), 2),
+            "max": round(float(values.max()), 2), "mean": round(float(values.mean()), 2)}
+
+async def _wait_for_indexing(base_url: str, timeout: float = 120) -> int:
+    """Attend que la file d'indexation MMM soit vide ; retourne la profondeur restante."""
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient(base_url=base_url, headers={"Authorization": f"Bearer {BENCH_API_KEY}"},
+                                 timeout=10) as client:
+        while True:
+            depth = (await client.get("/api/mmm/jobs")).json().get("depth", 0)
+            if depth == 0 or time.time() > deadline:
+                return depth
+            await asyncio.sleep(0.5)
+
+# ============================================================
+# Orchestration
+# ============================================================
+
+def run_bench(args: argparse.Namespace) -> Dict[str, Any]:
+    random.seed(args.seed)
+    behaviors = {
+        "openai": _StubBehavior(args.openai_latency, args.jitter, args.openai_error_rate, 503),
+        "embeddings": _StubBehavior(args.embed_latency, args.jitter, args.openai_error_rate, 503),
+        "notion": _StubBehavior(args.notion_latency, args.jitter, args.notion_error_rate, 429),
+    }
+    stub_port, endpoint_port = _free_port(), _free_port()
+    stub_server = start_stub_server(build_stub_app(behaviors["openai"], behaviors["embeddings"],
+                                                   behaviors["notion"]), stub_port)
+    archives_dir = args.archives_dir or tempfile.mkdtemp(prefix="yos-bench-")
+    os.makedirs(archives_dir, exist_ok=True)
+    log_path = os.path.join(archives_dir, "endpoint.log")
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    proc = start_endpoint(endpoint_port, stub_port, archives_dir, extra_env, log_path)
+    base_url = f"http://127.0.0.1:{endpoint_port}"
+    driver = _LoadDriver(base_url, args)
+    report: Dict[str, Any] = {
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {
+            "concurrency": args.concurrency, "duration_s": args.duration, "requests": args.requests,
+            "seed_archives": args.seed_archives, "content_words": args.content_words,
+            "archive_action": args.archive_action, "search_mode": args.search_mode,
+            "openai_latency_s": args.openai_latency, "embed_latency_s": args.embed_latency,
+            "notion_latency_s": args.notion_latency, "jitter": args.jitter,
+            "openai_error_rate": args.openai_error_rate, "notion_error_rate": args.notion_error_rate,
+            "env": extra_env,
+            "vector_backend": extra_env.get("MMM_BACKEND", "local-ivf"),
+            "pinecone_path": "not exercised (no Pinecone stub)",
+        },
+        "scenarios": {},
+    }
+    try:
+        report["rss_idle_mb"] = process_rss_mb(proc.pid)
+        if args.seed_archives:
+            print(f"Seeding {args.seed_archives} archives...", file=sys.stderr)
+            asyncio.run(driver.seed(args.seed_archives))
+            asyncio.run(_wait_for_indexing(base_url))
+        for name in args.scenario:
+            print(f"Running scenario '{name}'...", file=sys.stderr)
+            rss_start = process_rss_mb(proc.pid)
+            with _RssSampler(proc.pid) as sampler:
+                result = asyncio.run(driver.run(SCENARIOS[name]))
+            result.update({"rss_start_mb": rss_start, "rss_end_mb": process_rss_mb(proc.pid),
+                           "rss_peak_mb": sampler.peak})
+            report["scenarios"][name] = result
+            asyncio.run(_wait_for_indexing(base_url))  # le scénario suivant part d'une file vide
+        report["upstream_calls"] = {name: b.stats() for name, b in behaviors.items()}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        stub_server.should_exit = True
+        if not args.archives_dir and not args.keep:
+            shutil.rmtree(archives_dir, ignore_errors=True)
+        else:
+            report["archives_dir"] = archives_dir
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="YOS Endpoint — load-test harness with local OpenAI/Notion stand-ins",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python yos_bench.py --scenario search --concurrency 32 --duration 20
+  python yos_bench.py --scenario archive --openai-latency 1.5 --notion-error-rate 0.1
+  python yos_bench.py --scenario mixed --env MMM_QUANTIZATION=int8 --output bench.json
+  python yos_bench.py --scenario archive --env NOTION_RATE_LIMIT=1000  # sans le limiteur Notion (3 req/s)
+        """
+    )
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Traffic mix to run (repeatable, default: archive, search, list, mixed)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client workers")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per scenario")
+    parser.add_argument("--requests", type=int, default=0, help="Stop a scenario after N requests (0 = duration only)")
+    parser.add_argument("--seed-archives", type=int, default=100, help="Archives created before the scenarios")
+    parser.add_argument("--content-words", type=int, default=2000, help="Words of content_full per archive")
+    parser.add_argument("--archive-action", default="push+archive", choices=["push", "archive", "push+archive"])
+    parser.add_argument("--search-mode", default="semantic", choices=["semantic", "lexical", "hybrid"])
+    parser.add_argument("--openai-latency", type=float, default=0.3, help="Chat completion stub latency (s)")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Embeddings stub latency (s)")
+    parser.add_argument("--notion-latency", type=float, default=0.15, help="Notion stub latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency spread, as a fraction of the mean")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0, help="Share of OpenAI calls answered 503")
+    parser.add_argument("--notion-error-rate", type=float, default=0.0, help="Share of Notion calls answered 429")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the endpoint process (repeatable)")
+    parser.add_argument("--archives-dir", help="ARCHIVES_DIR for the endpoint (default: temporary, removed)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary ARCHIVES_DIR")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for generated traffic")
+    parser.add_argument("--output", help="Write the JSON report to this file (default: stdout)")
+
+    args = parser.parse_args()
+    args.scenario = args.scenario or ["archive", "search", "list", "mixed"]
+
+    result = run_bench(args)
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
@@ -1,16 +1,43 @@
 import os
 import json
 import datetime
+import gzip
+import shutil
 import uuid
 import threading
-import math
-from typing import List, Optional, Dict, Any
+import time
+import hashlib
+import io
+import itertools
+import asyncio
+import base64
+import re
+import sqlite3
+import tempfile
+import zlib
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Iterable, Tuple, Union
 
+import httpx
+import numpy as np
 import requests
-from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+# zstd (optionnel) pour l'ingestion compressée
+try:
+    import zstandard
+    _ZSTD_AVAILABLE = True
+except ImportError:
+    _ZSTD_AVAILABLE = False
 
 # Pinecone
 try:
@@ -30,29 +57,243 @@ OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "yos-memory-poc")
 NOTION_API_VERSION = "2022-06-28"
-NOTION_BASE_URL = "https://api.notion.com/v1"
+NOTION_BASE_URL = os.getenv("NOTION_BASE_URL", "https://api.notion.com/v1")  # surchargeable (stubs de yos_bench.py)
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))  # requêtes simultanées vers OpenAI
+NOTION_MAX_CONCURRENCY = int(os.getenv("NOTION_MAX_CONCURRENCY", "4"))  # requêtes simultanées vers Notion
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT", "3"))  # requêtes/s (limite moyenne de l'API Notion)
+NOTION_MAX_RETRIES = int(os.getenv("NOTION_MAX_RETRIES", "5"))  # sur 429/502/503/504, en respectant Retry-After
+NOTION_BLOCKS_PER_REQUEST = 100  # limite Notion pour children
 PUSH_MODEL = "gpt-4o-mini"
 EMBED_MODEL = "text-embedding-3-small"
-EMBED_DIMENSION = 1536
-MMM_INDEX_FILE = os.getenv("MMM_INDEX_FILE", "/app/archives/mmm_index.json")  # fallback only
+EMBED_NATIVE_DIMENSION = 1536
+EMBED_DIMENSION = int(os.getenv("EMBED_DIMENSIONS", str(EMBED_NATIVE_DIMENSION)))  # < 1536 : vecteurs réduits par l'API
+# Changer la dimension vide les stores locaux (nouvelle génération, à remplir par `reindex`) ;
+# un index Pinecone existant garde sa largeur : il faut alors un nouveau PINECONE_INDEX_NAME.
+# Clé de cache / manifeste : un changement de dimension invalide les embeddings déjà calculés.
+EMBED_MODEL_KEY = EMBED_MODEL if EMBED_DIMENSION == EMBED_NATIVE_DIMENSION else f"{EMBED_MODEL}@{EMBED_DIMENSION}"
+MMM_INDEX_FILE = os.getenv("MMM_INDEX_FILE", "/app/archives/mmm_index.json")  # ancien format JSON (migration)
+MMM_STORE_DIR = os.getenv("MMM_STORE_DIR", os.path.join(ARCHIVES_DIR, "mmm_store"))  # fallback only
+MMM_BACKEND = os.getenv("MMM_BACKEND", "pinecone")  # pinecone (+ fallback JSON) | local-ivf
+MMM_IVF_DIR = os.getenv("MMM_IVF_DIR", os.path.join(ARCHIVES_DIR, "mmm_ivf"))
+MMM_IVF_NLIST = int(os.getenv("MMM_IVF_NLIST", "0"))  # 0 = auto (√n)
+MMM_IVF_NPROBE = int(os.getenv("MMM_IVF_NPROBE", "8"))  # listes scannées par requête (rappel vs latence)
+MMM_IVF_TRAIN_MIN = int(os.getenv("MMM_IVF_TRAIN_MIN", "1024"))  # recherche exacte en dessous
+MMM_LEXICAL_DB = os.getenv("MMM_LEXICAL_DB", os.path.join(ARCHIVES_DIR, "mmm_lexical.sqlite3"))
+MMM_RRF_K = int(os.getenv("MMM_RRF_K", "60"))  # constante de la fusion reciprocal-rank
+MMM_MANIFEST_DB = os.getenv("MMM_MANIFEST_DB", os.path.join(ARCHIVES_DIR, "mmm_manifest.sqlite3"))
+MMM_QUANTIZATION = os.getenv("MMM_QUANTIZATION", "none")  # none | int8 (4× moins de RAM) | float16 (2×, décodage plus lent)
+MMM_RESCORE_FACTOR = int(os.getenv("MMM_RESCORE_FACTOR", "10"))  # shortlist re-scorée en float32 = top_k × facteur
+MMM_COMPACT_MIN_DEAD = int(os.getenv("MMM_COMPACT_MIN_DEAD", "256"))
+MMM_COMPACT_RATIO = float(os.getenv("MMM_COMPACT_RATIO", "0.25"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "128"))  # inputs par requête embeddings
+PINECONE_UPSERT_BATCH = int(os.getenv("PINECONE_UPSERT_BATCH", "100"))  # vecteurs par upsert
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "2048"))  # entrées LRU en mémoire
+EMBED_CACHE_DB = os.getenv("EMBED_CACHE_DB", os.path.join(ARCHIVES_DIR, "embed_cache.sqlite3"))
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join(ARCHIVES_DIR, "spool"))  # content_full en cours d'ingestion
+MAX_CONTENT_BYTES = int(os.getenv("MAX_CONTENT_BYTES", str(64 * 1024 * 1024)))  # après décompression
+BODY_INFLATE_STEP = 1024 * 1024  # sortie max par appel de décompression (gzip/deflate)
+BODY_ZSTD_INPUT_STEP = 64  # octets compressés par appel zstd (≤ ~2 Mio de sortie)
+BLOBS_DIR = os.getenv("BLOBS_DIR", os.path.join(ARCHIVES_DIR, "blobs"))  # verbatims compressés, adressés par sha256
+BLOB_COMPRESSION = os.getenv("BLOB_COMPRESSION", "gzip")  # gzip | zstd (si zstandard installé)
+INSIGHTS_MAX_CHARS = 30000  # au-delà (~12000 tokens), extraction map-reduce par segments
+INSIGHTS_SEGMENT_TOKENS = int(os.getenv("INSIGHTS_SEGMENT_TOKENS", "6000"))  # budget d'un segment (map)
+INSIGHTS_MAX_SEGMENTS = int(os.getenv("INSIGHTS_MAX_SEGMENTS", "24"))  # au-delà, contenu tronqué
+INSIGHTS_MAP_CONCURRENCY = int(os.getenv("INSIGHTS_MAP_CONCURRENCY", "8"))  # segments extraits simultanément
+CHARS_PER_TOKEN = 2.5  # estimation prudente (texte FR/EN mêlé de code)
+INSIGHTS_SEGMENT_CHARS = int(INSIGHTS_SEGMENT_TOKENS * CHARS_PER_TOKEN)
+INSIGHTS_INPUT_CHARS = INSIGHTS_SEGMENT_CHARS * INSIGHTS_MAX_SEGMENTS  # lu au plus pour l'extraction
+ARCHIVES_INDEX_DB = os.getenv("ARCHIVES_INDEX_DB", os.path.join(ARCHIVES_DIR, "archives_index.sqlite3"))
+PUSH_FINGERPRINTS_DB = os.getenv("PUSH_FINGERPRINTS_DB", os.path.join(ARCHIVES_DIR, "push_fingerprints.sqlite3"))
+NEAR_DUP_DB = os.getenv("NEAR_DUP_DB", os.path.join(ARCHIVES_DIR, "near_duplicates.sqlite3"))
+NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "32"))  # LSH : bandes × lignes = permutations MinHash
+NEAR_DUP_ROWS = int(os.getenv("NEAR_DUP_ROWS", "4"))  # candidats dès Jaccard ≈ 0.4 (snapshot partiel)
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))  # containment estimé du plus petit verbatim
+NEAR_DUP_SHINGLE = 5  # mots par shingle
+NEAR_DUP_MAX_CHARS = int(os.getenv("NEAR_DUP_MAX_CHARS", str(4 * 1024 * 1024)))  # verbatim signé au plus
+PINECONE_BREAKER_THRESHOLD = int(os.getenv("PINECONE_BREAKER_THRESHOLD", "3"))  # échecs consécutifs avant ouverture
+PINECONE_BREAKER_BACKOFF = float(os.getenv("PINECONE_BREAKER_BACKOFF", "5"))  # secondes, doublé à chaque réouverture
+PINECONE_BREAKER_MAX_BACKOFF = float(os.getenv("PINECONE_BREAKER_MAX_BACKOFF", "300"))
+MMM_BATCH_MAX_QUERIES = int(os.getenv("MMM_BATCH_MAX_QUERIES", "32"))  # requêtes par appel /api/mmm/search/batch
+PINECONE_QUERY_CONCURRENCY = int(os.getenv("PINECONE_QUERY_CONCURRENCY", "8"))  # requêtes Pinecone en parallèle (batch)
+ARCHIVES_STREAM_PAGE = int(os.getenv("ARCHIVES_STREAM_PAGE", "500"))  # lignes lues par page en streaming
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "512"))  # réponses /api/mmm/search en mémoire
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))  # secondes
+MMM_JOBS_DB = os.getenv("MMM_JOBS_DB", os.path.join(ARCHIVES_DIR, "mmm_jobs.sqlite3"))
+MMM_WORKERS = int(os.getenv("MMM_WORKERS", "2"))  # threads d'indexation
+MMM_QUEUE_MAX = int(os.getenv("MMM_QUEUE_MAX", "1000"))  # jobs en attente avant refus (503)
+MMM_JOB_MAX_ATTEMPTS = int(os.getenv("MMM_JOB_MAX_ATTEMPTS", "6"))
+MMM_JOB_BACKOFF = float(os.getenv("MMM_JOB_BACKOFF", "5"))  # secondes, doublé à chaque échec
 
 os.makedirs(ARCHIVES_DIR, exist_ok=True)
 
+# ============================================================
+# Métriques — exposées au format texte Prometheus sur /metrics
+# ============================================================
+
+METRIC_HELP = {
+    "yos_http_requests_total": ("counter", "Requêtes HTTP traitées, par route et code de statut."),
+    "yos_http_request_duration_seconds": ("histogram", "Latence des requêtes HTTP, par route."),
+    "yos_stage_duration_seconds": ("histogram", "Durée des étapes internes (OpenAI, embeddings, Pinecone, Notion, stockage local)."),
+    "yos_stage_errors_total": ("counter", "Étapes internes terminées par une exception."),
+    "yos_fallback_total": ("counter", "Passages par un chemin de repli."),
+    "yos_search_cache_total": ("counter", "Consultations du cache de résultats de recherche MMM."),
+}
+
+class _Metrics:
+    """Compteurs et histogrammes en mémoire, sans collecteur externe."""
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], List[float]] = {}  # comptes par bucket + [sum, count]
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0.0] * (len(self.BUCKETS) + 2)
+            for i, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    @contextmanager
+    def stage(self, name: str):
+        """Chronomètre une étape (utilisable en code sync comme async)."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("yos_stage_errors_total", stage=name)
+            raise
+        finally:
+            self.observe("yos_stage_duration_seconds", time.perf_counter() - start, stage=name)
+
+    @staticmethod
+    def _labels(labels: Tuple, extra: Tuple = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self) -> str:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+        lines = []
+        for name, (kind, help_text) in METRIC_HELP.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{self._labels(labels)} {value:g}")
+                continue
+            for (metric, labels), hist in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(self.BUCKETS, hist):
+                    lines.append(f"{name}_bucket{self._labels(labels, (('le', f'{bound:g}'),))} {count:g}")
+                lines.append(f"{name}_bucket{self._labels(labels, (('le', '+Inf'),))} {hist[-1]:g}")
+                lines.append(f"{name}_sum{self._labels(labels)} {hist[-2]:.6f}")
+                lines.append(f"{name}_count{self._labels(labels)} {hist[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+_metrics = _Metrics()
+
 # ============================================================
 # MMM — Multi-session/LLM Memory Manager
 # Backend: Pinecone (persistent) avec fallback JSON local
 # ============================================================
 
-_mmm_lock = threading.Lock()
+class _CircuitBreaker:
+    """Disjoncteur pour un backend distant.
+
+    closed : appels autorisés ; après `threshold` échecs consécutifs -> open.
+    open : appels refusés (fallback immédiat) jusqu'à l'échéance du backoff,
+    doublé à chaque réouverture. Puis half-open : un seul appel sonde ; son
+    succès referme le circuit, son échec le rouvre.
+    """
+
+    def __init__(self, name: str, threshold: int, backoff: float, max_backoff: float, probe_timeout: float = 60.0):
+        self.name = name
+        self.threshold = max(1, threshold)
+        self.base_backoff = backoff
+        self.max_backoff = max_backoff
+        self.probe_timeout = probe_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._backoff = backoff
+        self._retry_at = 0.0
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "closed":
+                return True
+            if self.state == "open" and now < self._retry_at:
+                return False
+            if self.state == "half-open" and now - self._probe_started < self.probe_timeout:
+                return False  # sonde déjà en cours
+            self.state = "half-open"
+            self._probe_started = now
+            return True
+
+    def success(self) -> None:
+        with self._lock:
+            if self.state != "closed":
+                print(f"{self.name}: circuit closed")
+            self.state = "closed"
+            self.failures = 0
+            self._backoff = self.base_backoff
+
+    def failure(self, error: Exception) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)[:200]
+            if self.state == "half-open" or self.failures >= self.threshold:
+                self._retry_at = time.monotonic() + self._backoff
+                print(f"{self.name}: circuit open for {self._backoff:g}s ({self.last_error})")
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+                self.state = "open"
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            status = {"state": self.state, "failures": self.failures, "last_error": self.last_error}
+            if self.state == "open":
+                status["retry_in"] = round(max(0.0, self._retry_at - time.monotonic()), 1)
+            return status
+
 _pinecone_index = None
+_pinecone_breaker = _CircuitBreaker("Pinecone", PINECONE_BREAKER_THRESHOLD,
+                                    PINECONE_BREAKER_BACKOFF, PINECONE_BREAKER_MAX_BACKOFF)
 
 def _get_pinecone_index():
-    """Initialise et retourne l'index Pinecone. Singleton."""
+    """Initialise et retourne l'index Pinecone. Singleton.
+
+    None si Pinecone n'est pas configuré ou si le disjoncteur est ouvert ;
+    l'appelant signale ensuite le résultat de son opération au disjoncteur.
+    """
     global _pinecone_index
-    if _pinecone_index is not None:
-        return _pinecone_index
     if not _PINECONE_AVAILABLE or not PINECONE_API_KEY:
         return None
+    if not _pinecone_breaker.allow():
+        return None
+    if _pinecone_index is not None:
+        return _pinecone_index
     try:
         pc = Pinecone(api_key=PINECONE_API_KEY)
         existing = [i.name for i in pc.list_indexes()]
@@ -65,38 +306,329 @@ def _get_pinecone_index():
                 spec=ServerlessSpec(cloud="aws", region="us-east-1")
             )
             import time; time.sleep(5)  # attendre que l'index soit prêt
+        else:
+            # La largeur d'un index Pinecone est fixée à sa création
+            dimension = pc.describe_index(PINECONE_INDEX_NAME).dimension
+            if dimension != EMBED_DIMENSION:
+                raise RuntimeError(f"index '{PINECONE_INDEX_NAME}' has dimension {dimension}, "
+                                   f"EMBED_DIMENSIONS={EMBED_DIMENSION} — set PINECONE_INDEX_NAME "
+                                   f"to a new index and run `reindex --full`")
         _pinecone_index = pc.Index(PINECONE_INDEX_NAME)
+        _pinecone_breaker.success()
         print(f"Pinecone: connected to index '{PINECONE_INDEX_NAME}'")
         return _pinecone_index
     except Exception as e:
         print(f"Pinecone init error: {e}")
+        _pinecone_breaker.failure(e)
         return None
 
-def _embed_text(text: str) -> Optional[List[float]]:
-    """Génère un embedding OpenAI pour un texte."""
-    if not OPENAI_API_KEY:
+def _pinecone_status() -> str:
+    """État de Pinecone d'après le cache (aucun appel réseau)."""
+    if not _PINECONE_AVAILABLE:
+        return "not installed"
+    if not PINECONE_API_KEY:
+        return "key missing"
+    state = _pinecone_breaker.status()["state"]
+    if state == "open":
+        return "unavailable"
+    if _pinecone_index is None:
+        return "connecting" if state == "half-open" else "not initialized"
+    return "connected" if state == "closed" else "probing"
+
+def _open_sqlite(path: str) -> sqlite3.Connection:
+    """Connexion SQLite partagée entre threads (accès sérialisé par l'appelant)."""
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+class _EmbeddingCache:
+    """Cache d'embeddings à deux niveaux, clé = (modèle, sha256 du texte).
+
+    L1 : LRU borné en mémoire. L2 : table SQLite persistante sous ARCHIVES_DIR.
+    Le LRU garde des tableaux float32 (~6 Ko par vecteur de 1536, contre ~50 Ko en
+    liste Python) ; get() rend une liste, comme le reste du pipeline.
+    """
+
+    def __init__(self, db_path: str, max_items: int):
+        self.db_path = db_path
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._lru: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model: str, text: str) -> Tuple[str, str]:
+        return model, hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None:
+            try:
+                self._conn = _open_sqlite(self.db_path)
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "model TEXT NOT NULL, text_hash TEXT NOT NULL, embedding BLOB NOT NULL, "
+                    "PRIMARY KEY (model, text_hash))"
+                )
+            except sqlite3.Error as e:
+                print(f"Embedding cache disabled (SQLite error: {e})")
+                self._conn = None
+        return self._conn
+
+    def _remember(self, key: Tuple[str, str], embedding: np.ndarray) -> None:
+        self._lru[key] = embedding
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = self.key(model, text)
+        with self._lock:
+            embedding = self._lru.get(key)
+            if embedding is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                return embedding.tolist()
+            db = self._db()
+            row = None
+            if db is not None:
+                row = db.execute(
+                    "SELECT embedding FROM embeddings WHERE model = ? AND text_hash = ?", key
+                ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            embedding = np.frombuffer(row[0], dtype=np.float32)
+            self._remember(key, embedding)
+            self.disk_hits += 1
+            return embedding.tolist()
+
+    def put(self, model: str, text: str, embedding: List[float]) -> None:
+        key = self.key(model, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        blob = vector.tobytes()
+        with self._lock:
+            self._remember(key, vector)
+            db = self._db()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, embedding) VALUES (?, ?, ?)",
+                    (*key, blob)
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_items": len(self._lru),
+                "memory_bytes": sum(v.nbytes for v in self._lru.values()),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None,
+            }
+
+_embed_cache = _EmbeddingCache(EMBED_CACHE_DB, EMBED_CACHE_SIZE)
+
+class _TokenBucket:
+    """Limiteur de débit async partagé : rate jetons/s, rafale d'au plus burst.
+
+    pause(delay) suspend toutes les acquisitions (Retry-After d'un 429).
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, delay: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        self._tokens = 0.0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    self._updated = time.monotonic()
+                    continue
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+RETRY_STATUSES = (429, 502, 503, 504)
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    """Délai Retry-After (secondes ou date HTTP), ou None."""
+    value = resp.headers.get("Retry-After")
+    if not value:
         return None
     try:
-        resp = requests.post(
-            f"{OPENAI_API_BASE}/embeddings",
-            headers={"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"},
-            json={"model": EMBED_MODEL, "input": text[:8000]},
-            timeout=15
-        )
-        resp.raise_for_status()
-        return resp.json()["data"][0]["embedding"]
-    except Exception as e:
-        print(f"Embedding error: {e}")
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+        return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
         return None
 
-def _cosine_similarity(a: List[float], b: List[float]) -> float:
-    """Calcule la similarité cosinus entre deux vecteurs (fallback JSON)."""
-    dot = sum(x * y for x, y in zip(a, b))
-    norm_a = math.sqrt(sum(x * x for x in a))
-    norm_b = math.sqrt(sum(x * x for x in b))
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    return dot / (norm_a * norm_b)
+class _AsyncUpstream:
+    """Client HTTP async partagé pour un upstream : connexions keep-alive poolées
+    et nombre de requêtes simultanées borné.
+
+    Optionnellement : débit limité par un token bucket partagé, et nouvelles
+    tentatives sur 429/5xx transitoires (Retry-After respecté, sinon backoff).
+    Une requête non idempotente (POST par défaut, ou idempotent=False : ajout de
+    blocs Notion) n'est rejouée que sur 429, garanti non appliqué : après un
+    502/503/504, l'écriture a pu être faite malgré l'erreur, la rejouer la dupliquerait.
+    """
+
+    def __init__(self, base_url: str, max_concurrency: int, headers,
+                 rate_limit: Optional[float] = None, max_retries: int = 0):
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._headers = headers
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = _TokenBucket(rate_limit, max(1.0, rate_limit)) if rate_limit else None
+        self.retries = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+        return self._client
+
+    async def request(self, method: str, path: str, timeout: float, idempotent: Optional[bool] = None,
+                      **kwargs) -> httpx.Response:
+        if idempotent is None:
+            idempotent = method.upper() != "POST"
+        attempt = 0
+        while True:
+            if self._bucket is not None:
+                await self._bucket.acquire()
+            async with self._semaphore:
+                resp = await self._get_client().request(
+                    method, path, headers=self._headers(), timeout=timeout, **kwargs
+                )
+            retryable = resp.status_code in (RETRY_STATUSES if idempotent else (429,))
+            if not retryable or attempt >= self.max_retries:
+                break
+            delay = _retry_after(resp)
+            if delay is None:
+                delay = min(30.0, 0.5 * (2 ** attempt))
+            attempt += 1
+            self.retries += 1
+            print(f"{self.base_url}: HTTP {resp.status_code} on {method} {path} — "
+                  f"retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            if self._bucket is not None:
+                self._bucket.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+        resp.raise_for_status()
+        return resp
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+def _openai_headers() -> dict:
+    return {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
+
+def _notion_headers() -> dict:
+    return {
+        "Authorization": f"Bearer {NOTION_API_KEY}",
+        "Content-Type": "application/json",
+        "Notion-Version": NOTION_API_VERSION,
+    }
+
+_openai_http = _AsyncUpstream(OPENAI_API_BASE, OPENAI_MAX_CONCURRENCY, _openai_headers)
+_notion_http = _AsyncUpstream(NOTION_BASE_URL, NOTION_MAX_CONCURRENCY, _notion_headers,
+                              rate_limit=NOTION_RATE_LIMIT, max_retries=NOTION_MAX_RETRIES)
+
+def _embed_plan(texts: List[str]):
+    """Résout les textes depuis le cache ; retourne (textes, résultats, lots à demander)."""
+    texts = [t[:8000] for t in texts]
+    results: List[Optional[List[float]]] = [_embed_cache.get(EMBED_MODEL_KEY, t) for t in texts]
+    missing = [i for i, r in enumerate(results) if r is None]
+    batches = [missing[i:i + EMBED_BATCH_SIZE] for i in range(0, len(missing), EMBED_BATCH_SIZE)]
+    return texts, results, batches
+
+def _embed_payload(inputs: List[str]) -> Dict:
+    payload = {"model": EMBED_MODEL, "input": inputs}
+    if EMBED_DIMENSION != EMBED_NATIVE_DIMENSION:
+        payload["dimensions"] = EMBED_DIMENSION  # text-embedding-3 : troncature Matryoshka côté API
+    return payload
+
+def _embed_collect(texts: List[str], results: List, batch: List[int], data: List[Dict]) -> None:
+    for item in data:
+        i = batch[item["index"]]
+        results[i] = item["embedding"]
+        _embed_cache.put(EMBED_MODEL_KEY, texts[i], item["embedding"])
+
+def _embed_texts(texts: List[str]) -> List[Optional[List[float]]]:
+    """Génère les embeddings d'une liste de textes : cache d'abord, puis requêtes batchées."""
+    if not OPENAI_API_KEY:
+        return [None] * len(texts)
+    texts, results, batches = _embed_plan(texts)
+    for batch in batches:
+        try:
+            with _metrics.stage("embeddings"):
+                resp = requests.post(
+                    f"{OPENAI_API_BASE}/embeddings",
+                    headers=_openai_headers(),
+                    json=_embed_payload([texts[i] for i in batch]),
+                    timeout=15 + len(batch) // 8
+                )
+                resp.raise_for_status()
+            _embed_collect(texts, results, batch, resp.json()["data"])
+        except Exception as e:
+            print(f"Embedding error: {e}")
+    return results
+
+async def _embed_texts_async(texts: List[str]) -> List[Optional[List[float]]]:
+    """Variante async de _embed_texts (client OpenAI partagé, non bloquant).
+
+    Le cache d'embeddings (SQLite) est lu et écrit dans le threadpool.
+    """
+    if not OPENAI_API_KEY:
+        return [None] * len(texts)
+    texts, results, batches = await run_in_threadpool(_embed_plan, texts)
+    for batch in batches:
+        try:
+            with _metrics.stage("embeddings"):
+                resp = await _openai_http.request(
+                    "POST", "/embeddings",
+                    json=_embed_payload([texts[i] for i in batch]),
+                    timeout=15 + len(batch) // 8
+                )
+            await run_in_threadpool(_embed_collect, texts, results, batch, resp.json()["data"])
+        except Exception as e:
+            print(f"Embedding error: {e}")
+    return results
+
+def _embed_text(text: str) -> Optional[List[float]]:
+    """Génère un embedding OpenAI pour un texte (via le cache d'embeddings)."""
+    return _embed_texts([text])[0]
+
+async def _embed_text_async(text: str) -> Optional[List[float]]:
+    return (await _embed_texts_async([text]))[0]
 
 def _build_chunk_text(record: Dict) -> str:
     """Construit le texte à embedder depuis un record archivé."""
@@ -120,8 +652,9 @@ def _build_chunk_text(record: Dict) -> str:
         parts.append(f"Source: {source}")
     return "\n".join(parts)
 
-# --- JSON fallback helpers (utilisés si Pinecone indisponible) ---
+# --- Fallback local : store binaire append-only (utilisé si Pinecone indisponible) ---
 def _load_mmm_index() -> List[Dict]:
+    """Lit l'ancien index JSON (MMM_INDEX_FILE) — utilisé uniquement pour la migration."""
     if not os.path.exists(MMM_INDEX_FILE):
         return []
     try:
@@ -130,111 +663,1453 @@ def _load_mmm_index() -> List[Dict]:
     except Exception:
         return []
 
-def _save_mmm_index(index: List[Dict]) -> None:
-    with open(MMM_INDEX_FILE, "w", encoding="utf-8") as f:
-        json.dump(index, f, ensure_ascii=False)
+def _iso_to_ts(value) -> Optional[float]:
+    """Horodatage ISO 8601 (ou date seule) -> epoch en secondes ; UTC si sans fuseau."""
+    if not value:
+        return None
+    try:
+        dt = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
 
-def mmm_index_record(record: Dict) -> bool:
-    """Indexe un record dans Pinecone (ou JSON fallback). Retourne True si succès."""
-    archive_id = record.get("archive_id", str(uuid.uuid4()))
-    chunk_text = _build_chunk_text(record)
-    if not chunk_text.strip():
-        return False
-    embedding = _embed_text(chunk_text)
-    if not embedding:
-        return False
+def _search_filters(source: Optional[Union[str, List[str]]] = None, date_from: Optional[str] = None,
+                    date_to: Optional[str] = None, has_notion: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+    """Filtres de métadonnées normalisés, None si aucun. Lève ValueError sur une date invalide.
+
+    date_to seule (YYYY-MM-DD) : journée incluse, comme /api/archives.
+    """
+    filters: Dict[str, Any] = {}
+    if source:
+        filters["sources"] = [source] if isinstance(source, str) else list(source)
+    if date_from:
+        filters["date_from"], filters["ts_from"] = date_from, _iso_to_ts(date_from)
+        if filters["ts_from"] is None:
+            raise ValueError(f"invalid date_from: {date_from}")
+    if date_to:
+        ts_to = _iso_to_ts(date_to)
+        if ts_to is None:
+            raise ValueError(f"invalid date_to: {date_to}")
+        filters["date_to"], filters["ts_to"] = date_to, ts_to + (86400 if len(date_to) <= 10 else 0.001)
+    if has_notion is not None:
+        filters["has_notion"] = has_notion
+    return filters or None
+
+def _pinecone_filter(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Traduction des filtres en filtre de métadonnées Pinecone."""
+    if not filters:
+        return None
+    clauses: Dict[str, Any] = {}
+    if "sources" in filters:
+        clauses["source"] = {"$in": filters["sources"]}
+    if "ts_from" in filters or "ts_to" in filters:
+        clauses["archived_ts"] = {}
+        if "ts_from" in filters:
+            clauses["archived_ts"]["$gte"] = filters["ts_from"]
+        if "ts_to" in filters:
+            clauses["archived_ts"]["$lt"] = filters["ts_to"]
+    if "has_notion" in filters:
+        clauses["has_notion"] = {"$eq": filters["has_notion"]}
+    return clauses
+
+QUANTIZATION_MODES = ("none", "int8", "float16")
+
+def _quantize(vectors: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Représentation compacte de lignes normalisées : (codes, échelles par ligne).
+
+    int8 : quantification symétrique par ligne (4× plus petit que float32) ;
+    float16 : simple demi-précision (2×), sans échelle.
+    """
+    if mode == "float16":
+        return vectors.astype(np.float16), None
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def _approx_scores(codes: np.ndarray, scales: Optional[np.ndarray], rows: np.ndarray,
+                   queries: np.ndarray) -> np.ndarray:
+    """Scores approchés (lignes × requêtes) sur les codes quantifiés.
+
+    Décodage par petits blocs (rows triées) : la copie float32 temporaire tient en cache,
+    et le premier passage int8 coûte à peu près un produit float32 sur 4× moins de mémoire.
+    """
+    out = np.empty((len(rows), queries.shape[0]), dtype=np.float32)
+    contiguous = len(rows) > 0 and int(rows[-1]) - int(rows[0]) + 1 == len(rows)
+    for start in range(0, len(rows), 256):
+        block = rows[start:start + 256]
+        codes_block = codes[block[0]:block[-1] + 1] if contiguous else codes[block]
+        scores = codes_block.astype(np.float32) @ queries.T
+        if scales is not None:
+            scores *= scales[block][:, None]
+        out[start:start + len(block)] = scores
+    return out
+
+class _MMMStore:
+    """Store d'embeddings append-only du fallback local.
+
+    Layout sous MMM_STORE_DIR :
+      store.json            en-tête {dim, generation} (remplacé atomiquement)
+      vectors.<gen>.f32     lignes float32 pré-normalisées de largeur fixe (memory-mappées)
+      meta.<gen>.jsonl      sidecar : une ligne par vecteur, ou {"tombstone": id}
+
+    Un archive_id réindexé est ré-appendé : l'ancienne ligne devient morte.
+    La compaction réécrit les lignes vivantes dans une nouvelle génération.
+    Les métadonnées filtrables (source, archived_at, présence Notion) sont aussi
+    tenues en colonnes numpy, pour filtrer par masques vectorisés avant scoring.
+
+    Avec MMM_QUANTIZATION (int8 | float16), seule une copie quantifiée des vecteurs
+    reste en mémoire pour le premier passage ; la shortlist (top_k × MMM_RESCORE_FACTOR)
+    est re-scorée en float32 par lectures ciblées du fichier, qui n'est plus mappé en entier.
+    """
+
+    label = "JSON-fallback"
+
+    def __init__(self, directory: str, dim: int, legacy_json: bool = False,
+                 quantization: str = MMM_QUANTIZATION):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"MMM_QUANTIZATION must be one of {', '.join(QUANTIZATION_MODES)}")
+        self.directory = directory
+        self.dim = dim
+        self.legacy_json = legacy_json  # importer MMM_INDEX_FILE à la création
+        self.quantization = quantization
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._generation = 0
+        self._size = 0
+        self._dead = 0
+        self._meta_end = 0  # fin de la dernière ligne de métadonnées valide (octets)
+        self._alive = np.zeros(0, dtype=bool)
+        self._source_code = np.zeros(0, dtype=np.int32)  # colonnes de métadonnées (par ligne)
+        self._archived_ts = np.zeros(0, dtype=np.float64)  # NaN si inconnu
+        self._has_notion = np.zeros(0, dtype=bool)
+        self._source_ids: Dict[str, int] = {}
+        self._entries: List[Optional[Dict]] = []  # métadonnées par ligne (None si morte)
+        self._rows: Dict[str, int] = {}  # archive_id -> ligne vivante
+        self._mm: Optional[np.memmap] = None
+        self._codes: Optional[np.ndarray] = None  # copie quantifiée (par ligne), si quantization != none
+        self._scales: Optional[np.ndarray] = None  # échelles int8 (par ligne)
+
+    # -- chemins --
+    def _header_path(self) -> str:
+        return os.path.join(self.directory, "store.json")
+
+    def _vectors_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"vectors.{generation}.f32")
+
+    def _meta_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"meta.{generation}.jsonl")
+
+    # -- chargement --
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self._header_path()):
+            with open(self._header_path(), "r", encoding="utf-8") as f:
+                header = json.load(f)
+            if header.get("dim") != self.dim:
+                self._restart_for_dimension(header)
+            else:
+                self._generation = header["generation"]
+                self._replay()
+                self._loaded = True
+                self._load_codes()
+                self._on_reload()
+                self._release_matrix()
+        else:
+            self._write_header(0)
+            self._loaded = True
+            self._on_reload()
+            if self.legacy_json and os.path.exists(MMM_INDEX_FILE):
+                self._migrate_locked(_load_mmm_index())
+        print(f"MMM[{self.label}]: store loaded — {len(self._rows)} live vectors, {self._dead} dead")
+
+    def _restart_for_dimension(self, header: Dict) -> None:
+        """EMBED_DIMENSIONS a changé : les vecteurs stockés ne sont plus comparables.
+
+        Le store repart vide dans une nouvelle génération. Les entrées du manifeste,
+        indexées sous une autre EMBED_MODEL_KEY, passent en « stale » : le prochain
+        reindex ré-embedde les archives locales (les push sans fichier sont perdus).
+        """
+        old_gen = header.get("generation", 0)
+        self._write_header(old_gen + 1)
+        self._loaded = True
+        self._on_reload()
+        for path in (self._vectors_path(old_gen), self._meta_path(old_gen)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        print(f"MMM[{self.label}]: store dimension {header.get('dim')} -> {self.dim} — "
+              f"vectors dropped, new generation {old_gen + 1}; run `reindex` to re-embed the archives")
+
+    def _write_header(self, generation: int) -> None:
+        tmp = self._header_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "dim": self.dim, "generation": generation}, f)
+        os.replace(tmp, self._header_path())
+        self._generation = generation
+
+    def _replay(self) -> None:
+        vec_path = self._vectors_path(self._generation)
+        meta_path = self._meta_path(self._generation)
+        vec_rows = os.path.getsize(vec_path) // (self.dim * 4) if os.path.exists(vec_path) else 0
+        self._meta_end = 0
+        if os.path.exists(meta_path):
+            with open(meta_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # ligne tronquée (crash pendant un append)
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        break
+                    if "tombstone" in event:
+                        self._kill(self._rows.pop(event["tombstone"], None))
+                    elif len(self._entries) >= vec_rows:
+                        break  # vecteur absent
+                    else:
+                        self._register(event)
+                    self._meta_end += len(line)
+            # Reste d'un append interrompu : coupé, sinon les lignes suivantes s'y colleraient
+            # et seraient perdues au prochain replay
+            if os.path.getsize(meta_path) > self._meta_end:
+                print(f"MMM[{self.label}]: truncating torn metadata at byte {self._meta_end}")
+                with open(meta_path, "r+b") as f:
+                    f.truncate(self._meta_end)
+        # Vecteurs écrits sans ligne de métadonnées, ou ligne partielle (crash) : on tronque
+        if os.path.exists(vec_path) and os.path.getsize(vec_path) > self._size * self.dim * 4:
+            with open(vec_path, "r+b") as f:
+                f.truncate(self._size * self.dim * 4)
+
+    @staticmethod
+    def _write_at(path: str, offset: int, data: bytes) -> int:
+        """Écrit data à offset (fin valide connue du fichier), en coupant tout reste
+        d'une écriture interrompue. Retourne la nouvelle fin."""
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            f.seek(offset)
+            f.truncate()
+            f.write(data)
+        return offset + len(data)
+
+    # -- état en mémoire --
+    def _register(self, entry: Dict) -> int:
+        row = self._size
+        if row == self._alive.shape[0]:
+            self._grow(max(64, row * 2))
+        self._kill(self._rows.get(entry["archive_id"]))
+        self._alive[row] = True
+        source = entry.get("source", "")
+        self._source_code[row] = self._source_ids.setdefault(source, len(self._source_ids))
+        ts = entry.get("archived_ts")
+        self._archived_ts[row] = ts if ts is not None else (_iso_to_ts(entry.get("archived_at")) or np.nan)
+        self._has_notion[row] = bool(entry.get("notion_url"))
+        self._entries.append(entry)
+        self._rows[entry["archive_id"]] = row
+        self._size += 1
+        return row
+
+    def _grow(self, capacity: int) -> None:
+        row = self._size
+        for name in ("_alive", "_source_code", "_archived_ts", "_has_notion"):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:row] = old[:row]
+            setattr(self, name, grown)
+        if self.quantization != "none":
+            codes = np.zeros((capacity, self.dim), dtype=np.int8 if self.quantization == "int8" else np.float16)
+            scales = np.ones(capacity, dtype=np.float32)
+            if self._codes is not None:
+                codes[:row] = self._codes[:row]
+                scales[:row] = self._scales[:row]
+            self._codes, self._scales = codes, scales
+
+    def _filter_mask(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Masque des lignes vivantes satisfaisant les filtres (None si aucun filtre)."""
+        if not filters:
+            return None
+        n = self._size
+        mask = self._alive[:n].copy()
+        if "sources" in filters:
+            codes = [self._source_ids[s] for s in filters["sources"] if s in self._source_ids]
+            mask &= np.isin(self._source_code[:n], codes)
+        with np.errstate(invalid="ignore"):
+            if "ts_from" in filters:
+                mask &= self._archived_ts[:n] >= filters["ts_from"]
+            if "ts_to" in filters:
+                mask &= self._archived_ts[:n] < filters["ts_to"]
+        if "has_notion" in filters:
+            mask &= self._has_notion[:n] == filters["has_notion"]
+        return mask
+
+    def _kill(self, row: Optional[int]) -> None:
+        if row is None or not self._alive[row]:
+            return
+        self._alive[row] = False
+        self._entries[row] = None
+        self._dead += 1
+
+    @staticmethod
+    def _normalize(vec) -> Optional[np.ndarray]:
+        v = np.asarray(vec, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        if norm == 0.0:
+            return None
+        return v / norm
+
+    def _matrix(self) -> np.ndarray:
+        if self._size == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        if self._mm is None or self._mm.shape[0] != self._size:
+            self._mm = np.memmap(self._vectors_path(self._generation), dtype=np.float32,
+                                 mode="r", shape=(self._size, self.dim))
+        return self._mm
+
+    # -- représentation quantifiée --
+    def _quantize_rows(self, first_row: int, vectors: np.ndarray) -> None:
+        codes, scales = _quantize(vectors, self.quantization)
+        self._codes[first_row:first_row + len(codes)] = codes
+        if scales is not None:
+            self._scales[first_row:first_row + len(codes)] = scales
+
+    def _load_codes(self) -> None:
+        """(Re)construit la copie quantifiée depuis le fichier float32, par blocs."""
+        if self.quantization == "none" or self._size == 0:
+            return
+        mat = self._matrix()
+        for start in range(0, self._size, 8192):
+            self._quantize_rows(start, np.asarray(mat[start:start + 8192]))
+
+    def _release_matrix(self) -> None:
+        """En mode quantifié, démappe le fichier float32 : ses pages ne restent pas résidentes."""
+        if self.quantization != "none":
+            self._mm = None
+
+    def _exact_rows(self, rows: np.ndarray) -> np.ndarray:
+        """Vecteurs float32 des lignes (triées) : memmap, ou lectures ciblées en mode quantifié."""
+        if self.quantization == "none":
+            return np.asarray(self._matrix()[rows])
+        row_bytes = self.dim * 4
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        with open(self._vectors_path(self._generation), "rb") as f:
+            for i, row in enumerate(rows):
+                f.seek(int(row) * row_bytes)
+                out[i] = np.frombuffer(f.read(row_bytes), dtype=np.float32)
+        return out
+
+    # -- écriture --
+    def _append_locked(self, items: List[Tuple[Dict, List[float]]]) -> int:
+        vec_chunks, meta_lines = [], []
+        for entry, embedding in items:
+            vec = self._normalize(embedding)
+            if vec is None or vec.shape[0] != self.dim:
+                continue
+            vec_chunks.append(vec.tobytes())
+            meta_lines.append(entry)
+        if not meta_lines:
+            return 0
+        # Vecteurs d'abord, métadonnées ensuite : au replay, une ligne de métadonnées
+        # n'est prise en compte que si son vecteur est présent.
+        self._write_at(self._vectors_path(self._generation), self._size * self.dim * 4, b"".join(vec_chunks))
+        self._meta_end = self._write_at(
+            self._meta_path(self._generation), self._meta_end,
+            "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in meta_lines).encode("utf-8"),
+        )
+        first_row = self._size
+        for entry in meta_lines:
+            self._register(entry)
+        vectors = np.frombuffer(b"".join(vec_chunks), dtype=np.float32).reshape(-1, self.dim)
+        if self.quantization != "none":
+            self._quantize_rows(first_row, vectors)
+        self._on_append(first_row, vectors)
+        self._maybe_compact_locked()
+        self._release_matrix()
+        return len(meta_lines)
+
+    # -- extensions (index secondaires sur les lignes du store) --
+    def _on_append(self, first_row: int, vectors: np.ndarray) -> None:
+        """Appelé après l'ajout des lignes [first_row, first_row + len(vectors))."""
+
+    def _on_reload(self) -> None:
+        """Appelé quand les numéros de ligne ont changé (chargement, compaction)."""
+
+    def upsert(self, archive_id: str, entry: Dict, embedding: List[float]) -> None:
+        self.upsert_many([(archive_id, entry, embedding)])
+
+    def upsert_many(self, items: List[Tuple[str, Dict, List[float]]]) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return self._append_locked([
+                (dict(entry, archive_id=archive_id), embedding) for archive_id, entry, embedding in items
+            ])
+
+    def delete(self, archive_id: str) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            if archive_id not in self._rows:
+                return False
+            self._meta_end = self._write_at(self._meta_path(self._generation), self._meta_end,
+                                            (json.dumps({"tombstone": archive_id}) + "\n").encode("utf-8"))
+            self._kill(self._rows.pop(archive_id))
+            self._maybe_compact_locked()
+            return True
+
+    # -- compaction --
+    def _maybe_compact_locked(self) -> None:
+        if self._dead >= MMM_COMPACT_MIN_DEAD and self._dead >= MMM_COMPACT_RATIO * self._size:
+            self._compact_locked()
+
+    def _compact_locked(self) -> None:
+        old_gen = self._generation
+        new_gen = old_gen + 1
+        live = np.flatnonzero(self._alive[:self._size])
+        mat = self._matrix()
+        with open(self._vectors_path(new_gen), "wb") as f:
+            for start in range(0, len(live), 4096):
+                f.write(np.ascontiguousarray(mat[live[start:start + 4096]]).tobytes())
+        entries = [self._entries[i] for i in live]
+        with open(self._meta_path(new_gen), "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._write_header(new_gen)  # bascule atomique vers la nouvelle génération
+        self._meta_end = os.path.getsize(self._meta_path(new_gen))
+        self._mm = None
+        self._size, self._dead = 0, 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._codes = self._scales = None
+        self._entries, self._rows = [], {}
+        for entry in entries:
+            self._register(entry)
+        self._load_codes()
+        self._on_reload()
+        self._release_matrix()
+        for path in (self._vectors_path(old_gen), self._meta_path(old_gen)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        print(f"MMM[{self.label}]: compacted store to generation {new_gen} ({len(entries)} live vectors)")
+
+    def compact(self) -> None:
+        with self._lock:
+            self._ensure_loaded()
+            self._compact_locked()
+
+    # -- migration --
+    def _migrate_locked(self, index: List[Dict]) -> int:
+        items = []
+        for entry in index:
+            emb = entry.pop("embedding", None)
+            if emb and entry.get("archive_id"):
+                items.append((entry, emb))
+        count = self._append_locked(items)
+        print(f"MMM[{self.label}]: migrated {count} entries from {MMM_INDEX_FILE}")
+        return count
+
+    def migrate_json(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return self._migrate_locked(_load_mmm_index())
+
+    # -- lecture --
+    def _top_k(self, rows: np.ndarray, scores: np.ndarray, top_k: int) -> List[Tuple[float, Dict]]:
+        """Sélectionne les top_k lignes vivantes parmi rows (scores alignés sur rows)."""
+        keep = self._alive[rows]
+        rows, scores = rows[keep], scores[keep]
+        k = min(top_k, len(rows))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self._entries[rows[i]]) for i in top]
+
+    def _rank(self, rows: np.ndarray, queries: np.ndarray, top_k: int) -> List[List[Tuple[float, Dict]]]:
+        """Top-k de chaque requête parmi rows (triées).
+
+        Sans quantification : scores exacts, un produit matrice-matrice.
+        Sinon : premier passage sur les codes, puis re-scoring exact de la shortlist.
+        """
+        if self.quantization == "none":
+            mat = self._matrix()
+            scores = (mat if len(rows) == self._size else mat[rows]) @ queries.T
+            return [self._top_k(rows, scores[:, j], top_k) for j in range(queries.shape[0])]
+        rows = rows[self._alive[rows]]
+        if len(rows) == 0:
+            return [[] for _ in range(queries.shape[0])]
+        approx = _approx_scores(self._codes, self._scales, rows, queries)
+        shortlist = min(len(rows), top_k * max(1, MMM_RESCORE_FACTOR))
+        results = []
+        for j in range(queries.shape[0]):
+            candidates = rows
+            if shortlist < len(rows):
+                candidates = np.sort(rows[np.argpartition(-approx[:, j], shortlist - 1)[:shortlist]])
+            results.append(self._top_k(candidates, self._exact_rows(candidates) @ queries[j], top_k))
+        return results
+
+    def search(self, query_embedding: List[float], top_k: int, **knobs) -> List[Tuple[float, Dict]]:
+        q = self._normalize(query_embedding)
+        if q is None or top_k <= 0:
+            return []
+        with self._lock:
+            self._ensure_loaded()
+            if not self._rows:
+                return []
+            return self._search_locked(q, top_k, **knobs)
+
+    def _search_locked(self, q: np.ndarray, top_k: int, filters: Optional[Dict] = None,
+                       **knobs) -> List[Tuple[float, Dict]]:
+        mask = self._filter_mask(filters)
+        # Pré-filtrage : seules les lignes retenues sont lues et scorées ;
+        # sans filtre, recherche exacte sur toutes les lignes
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(self._size)
+        return self._rank(rows, q[None, :], top_k)[0] if len(rows) else []
+
+    def search_many(self, query_embeddings: List[Optional[List[float]]], top_k: int,
+                    **knobs) -> List[List[Tuple[float, Dict]]]:
+        """Recherche de plusieurs requêtes en un passage (embeddings invalides : résultat vide)."""
+        results: List[List[Tuple[float, Dict]]] = [[] for _ in query_embeddings]
+        normalized = [self._normalize(e) if e else None for e in query_embeddings]
+        valid = [i for i, q in enumerate(normalized) if q is not None]
+        if not valid or top_k <= 0:
+            return results
+        queries = np.stack([normalized[i] for i in valid])
+        with self._lock:
+            self._ensure_loaded()
+            if not self._rows:
+                return results
+            for i, hits in zip(valid, self._search_many_locked(queries, top_k, **knobs)):
+                results[i] = hits
+        return results
+
+    def _search_many_locked(self, queries: np.ndarray, top_k: int, filters: Optional[Dict] = None,
+                            **knobs) -> List[List[Tuple[float, Dict]]]:
+        # Recherche exacte : un seul produit matrice-matrice (lignes × requêtes)
+        mask = self._filter_mask(filters)
+        rows = np.flatnonzero(mask) if mask is not None else np.arange(self._size)
+        if len(rows) == 0:
+            return [[] for _ in range(queries.shape[0])]
+        return self._rank(rows, queries, top_k)
+
+    def count(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._rows)
+
+    def entries(self) -> List[Dict]:
+        with self._lock:
+            self._ensure_loaded()
+            return [self._entries[row] for row in self._rows.values()]
+
+class _MMMIvfStore(_MMMStore):
+    """Backend ANN local : store binaire + partitionnement IVF (k-means sphérique).
+
+    Les centroïdes sont persistés (ivf_centroids.npy) ; l'affectation des lignes
+    aux listes est recalculée au chargement et maintenue à chaque insertion.
+    Une recherche ne score que les nprobe listes les plus proches de la requête.
+    Sous MMM_IVF_TRAIN_MIN vecteurs, la recherche reste exacte.
+    """
+
+    label = "local-ivf"
+
+    def __init__(self, directory: str, dim: int, quantization: str = MMM_QUANTIZATION):
+        super().__init__(directory, dim, quantization=quantization)
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_size = 0
+        self._lists: List[List[int]] = []
+        self._list_arrays: Dict[int, np.ndarray] = {}  # cache numpy des listes
+
+    def _centroids_path(self) -> str:
+        return os.path.join(self.directory, "ivf_centroids.npy")
+
+    def _on_reload(self) -> None:
+        if self._centroids is None and os.path.exists(self._centroids_path()):
+            centroids = np.load(self._centroids_path())
+            if centroids.ndim == 2 and centroids.shape[1] == self.dim:
+                self._centroids = centroids.astype(np.float32)
+                self._trained_size = self._size
+        self._assign_all()
+
+    def _on_append(self, first_row: int, vectors: np.ndarray) -> None:
+        live = len(self._rows)
+        if self._centroids is None:
+            if live >= MMM_IVF_TRAIN_MIN:
+                self._train()
+            return
+        if live >= 4 * self._trained_size:
+            self._train()  # le corpus a fortement grandi : on repartitionne
+            return
+        self._assign(first_row, vectors)
+
+    def _assign(self, first_row: int, vectors: np.ndarray) -> None:
+        labels = np.argmax(vectors @ self._centroids.T, axis=1)
+        for offset, label in enumerate(labels):
+            self._lists[label].append(first_row + offset)
+            self._list_arrays.pop(int(label), None)
+
+    def _assign_all(self) -> None:
+        self._list_arrays = {}
+        if self._centroids is None:
+            self._lists = []
+            return
+        self._lists = [[] for _ in range(self._centroids.shape[0])]
+        mat = self._matrix()
+        for start in range(0, self._size, 8192):
+            self._assign(start, np.asarray(mat[start:start + 8192]))
 
-    # Métadonnées pour Pinecone (strings/numbers uniquement)
+    def _train(self) -> None:
+        live = np.flatnonzero(self._alive[:self._size])
+        nlist = MMM_IVF_NLIST or max(1, int(np.sqrt(len(live))))
+        nlist = min(nlist, len(live))
+        rng = np.random.default_rng(0)
+        sample = live if len(live) <= nlist * 64 else rng.choice(live, nlist * 64, replace=False)
+        data = np.asarray(self._matrix()[np.sort(sample)])
+        centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+        for _ in range(10):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, data)
+            norms = np.linalg.norm(sums, axis=1)
+            empty = norms == 0
+            if empty.any():
+                sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+                norms[empty] = np.linalg.norm(sums[empty], axis=1)
+            centroids = (sums / norms[:, None]).astype(np.float32)
+        self._centroids = centroids
+        self._trained_size = len(live)
+        np.save(self._centroids_path(), centroids)
+        self._assign_all()
+        print(f"MMM[{self.label}]: trained {nlist} lists on {len(data)} vectors")
+
+    def _list_rows(self, label: int) -> np.ndarray:
+        arr = self._list_arrays.get(label)
+        if arr is None:
+            arr = np.asarray(self._lists[label], dtype=np.int64)
+            self._list_arrays[label] = arr
+        return arr
+
+    def _probe_rows(self, probes: np.ndarray, mask: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """Lignes des listes sondées, restreintes au masque de filtres.
+
+        None si le filtre est plus sélectif que le sondage : la recherche exacte
+        sur les seules lignes filtrées est alors moins coûteuse (et sans perte de rappel).
+        """
+        rows = np.concatenate([self._list_rows(int(p)) for p in probes])
+        if mask is not None:
+            if int(mask.sum()) <= len(rows):
+                return None
+            rows = rows[mask[rows]]
+        rows.sort()  # accès séquentiels dans le memmap
+        return rows
+
+    def _search_locked(self, q: np.ndarray, top_k: int, nprobe: Optional[int] = None,
+                       filters: Optional[Dict] = None, **knobs):
+        if self._centroids is None:
+            return super()._search_locked(q, top_k, filters=filters, **knobs)
+        nprobe = min(nprobe or MMM_IVF_NPROBE, self._centroids.shape[0])
+        probes = np.argpartition(-(self._centroids @ q), nprobe - 1)[:nprobe]
+        rows = self._probe_rows(probes, self._filter_mask(filters))
+        if rows is None:
+            return super()._search_locked(q, top_k, filters=filters, **knobs)
+        if len(rows) == 0:
+            return []
+        return self._rank(rows, q[None, :], top_k)[0]
+
+    def _search_many_locked(self, queries: np.ndarray, top_k: int, nprobe: Optional[int] = None,
+                            filters: Optional[Dict] = None, **knobs):
+        if self._centroids is None:
+            return super()._search_many_locked(queries, top_k, filters=filters, **knobs)
+        # Union des listes sondées par chaque requête, scorée en un produit matrice-matrice
+        nprobe = min(nprobe or MMM_IVF_NPROBE, self._centroids.shape[0])
+        probes = np.argpartition(-(queries @ self._centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        rows = self._probe_rows(np.unique(probes), self._filter_mask(filters))
+        if rows is None:
+            return super()._search_many_locked(queries, top_k, filters=filters, **knobs)
+        if len(rows) == 0:
+            return [[] for _ in range(queries.shape[0])]
+        return self._rank(rows, queries, top_k)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                "nlist": 0 if self._centroids is None else int(self._centroids.shape[0]),
+                "nprobe": MMM_IVF_NPROBE,
+                "trained_size": self._trained_size,
+                "quantization": self.quantization,
+            }
+
+_mmm_store = _MMMStore(MMM_STORE_DIR, EMBED_DIMENSION, legacy_json=True)
+_mmm_ivf = _MMMIvfStore(MMM_IVF_DIR, EMBED_DIMENSION)
+
+def mmm_quantization_report(store: _MMMStore, sample: int = 200, top_k: int = 10) -> Dict[str, Any]:
+    """Rappel@k et latence de chaque représentation, sur les vecteurs du store.
+
+    Chaque requête est un vecteur du store (exclu de ses propres résultats) ;
+    la vérité terrain est la recherche exacte float32. Outil hors ligne :
+    la matrice float32 est chargée entièrement en mémoire.
+    """
+    with store._lock:
+        store._ensure_loaded()
+        live = np.flatnonzero(store._alive[:store._size])
+        mat = np.asarray(store._matrix()[live]) if len(live) else np.zeros((0, store.dim), dtype=np.float32)
+        store._release_matrix()
+    n = len(live)
+    if n <= top_k:
+        return {"vectors": n, "error": f"need more than {top_k} live vectors"}
+    rng = np.random.default_rng(0)
+    picks = rng.choice(n, min(sample, n), replace=False)
+    rows = np.arange(n)
+
+    def _top(scores: np.ndarray, exclude: int, candidates: np.ndarray = rows) -> np.ndarray:
+        scores[candidates == exclude] = -np.inf
+        k = min(top_k, len(candidates) - 1)
+        return candidates[np.argpartition(-scores, k - 1)[:k]]
+
+    truth, exact_time = [], 0.0
+    for i in picks:
+        started = time.perf_counter()
+        truth.append(set(_top(mat @ mat[i], i).tolist()))
+        exact_time += time.perf_counter() - started
+    report: Dict[str, Any] = {
+        "vectors": n, "dim": store.dim, "queries": len(picks), "top_k": top_k,
+        "rescore_factor": MMM_RESCORE_FACTOR,
+        "modes": {"float32": {"recall_at_k": 1.0, "ms_per_query": round(exact_time * 1000 / len(picks), 3),
+                              "bytes": int(mat.nbytes), "compression": 1.0}},
+    }
+    shortlist = min(n, (top_k + 1) * max(1, MMM_RESCORE_FACTOR))
+    for mode in ("float16", "int8"):
+        codes, scales = _quantize(mat, mode)
+        nbytes = int(codes.nbytes + (scales.nbytes if scales is not None else 0))
+        for rescore in (False, True):
+            hits, elapsed = 0, 0.0
+            for i, expected in zip(picks, truth):
+                started = time.perf_counter()
+                approx = _approx_scores(codes, scales, rows, mat[i][None, :])[:, 0]
+                if rescore:
+                    candidates = np.sort(np.argpartition(-approx, shortlist - 1)[:shortlist])
+                    found = _top(mat[candidates] @ mat[i], i, candidates)
+                else:
+                    found = _top(approx, i)
+                elapsed += time.perf_counter() - started
+                hits += len(expected & set(found.tolist()))
+            report["modes"][f"{mode}+rescore" if rescore else mode] = {
+                "recall_at_k": round(hits / sum(len(t) for t in truth), 4),
+                "ms_per_query": round(elapsed * 1000 / len(picks), 3),
+                "bytes": nbytes,
+                "compression": round(mat.nbytes / nbytes, 2),
+            }
+    return report
+
+class _MMMLexicalIndex:
+    """Index inversé BM25 (SQLite FTS5) sur le chunk_text des records MMM.
+
+    Indépendant des embeddings : répond même sans OPENAI_API_KEY. Alimenté par
+    mmm_index_records ; initialisé depuis le store local à la création.
+    doc_ids.archived_ts (epoch) sert au filtre de dates, comme pour les vecteurs.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = _open_sqlite(self.db_path)
+            fresh = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks'"
+            ).fetchone() is None
+            conn.execute("CREATE TABLE IF NOT EXISTS doc_ids (id INTEGER PRIMARY KEY, archive_id TEXT UNIQUE NOT NULL, "
+                         "archived_ts REAL)")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+                "title, chunk_text, archive_id UNINDEXED, source UNINDEXED, archived_at UNINDEXED, "
+                "notion_url UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(doc_ids)")]
+            if "archived_ts" not in columns:  # index créé avant la colonne : rempli depuis archived_at
+                conn.execute("ALTER TABLE doc_ids ADD COLUMN archived_ts REAL")
+                conn.executemany("UPDATE doc_ids SET archived_ts = ? WHERE id = ?",
+                                 [(_iso_to_ts(archived_at), rowid)
+                                  for rowid, archived_at in conn.execute("SELECT rowid, archived_at FROM chunks")])
+            self._conn = conn
+            if fresh:
+                store = _mmm_ivf if MMM_BACKEND == "local-ivf" else _mmm_store
+                self._upsert_locked([(e["archive_id"], e) for e in store.entries()])
+        return self._conn
+
+    def _upsert_locked(self, items: List[Tuple[str, Dict]]) -> None:
+        db = self._conn
+        db.execute("BEGIN")
+        try:
+            for archive_id, metadata in items:
+                archived_ts = metadata.get("archived_ts")
+                if archived_ts is None:
+                    archived_ts = _iso_to_ts(metadata.get("archived_at"))
+                db.execute("INSERT OR IGNORE INTO doc_ids (archive_id) VALUES (?)", (archive_id,))
+                doc_id = db.execute("SELECT id FROM doc_ids WHERE archive_id = ?", (archive_id,)).fetchone()[0]
+                db.execute("UPDATE doc_ids SET archived_ts = ? WHERE id = ?", (archived_ts, doc_id))
+                db.execute("DELETE FROM chunks WHERE rowid = ?", (doc_id,))
+                db.execute(
+                    "INSERT INTO chunks (rowid, title, chunk_text, archive_id, source, archived_at, notion_url) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (doc_id, metadata.get("title", ""), metadata.get("chunk_text", ""), archive_id,
+                     metadata.get("source", ""), metadata.get("archived_at", ""), metadata.get("notion_url", ""))
+                )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def upsert_many(self, items: List[Tuple[str, Dict]]) -> None:
+        with self._lock:
+            self._db()
+            self._upsert_locked(items)
+
+    def delete(self, archive_id: str) -> None:
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT id FROM doc_ids WHERE archive_id = ?", (archive_id,)).fetchone()
+            if row is not None:
+                db.execute("DELETE FROM chunks WHERE rowid = ?", (row[0],))
+                db.execute("DELETE FROM doc_ids WHERE id = ?", (row[0],))
+
+    @staticmethod
+    def _match_expr(query: str) -> str:
+        terms = re.findall(r"\w+", query.lower())
+        return " OR ".join(f'"{t}"' for t in terms)
+
+    @staticmethod
+    def _filter_sql(filters: Optional[Dict[str, Any]]) -> Tuple[str, List]:
+        if not filters:
+            return "", []
+        clauses, params = [], []
+        if "sources" in filters:
+            clauses.append(f"source IN ({', '.join('?' * len(filters['sources']))})")
+            params.extend(filters["sources"])
+        # Bornes epoch normalisées par _search_filters : même fenêtre que les vecteurs
+        if "ts_from" in filters:
+            clauses.append("doc_ids.archived_ts >= ?")
+            params.append(filters["ts_from"])
+        if "ts_to" in filters:
+            clauses.append("doc_ids.archived_ts < ?")
+            params.append(filters["ts_to"])
+        if "has_notion" in filters:
+            clauses.append("notion_url != ''" if filters["has_notion"] else "(notion_url = '' OR notion_url IS NULL)")
+        return "".join(f" AND {c}" for c in clauses), params
+
+    def search(self, query: str, top_k: int, filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
+        expr = self._match_expr(query)
+        if not expr or top_k <= 0:
+            return []
+        where, params = self._filter_sql(filters)
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT chunks.archive_id, title, source, archived_at, notion_url, chunk_text, "
+                "bm25(chunks, 2.0, 1.0) AS rank FROM chunks JOIN doc_ids ON doc_ids.id = chunks.rowid "
+                f"WHERE chunks MATCH ?{where} ORDER BY rank LIMIT ?",
+                [expr, *params, top_k]
+            ).fetchall()
+        return [{
+            "archive_id": r[0],
+            "title": r[1],
+            "source": r[2],
+            "archived_at": r[3],
+            "notion_url": r[4],
+            "chunk_text": r[5][:1000],
+            "score": round(-r[6], 4),
+            "backend": "lexical",
+        } for r in rows]
+
+_mmm_lexical = _MMMLexicalIndex(MMM_LEXICAL_DB)
+
+def _rrf_fuse(rankings: List[List[Dict]], top_k: int, backend: Optional[str] = "hybrid") -> List[Dict]:
+    """Fusion reciprocal-rank : score = Σ 1 / (MMM_RRF_K + rang).
+
+    backend None : chaque résultat garde le backend qui l'a produit.
+    """
+    fused: Dict[str, Dict] = {}
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, 1):
+            archive_id = result["archive_id"]
+            fused.setdefault(archive_id, result)
+            scores[archive_id] = scores.get(archive_id, 0.0) + 1.0 / (MMM_RRF_K + rank)
+    ordered = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [dict(fused[a], score=round(scores[a], 6), backend=backend or fused[a].get("backend"))
+            for a in ordered]
+
+def _chunk_hash(chunk_text: str) -> str:
+    return hashlib.sha256(chunk_text.encode("utf-8")).hexdigest()
+
+class _MMMManifest:
+    """Manifeste d'indexation : archive_id -> (hash du texte embeddé, modèle, backend,
+    indexed_at, fichier source et son mtime).
+
+    Permet au re-indexage de ne traiter que les archives nouvelles, modifiées ou
+    indexées avec un autre modèle/backend, et de détecter les orphelins.
+    """
+
+    FIELDS = ("archive_id", "chunk_hash", "model", "backend", "indexed_at", "file", "file_mtime")
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = _open_sqlite(self.db_path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS manifest ("
+                "archive_id TEXT PRIMARY KEY, chunk_hash TEXT NOT NULL, model TEXT NOT NULL, backend TEXT NOT NULL,"
+                " indexed_at TEXT NOT NULL, file TEXT, file_mtime INTEGER)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def record(self, items: List[Tuple[str, str, Optional[str]]], backend: str) -> None:
+        """Enregistre des archives indexées : [(archive_id, chunk_hash, fichier local ou None)].
+
+        Le lien vers un fichier déjà connu est conservé (seul son mtime est oublié) :
+        une archive sans fichier local (push seul) n'est jamais prise pour un orphelin.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            db.executemany(
+                "INSERT INTO manifest (archive_id, chunk_hash, model, backend, indexed_at, file, file_mtime)"
+                " VALUES (?, ?, ?, ?, ?, ?, NULL) ON CONFLICT (archive_id) DO UPDATE SET"
+                " chunk_hash = excluded.chunk_hash, model = excluded.model, backend = excluded.backend,"
+                " indexed_at = excluded.indexed_at, file = COALESCE(excluded.file, manifest.file), file_mtime = NULL",
+                [(archive_id, chunk_hash, EMBED_MODEL_KEY, backend, now, file)
+                 for archive_id, chunk_hash, file in items],
+            )
+            db.execute("COMMIT")
+
+    def touch(self, items: List[Tuple[str, str, str, int]]) -> None:
+        """Associe fichier et mtime aux entrées dont le hash correspond : [(archive_id, chunk_hash, file, mtime)]."""
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            db.executemany("UPDATE manifest SET file = ?, file_mtime = ? WHERE archive_id = ? AND chunk_hash = ?",
+                           [(file, mtime, archive_id, chunk_hash) for archive_id, chunk_hash, file, mtime in items])
+            db.execute("COMMIT")
+
+    def remove(self, archive_ids: List[str]) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            db.executemany("DELETE FROM manifest WHERE archive_id = ?", [(a,) for a in archive_ids])
+            db.execute("COMMIT")
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            rows = self._db().execute(f"SELECT {', '.join(self.FIELDS)} FROM manifest").fetchall()
+        return {row[0]: dict(zip(self.FIELDS, row)) for row in rows}
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM manifest").fetchone()[0]
+
+_mmm_manifest = _MMMManifest(MMM_MANIFEST_DB)
+
+class _SearchCache:
+    """Cache LRU + TTL des réponses de recherche MMM.
+
+    Chaque entrée porte la génération de l'index lue avant le calcul ; toute
+    indexation incrémente la génération et rend les entrées antérieures caduques.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, Tuple[int, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query: str, *params) -> Tuple:
+        return (" ".join(query.lower().split()),) + params
+
+    def bump(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == self.generation and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                _metrics.inc("yos_search_cache_total", result="hit")
+                return entry[2]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+        _metrics.inc("yos_search_cache_total", result="miss")
+        return None
+
+    def put(self, key: Tuple, generation: int, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return  # index modifié pendant le calcul
+            self._entries[key] = (generation, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "generation": self.generation,
+                    "hits": self.hits, "misses": self.misses, "ttl": self.ttl}
+
+_search_cache = _SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+def _mmm_metadata(record: Dict, chunk_text: str) -> Dict:
+    """Métadonnées pour Pinecone (strings/numbers/booléens uniquement).
+
+    archived_ts (epoch) et has_notion servent aux filtres de recherche.
+    """
     metadata = {
         "title": record.get("title", "")[:500],
         "source": record.get("source", ""),
         "archived_at": record.get("archived_at", ""),
         "notion_url": record.get("notion_page_url", "")[:500],
+        "has_notion": bool(record.get("notion_page_url")),
         "chunk_text": chunk_text[:1000],
     }
+    archived_ts = _iso_to_ts(record.get("archived_at"))
+    if archived_ts is not None:
+        metadata["archived_ts"] = int(archived_ts)
+    return metadata
+
+def mmm_index_records(records: List[Dict]) -> int:
+    """Indexe un lot de records (embeddings et upserts batchés). Retourne le nombre indexé."""
+    try:
+        return _mmm_index_records(records)
+    finally:
+        _search_cache.bump()  # après toutes les écritures : invalide les résultats en cache
+
+def _mmm_index_records(records: List[Dict]) -> int:
+    prepared = []
+    for record in records:
+        chunk_text = _build_chunk_text(record)
+        if chunk_text.strip():
+            prepared.append((record.get("archive_id", str(uuid.uuid4())), record, chunk_text))
+    if not prepared:
+        return 0
+    # Index lexical : mis à jour même si les embeddings échouent
+    try:
+        _mmm_lexical.upsert_many([(archive_id, _mmm_metadata(record, chunk_text) | {"chunk_text": chunk_text})
+                                  for archive_id, record, chunk_text in prepared])
+    except sqlite3.Error as e:
+        print(f"MMM lexical index error: {e}")
+    embeddings = _embed_texts([chunk_text for _, _, chunk_text in prepared])
+    vectors = [
+        {"id": archive_id, "values": embedding, "metadata": _mmm_metadata(record, chunk_text)}
+        for (archive_id, record, chunk_text), embedding in zip(prepared, embeddings)
+        if embedding
+    ]
+    if not vectors:
+        return 0
+
+    backend = _mmm_upsert_vectors(vectors)
+    hashes = {archive_id: _chunk_hash(chunk_text) for archive_id, _, chunk_text in prepared}
+    files = {archive_id: record.get("local_file") for archive_id, record, _ in prepared}
+    try:
+        _mmm_manifest.record([(v["id"], hashes[v["id"]], files[v["id"]]) for v in vectors], backend)
+    except sqlite3.Error as e:
+        print(f"MMM manifest error: {e}")
+    return len(vectors)
+
+def _mmm_upsert_vectors(vectors: List[Dict]) -> str:
+    """Écrit les vecteurs dans le backend actif. Retourne le backend effectivement utilisé."""
+    # Backend ANN local : remplace Pinecone
+    if MMM_BACKEND == "local-ivf":
+        _mmm_local_upsert(_mmm_ivf, vectors)
+        return "local-ivf"
 
     # Tentative Pinecone
     pc_index = _get_pinecone_index()
     if pc_index is not None:
         try:
-            pc_index.upsert(vectors=[{
-                "id": archive_id,
-                "values": embedding,
-                "metadata": metadata
-            }])
-            print(f"MMM[Pinecone]: indexed '{record.get('title', '')}' ({archive_id})")
-            return True
+            with _metrics.stage("pinecone_upsert"):
+                for start in range(0, len(vectors), PINECONE_UPSERT_BATCH):
+                    pc_index.upsert(vectors=vectors[start:start + PINECONE_UPSERT_BATCH])
+            _pinecone_breaker.success()
+            if len(vectors) == 1:
+                print(f"MMM[Pinecone]: indexed '{vectors[0]['metadata']['title']}' ({vectors[0]['id']})")
+            else:
+                print(f"MMM[Pinecone]: indexed {len(vectors)} records")
+            return "pinecone"
         except Exception as e:
+            _pinecone_breaker.failure(e)
             print(f"Pinecone upsert error: {e} — falling back to JSON")
 
-    # Fallback JSON
-    entry = {**metadata, "archive_id": archive_id, "embedding": embedding}
-    with _mmm_lock:
-        index = _load_mmm_index()
-        index = [e for e in index if e.get("archive_id") != archive_id]
-        index.append(entry)
-        _save_mmm_index(index)
-    print(f"MMM[JSON-fallback]: indexed '{record.get('title', '')}' ({archive_id})")
-    return True
+    # Fallback local (store binaire)
+    _metrics.inc("yos_fallback_total", path="pinecone_upsert_to_local")
+    _mmm_local_upsert(_mmm_store, vectors)
+    return "json-fallback"
+
+def mmm_remove_records(archive_ids: List[str], backends: Dict[str, str]) -> List[str]:
+    """Retire des archives de l'index lexical, du backend vectoriel où elles ont été
+    indexées (backends : archive_id -> backend) et du manifeste. Retourne les ids retirés."""
+    removed: List[str] = []
+    pinecone_ids = [a for a in archive_ids if backends.get(a) == "pinecone"]
+    if pinecone_ids:
+        pc_index = _get_pinecone_index()
+        if pc_index is not None:
+            try:
+                for start in range(0, len(pinecone_ids), PINECONE_UPSERT_BATCH):
+                    pc_index.delete(ids=pinecone_ids[start:start + PINECONE_UPSERT_BATCH])
+                _pinecone_breaker.success()
+                removed.extend(pinecone_ids)
+            except Exception as e:
+                _pinecone_breaker.failure(e)
+                print(f"Pinecone delete error: {e} — orphans kept in manifest")
+    for archive_id in archive_ids:
+        backend = backends.get(archive_id)
+        if backend == "local-ivf":
+            _mmm_ivf.delete(archive_id)
+        elif backend != "pinecone":
+            _mmm_store.delete(archive_id)
+        if backend != "pinecone":
+            removed.append(archive_id)
+    try:
+        for archive_id in removed:
+            _mmm_lexical.delete(archive_id)
+        _mmm_manifest.remove(removed)
+        _near_duplicates.remove(removed)
+    except sqlite3.Error as e:
+        print(f"MMM manifest error: {e}")
+    if removed:
+        _search_cache.bump()
+    return removed
+
+def _mmm_local_upsert(store: _MMMStore, vectors: List[Dict]) -> int:
+    store.upsert_many([(v["id"], v["metadata"], v["values"]) for v in vectors])
+    if len(vectors) == 1:
+        print(f"MMM[{store.label}]: indexed '{vectors[0]['metadata']['title']}' ({vectors[0]['id']})")
+    else:
+        print(f"MMM[{store.label}]: indexed {len(vectors)} records")
+    return len(vectors)
+
+def _mmm_backend_name() -> str:
+    if MMM_BACKEND == "local-ivf":
+        return "local-ivf"
+    return "pinecone" if _pinecone_status() in ("connected", "not initialized") else "json-fallback"
+
+def mmm_index_record(record: Dict) -> bool:
+    """Indexe un record dans Pinecone (ou JSON fallback).
+
+    True si indexé, ou si le record n'a aucun texte à indexer ; False sur échec
+    transitoire (le job est rejoué). Lève _PermanentJobError si l'échec ne peut
+    pas se résoudre en rejouant (pas de clé OpenAI : index lexical seulement).
+    """
+    if not _build_chunk_text(record).strip():
+        print(f"MMM: archive {record.get('archive_id')} has no text to index — skipped")
+        return True
+    if mmm_index_records([record]) == 1:
+        return True
+    if not OPENAI_API_KEY:
+        raise _PermanentJobError("OPENAI_API_KEY missing — indexed in the lexical index only")
+    return False
 
 def mmm_search(query: str, top_k: int = 3) -> List[Dict]:
     """Recherche sémantique dans Pinecone (ou JSON fallback). Retourne top_k résultats."""
     query_embedding = _embed_text(query)
     if not query_embedding:
         return []
+    return mmm_search_by_vector(query_embedding, top_k)
+
+def mmm_search_by_vector(query_embedding: List[float], top_k: int = 3, nprobe: Optional[int] = None,
+                         filters: Optional[Dict[str, Any]] = None) -> List[Dict]:
+    """Recherche par embedding déjà calculé dans Pinecone (ou JSON fallback).
+
+    filters (_search_filters) : filtre de métadonnées Pinecone, ou masque avant scoring en local.
+    """
+    return _mmm_vector_search(query_embedding, top_k, nprobe, filters)[0]
+
+def _pinecone_configured() -> bool:
+    return _PINECONE_AVAILABLE and bool(PINECONE_API_KEY)
+
+def _mmm_vector_search(query_embedding: List[float], top_k: int, nprobe: Optional[int] = None,
+                       filters: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict], bool]:
+    """mmm_search_by_vector, plus degraded : Pinecone configuré mais indisponible
+    (disjoncteur ouvert ou erreur), résultats servis par le store local de repli."""
+    if MMM_BACKEND == "local-ivf":
+        return _mmm_local_search(_mmm_ivf, "local-ivf", query_embedding, top_k, nprobe=nprobe, filters=filters), False
 
     # Tentative Pinecone
     pc_index = _get_pinecone_index()
     if pc_index is not None:
         try:
-            resp = pc_index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True
-            )
-            results = []
-            for match in resp.matches:
-                m = match.metadata or {}
-                results.append({
-                    "archive_id": match.id,
-                    "title": m.get("title", ""),
-                    "source": m.get("source", ""),
-                    "archived_at": m.get("archived_at", ""),
-                    "notion_url": m.get("notion_url", ""),
-                    "chunk_text": m.get("chunk_text", ""),
-                    "score": round(match.score, 4),
-                    "backend": "pinecone"
-                })
+            with _metrics.stage("pinecone_query"):
+                resp = pc_index.query(
+                    vector=query_embedding,
+                    top_k=top_k,
+                    include_metadata=True,
+                    filter=_pinecone_filter(filters)
+                )
+            _pinecone_breaker.success()
+            return _pinecone_results(resp), False
+        except Exception as e:
+            _pinecone_breaker.failure(e)
+            print(f"Pinecone query error: {e} — falling back to JSON")
+
+    # Fallback local (store binaire memory-mappé) ; backend principal si Pinecone n'est pas configuré
+    _metrics.inc("yos_fallback_total", path="pinecone_query_to_local")
+    return _mmm_local_search(_mmm_store, "json-fallback", query_embedding, top_k, filters=filters), _pinecone_configured()
+
+def mmm_search_many_by_vectors(query_embeddings: List[Optional[List[float]]], top_k: int = 3,
+                               nprobe: Optional[int] = None,
+                               filters: Optional[Dict[str, Any]] = None) -> List[List[Dict]]:
+    """Recherche de plusieurs embeddings : un produit matrice-matrice en local,
+    requêtes parallèles sur Pinecone."""
+    if MMM_BACKEND == "local-ivf":
+        return _mmm_local_search_many(_mmm_ivf, "local-ivf", query_embeddings, top_k, nprobe=nprobe, filters=filters)
+
+    pc_index = _get_pinecone_index()
+    if pc_index is not None:
+        def _query(embedding):
+            if not embedding:
+                return []
+            with _metrics.stage("pinecone_query"):
+                return _pinecone_results(pc_index.query(vector=embedding, top_k=top_k, include_metadata=True,
+                                                        filter=_pinecone_filter(filters)))
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(PINECONE_QUERY_CONCURRENCY, len(query_embeddings)))) as pool:
+                results = list(pool.map(_query, query_embeddings))
+            _pinecone_breaker.success()
             return results
         except Exception as e:
+            _pinecone_breaker.failure(e)
             print(f"Pinecone query error: {e} — falling back to JSON")
 
-    # Fallback JSON
-    index = _load_mmm_index()
-    if not index:
-        return []
-    scored = []
-    for entry in index:
-        emb = entry.get("embedding")
-        if not emb:
-            continue
-        score = _cosine_similarity(query_embedding, emb)
-        scored.append((score, entry))
-    scored.sort(key=lambda x: x[0], reverse=True)
+    _metrics.inc("yos_fallback_total", path="pinecone_query_to_local")
+    return _mmm_local_search_many(_mmm_store, "json-fallback", query_embeddings, top_k, filters=filters)
+
+def _pinecone_results(resp) -> List[Dict]:
     results = []
-    for score, entry in scored[:top_k]:
+    for match in resp.matches:
+        m = match.metadata or {}
         results.append({
-            "archive_id": entry["archive_id"],
-            "title": entry.get("title", ""),
-            "source": entry.get("source", ""),
-            "archived_at": entry.get("archived_at", ""),
-            "notion_url": entry.get("notion_url", ""),
-            "chunk_text": entry.get("chunk_text", ""),
-            "score": round(score, 4),
-            "backend": "json-fallback"
+            "archive_id": match.id,
+            "title": m.get("title", ""),
+            "source": m.get("source", ""),
+            "archived_at": m.get("archived_at", ""),
+            "notion_url": m.get("notion_url", ""),
+            "chunk_text": m.get("chunk_text", ""),
+            "score": round(match.score, 4),
+            "backend": "pinecone"
         })
     return results
 
+def _local_results(hits: List[Tuple[float, Dict]], backend: str) -> List[Dict]:
+    return [{
+        "archive_id": entry["archive_id"],
+        "title": entry.get("title", ""),
+        "source": entry.get("source", ""),
+        "archived_at": entry.get("archived_at", ""),
+        "notion_url": entry.get("notion_url", ""),
+        "chunk_text": entry.get("chunk_text", ""),
+        "score": round(score, 4),
+        "backend": backend
+    } for score, entry in hits]
+
+def _mmm_local_search(store: _MMMStore, backend: str, query_embedding: List[float], top_k: int, **knobs) -> List[Dict]:
+    with _metrics.stage(backend.replace("-", "_") + "_scan"):
+        hits = store.search(query_embedding, top_k, **knobs)
+    return _local_results(hits, backend)
+
+def _mmm_local_search_many(store: _MMMStore, backend: str, query_embeddings: List[Optional[List[float]]],
+                           top_k: int, **knobs) -> List[List[Dict]]:
+    with _metrics.stage(backend.replace("-", "_") + "_scan"):
+        hits = store.search_many(query_embeddings, top_k, **knobs)
+    return [_local_results(h, backend) for h in hits]
+
+class _QueueFull(Exception):
+    pass
+
+class _PermanentJobError(Exception):
+    """Échec qu'une nouvelle tentative ne corrigera pas : le job passe directement en failed."""
+
+class _MMMJobQueue:
+    """File de jobs MMM persistante (SQLite) traitée par un pool de threads.
+
+    Les jobs survivent à un redémarrage ; un job en échec transitoire est replanifié
+    avec un backoff exponentiel jusqu'à MMM_JOB_MAX_ATTEMPTS tentatives. Un échec
+    permanent (_PermanentJobError, type de job inconnu, payload illisible) est marqué
+    failed tout de suite, sans occuper la file.
+    """
+
+    def __init__(self, db_path: str, handlers: Dict[str, Any]):
+        self.db_path = db_path
+        self.handlers = handlers
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = _open_sqlite(self.db_path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+                "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_run_at REAL NOT NULL, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, last_error TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, next_run_at)")
+        return self._conn
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._db().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchone()[0]
+
+    def is_full(self) -> bool:
+        return self.depth() >= MMM_QUEUE_MAX
+
+    def enqueue(self, kind: str, payload: Dict) -> int:
+        now = time.time()
+        with self._lock:
+            # Contrôle de capacité et insertion en une seule instruction : la borne
+            # tient même entre enqueues concurrents (ou plusieurs processus)
+            cur = self._db().execute(
+                "INSERT INTO jobs (kind, payload, status, next_run_at, created_at, updated_at) "
+                "SELECT ?, ?, 'queued', ?, ?, ? "
+                "WHERE (SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')) < ?",
+                (kind, json.dumps(payload, ensure_ascii=False, default=str), now, now, now, MMM_QUEUE_MAX)
+            )
+        if cur.rowcount == 0:
+            raise _QueueFull(f"MMM job queue full ({MMM_QUEUE_MAX} pending)")
+        self._wake.set()
+        return cur.lastrowid
+
+    def _claim(self) -> Optional[Tuple[int, str, str, int]]:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT id, kind, payload, attempts FROM jobs WHERE status = 'queued' AND next_run_at <= ? "
+                "ORDER BY next_run_at, id LIMIT 1", (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                       (now, row[0]))
+            return row[0], row[1], row[2], row[3] + 1
+
+    def _finish(self, job_id: int, attempts: int, error: Optional[str], permanent: bool = False) -> None:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            if error is None:
+                db.execute("UPDATE jobs SET status = 'done', updated_at = ?, last_error = NULL WHERE id = ?",
+                           (now, job_id))
+                # Historique limité à 24h (sert au calcul du débit)
+                db.execute("DELETE FROM jobs WHERE status = 'done' AND updated_at < ?", (now - 86400,))
+            elif permanent or attempts >= MMM_JOB_MAX_ATTEMPTS:
+                db.execute("UPDATE jobs SET status = 'failed', updated_at = ?, last_error = ? WHERE id = ?",
+                           (now, error, job_id))
+            else:
+                delay = min(MMM_JOB_BACKOFF * 2 ** (attempts - 1), 600)
+                db.execute("UPDATE jobs SET status = 'queued', next_run_at = ?, updated_at = ?, last_error = ? "
+                           "WHERE id = ?", (now + delay, now, error, job_id))
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: Tuple[int, str, str, int]) -> None:
+        job_id, kind, payload, attempts = job
+        error, permanent = None, False
+        try:
+            handler = self.handlers.get(kind)
+            if handler is None:
+                raise _PermanentJobError(f"unknown job kind '{kind}'")
+            try:
+                record = json.loads(payload)
+            except ValueError as e:
+                raise _PermanentJobError(f"unreadable payload: {e}")
+            if not handler(record):
+                error = "handler returned False"
+        except _PermanentJobError as e:
+            error, permanent = str(e), True
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        if error:
+            print(f"MMM job {job_id} ({kind}) attempt {attempts} failed"
+                  f"{' permanently' if permanent else ''}: {error}")
+        self._finish(job_id, attempts, error, permanent)
+
+    def start(self, workers: int) -> None:
+        with self._lock:
+            # Jobs interrompus par un arrêt brutal : on les remet en file
+            self._db().execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+        self._stop.clear()
+        for i in range(workers):
+            t = threading.Thread(target=self._worker, name=f"mmm-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout=5)
+        self._threads = []
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            done_1m = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'done' AND updated_at >= ?",
+                                 (now - 60,)).fetchone()[0]
+            done_15m = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'done' AND updated_at >= ?",
+                                  (now - 900,)).fetchone()[0]
+            oldest = db.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            errors = db.execute(
+                "SELECT id, kind, status, attempts, last_error FROM jobs WHERE last_error IS NOT NULL "
+                "ORDER BY updated_at DESC LIMIT 5"
+            ).fetchall()
+        return {
+            "workers": len(self._threads),
+            "depth": counts.get("queued", 0) + counts.get("running", 0),
+            "max_depth": MMM_QUEUE_MAX,
+            "queued": counts.get("queued", 0),
+            "running": counts.get("running", 0),
+            "done_24h": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "throughput_per_min_1m": done_1m,
+            "throughput_per_min_15m": round(done_15m / 15, 2),
+            "oldest_queued_age_s": round(now - oldest, 1) if oldest else None,
+            "recent_errors": [
+                {"id": r[0], "kind": r[1], "status": r[2], "attempts": r[3], "error": r[4]} for r in errors
+            ],
+        }
+
+_mmm_jobs = _MMMJobQueue(MMM_JOBS_DB, {"index": mmm_index_record})
+
 app = FastAPI(
     title="YOS Ingestion Endpoint + MMM",
     description="YOS Archiver v2.2 + MMM (Multi-session/LLM Memory Manager) — Archive, Push, RAG search, context injection.",
@@ -249,6 +2124,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def _record_request_metrics(request: Request, call_next):
+    """Compte et chronomètre chaque requête, étiquetée par le gabarit de route."""
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        _metrics.inc("yos_http_requests_total", method=request.method, route=route, status=str(status_code))
+        _metrics.observe("yos_http_request_duration_seconds", time.perf_counter() - start,
+                         method=request.method, route=route)
+
+@app.on_event("startup")
+async def _start_workers():
+    _mmm_jobs.start(MMM_WORKERS)
+    if MMM_BACKEND != "local-ivf":
+        asyncio.get_running_loop().run_in_executor(None, _get_pinecone_index)  # connexion à chaud
+
+@app.on_event("shutdown")
+async def _close_upstreams():
+    _mmm_jobs.stop()
+    await _openai_http.aclose()
+    await _notion_http.aclose()
+
 security = HTTPBearer()
 
 def verify_api_key(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -278,6 +2180,235 @@ class ArchiveResponse(BaseModel):
     notion_page_url: Optional[str] = None
     local_path: Optional[str] = None
     insights: Optional[Dict[str, Any]] = None
+    near_duplicate_of: Optional[Dict[str, Any]] = None
+    mmm_indexed: Optional[str] = None  # queued | rejected (file d'indexation pleine)
+
+# --- content_full : référence paresseuse (JSON en mémoire ou fichier spoolé) ---
+class _TextContent:
+    """content_full reçu dans le corps JSON (déjà en mémoire)."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def read(self, max_chars: Optional[int] = None) -> str:
+        return self.text if max_chars is None else self.text[:max_chars]
+
+    def iter_chunks(self, size: int = 1900):
+        for i in range(0, len(self.text), size):
+            yield self.text[i:i + size]
+
+    def discard(self) -> None:
+        pass
+
+class _FileContent(ABC):
+    """content_full stocké dans un fichier, relu à la demande par morceaux."""
+
+    @abstractmethod
+    def _open(self):
+        """Ouvre le contenu en texte (UTF-8)."""
+
+    def read(self, max_chars: Optional[int] = None) -> str:
+        with self._open() as f:
+            return f.read(-1 if max_chars is None else max_chars)
+
+    def iter_chunks(self, size: int = 1900):
+        with self._open() as f:
+            while True:
+                chunk = f.read(size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def discard(self) -> None:
+        pass
+
+class _SpooledContent(_FileContent):
+    """content_full spoolé sur disque (UTF-8) pendant l'ingestion."""
+
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def _open(self):
+        return open(self.path, "r", encoding="utf-8", errors="replace")
+
+    def discard(self) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class _BlobContent(_FileContent):
+    """content_full archivé dans le blob store (compressé)."""
+
+    def __init__(self, path: str, encoding: str):
+        self.path = path
+        self.encoding = encoding
+
+    def _open(self):
+        if self.encoding == "zstd":
+            raw = open(self.path, "rb")
+            return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True),
+                                    encoding="utf-8", errors="replace")
+        return gzip.open(self.path, "rt", encoding="utf-8", errors="replace")
+
+class _BlobStore:
+    """Stockage des verbatims compressés, adressés par sha256 (dédupliqués).
+
+    Layout : BLOBS_DIR/<2 premiers hex>/<sha256>.gz (ou .zst).
+    """
+
+    def __init__(self, directory: str, compression: str):
+        self.directory = directory
+        self.compression = "zstd" if compression == "zstd" and _ZSTD_AVAILABLE else "gzip"
+
+    def path(self, sha256: str, encoding: Optional[str] = None) -> str:
+        ext = ".zst" if (encoding or self.compression) == "zstd" else ".gz"
+        return os.path.join(self.directory, sha256[:2], sha256 + ext)
+
+    def _write(self, sha256: str, src) -> None:
+        path = self.path(sha256)
+        if os.path.exists(path):
+            return  # déjà stocké : déduplication
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as raw:
+            if self.compression == "zstd":
+                with zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False) as out:
+                    shutil.copyfileobj(src, out, 1 << 20)
+            else:
+                with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as out:
+                    shutil.copyfileobj(src, out, 1 << 20)
+        os.replace(tmp, path)
+
+    def put(self, content) -> Dict[str, Any]:
+        """Stocke le contenu (texte ou fichier spoolé). Retourne la référence pour le record."""
+        if isinstance(content, _SpooledContent):
+            sha256, size = content.sha256, content.size
+            with open(content.path, "rb") as src:
+                self._write(sha256, src)
+        else:
+            data = content.read().encode("utf-8")
+            sha256, size = hashlib.sha256(data).hexdigest(), len(data)
+            self._write(sha256, io.BytesIO(data))
+        return {"content_blob": sha256, "content_bytes": size, "content_encoding": self.compression}
+
+    def open(self, sha256: str, encoding: str = "gzip") -> Optional[_BlobContent]:
+        path = self.path(sha256, encoding)
+        return _BlobContent(path, encoding) if os.path.exists(path) else None
+
+_blob_store = _BlobStore(BLOBS_DIR, BLOB_COMPRESSION)
+
+def _archive_content(record: Dict):
+    """Référence vers le verbatim d'un record, quel que soit son format de stockage."""
+    if record.get("content_blob"):
+        return _blob_store.open(record["content_blob"], record.get("content_encoding", "gzip"))
+    if record.get("content_full"):
+        return _TextContent(record["content_full"])
+    if record.get("content_file"):
+        path = os.path.join(ARCHIVES_DIR, record["content_file"])
+        if os.path.exists(path):
+            return _SpooledContent(path, os.path.getsize(path), record.get("content_sha256", ""))
+    return None
+
+def _content_digest(content) -> Tuple[str, int]:
+    """(sha256, taille en octets UTF-8) du verbatim."""
+    if isinstance(content, _SpooledContent):
+        return content.sha256, content.size
+    data = content.read().encode("utf-8")
+    return hashlib.sha256(data).hexdigest(), len(data)
+
+def _content_prefix_sha256(content, nbytes: int) -> str:
+    """sha256 des nbytes premiers octets UTF-8 du verbatim."""
+    if isinstance(content, _SpooledContent):
+        digest = hashlib.sha256()
+        with open(content.path, "rb") as f:
+            remaining = nbytes
+            while remaining > 0:
+                block = f.read(min(remaining, 1 << 20))
+                if not block:
+                    break
+                digest.update(block)
+                remaining -= len(block)
+        return digest.hexdigest()
+    return hashlib.sha256(content.read().encode("utf-8")[:nbytes]).hexdigest()
+
+def _content_tail(content, offset: int) -> _TextContent:
+    """Suite du verbatim à partir de l'octet offset (frontière UTF-8 d'un préfixe déjà archivé)."""
+    if isinstance(content, _SpooledContent):
+        with open(content.path, "rb") as f:
+            f.seek(offset)
+            return _TextContent(f.read().decode("utf-8", errors="replace"))
+    return _TextContent(content.read().encode("utf-8")[offset:].decode("utf-8", errors="replace"))
+
+def _body_decompressor(encoding: str):
+    """Décompresseur incrémental pour Content-Encoding (identity, gzip, deflate, zstd)."""
+    if encoding in ("", "identity"):
+        return None
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return zlib.decompressobj()
+    if encoding == "zstd" and _ZSTD_AVAILABLE:
+        return zstandard.ZstdDecompressor().decompressobj()
+    # zstd sans le paquet zstandard installé : 415 également
+    raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+
+def _inflate(decompressor, chunk: bytes) -> Iterable[bytes]:
+    """Sortie décompressée de chunk, par morceaux bornés (pas de zip-bomb en mémoire).
+
+    zlib borne la sortie (max_length + unconsumed_tail). zstandard ne le permet pas :
+    l'entrée lui est passée par tranches de BODY_ZSTD_INPUT_STEP octets, dont la sortie
+    reste bornée (un bloc zstd de 3 octets produit au plus 128 Kio).
+    """
+    if isinstance(decompressor, type(zlib.decompressobj())):
+        data = chunk
+        while True:
+            out = decompressor.decompress(data, BODY_INFLATE_STEP)
+            if out:
+                yield out
+            data = decompressor.unconsumed_tail
+            if not data and len(out) < BODY_INFLATE_STEP:
+                return
+    for start in range(0, len(chunk), BODY_ZSTD_INPUT_STEP):
+        out = decompressor.decompress(chunk[start:start + BODY_ZSTD_INPUT_STEP])
+        if out:
+            yield out
+
+async def _spool_request_body(request: Request) -> Optional[_SpooledContent]:
+    """Écrit le corps de la requête (décompressé au fil de l'eau) dans SPOOL_DIR."""
+    decompressor = _body_decompressor(request.headers.get("content-encoding", "").strip().lower())
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=SPOOL_DIR, suffix=".txt")
+    digest, size = hashlib.sha256(), 0
+    invalid = (zlib.error, zstandard.ZstdError) if _ZSTD_AVAILABLE else (zlib.error,)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in request.stream():
+                for data in (_inflate(decompressor, chunk) if decompressor else (chunk,)):
+                    size += len(data)
+                    if size > MAX_CONTENT_BYTES:
+                        raise HTTPException(status_code=413, detail=f"content_full exceeds {MAX_CONTENT_BYTES} bytes")
+                    digest.update(data)
+                    f.write(data)
+            if decompressor is not None:
+                data = decompressor.flush()
+                size += len(data)
+                if size > MAX_CONTENT_BYTES:
+                    raise HTTPException(status_code=413, detail=f"content_full exceeds {MAX_CONTENT_BYTES} bytes")
+                digest.update(data)
+                f.write(data)
+    except invalid as e:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail=f"Invalid compressed body: {e}")
+    except BaseException:
+        os.remove(path)
+        raise
+    if size == 0:
+        os.remove(path)
+        return None
+    return _SpooledContent(path, size, digest.hexdigest())
 
 # --- OpenAI Push to YOS ---
 PUSH_SYSTEM_PROMPT = """Tu es un extracteur d'insights cognitifs pour YOS (Yannick Operating System).
@@ -292,47 +2423,146 @@ Analyse la conversation et extrais de façon structurée et concise :
 
 Réponds UNIQUEMENT en JSON valide avec ces 6 clés. Chaque valeur est une liste de strings sauf summary qui est une string."""
 
-def extract_insights_openai(content: str, title: str) -> Optional[Dict[str, Any]]:
-    """Appelle OpenAI pour extraire les insights structurés d'une conversation."""
-    if not OPENAI_API_KEY:
-        print("OPENAI_API_KEY not set — skipping Push to YOS extraction.")
-        return None
-
-    # Tronquer le contenu si trop long (max ~12000 tokens input)
-    max_chars = 30000
-    if len(content) > max_chars:
-        content = content[:max_chars] + "\n\n[... contenu tronqué ...]"
+REDUCE_SYSTEM_PROMPT = """Tu fusionnes les insights extraits des segments successifs d'une même conversation YOS.
+Dédoublonne, regroupe les éléments équivalents, privilégie les décisions et règles finales
+quand un segment ultérieur contredit un segment antérieur. Respecte les mêmes limites :
 
+1. decisions (max 5)
+2. canons (max 5)
+3. todos (max 5)
+4. entities (max 10)
+5. insights (max 7)
+6. summary: résumé dense de 80-100 mots couvrant toute la conversation
+
+Réponds UNIQUEMENT en JSON valide avec ces 6 clés. Chaque valeur est une liste de strings sauf summary qui est une string."""
+
+async def _chat_json(system: str, user: str, max_tokens: int = 1500) -> Dict[str, Any]:
+    """Appel chat-completions en mode JSON. Lève une exception en cas d'échec."""
     payload = {
         "model": PUSH_MODEL,
         "messages": [
-            {"role": "system", "content": PUSH_SYSTEM_PROMPT},
-            {"role": "user", "content": f"Titre de la conversation: {title}\n\n---\n\n{content}"}
+            {"role": "system", "content": system},
+            {"role": "user", "content": user}
         ],
         "temperature": 0.2,
-        "max_tokens": 1500,
+        "max_tokens": max_tokens,
         "response_format": {"type": "json_object"}
     }
+    resp = await _openai_http.request("POST", "/chat/completions", json=payload, timeout=30)
+    data = resp.json()
+    return json.loads(data["choices"][0]["message"]["content"])
+
+def _split_segments(content: str, size: int) -> List[str]:
+    """Découpe le verbatim en segments d'au plus size caractères, de préférence sur une fin de ligne."""
+    segments, start = [], 0
+    while start < len(content):
+        end = min(start + size, len(content))
+        if end < len(content):
+            cut = content.rfind("\n", start + size // 2, end)
+            if cut != -1:
+                end = cut + 1
+        segments.append(content[start:end])
+        start = end
+    return segments
+
+async def extract_insights_openai(content: str, title: str) -> Optional[Dict[str, Any]]:
+    """Appelle OpenAI pour extraire les insights structurés d'une conversation (chronométré)."""
+    if not OPENAI_API_KEY:
+        print("OPENAI_API_KEY not set — skipping Push to YOS extraction.")
+        _metrics.inc("yos_fallback_total", path="insights_skipped")
+        return None
+    with _metrics.stage("openai_extraction"):
+        insights = await _extract_insights(content, title)
+    if insights is None:
+        _metrics.inc("yos_fallback_total", path="insights_failed")
+    return insights
+
+async def _extract_insights(content: str, title: str) -> Optional[Dict[str, Any]]:
+    """Extraction des insights structurés d'une conversation.
+
+    Au-delà de INSIGHTS_MAX_CHARS : map (segments extraits en parallèle, au plus
+    INSIGHTS_MAP_CONCURRENCY à la fois) puis reduce (fusion en un seul jeu de 6 clés).
+    Si des segments ont échoué, le résultat porte "partial": True : il ne couvre
+    qu'une partie de la conversation et le push n'est pas considéré complet.
+    """
+
+    if len(content) <= INSIGHTS_MAX_CHARS:
+        try:
+            insights = await _chat_json(PUSH_SYSTEM_PROMPT, f"Titre de la conversation: {title}\n\n---\n\n{content}")
+            print(f"Push to YOS: insights extraits pour '{title}'")
+            return insights
+        except Exception as e:
+            print(f"OpenAI extraction error: {e}")
+            return None
+
+    truncated = len(content) > INSIGHTS_INPUT_CHARS
+    segments = _split_segments(content[:INSIGHTS_INPUT_CHARS], INSIGHTS_SEGMENT_CHARS)
+    semaphore = asyncio.Semaphore(INSIGHTS_MAP_CONCURRENCY)
+
+    async def _map(index: int, segment: str) -> Optional[Dict[str, Any]]:
+        async with semaphore:
+            try:
+                return await _chat_json(
+                    PUSH_SYSTEM_PROMPT,
+                    f"Titre de la conversation: {title}\n"
+                    f"Segment {index + 1}/{len(segments)} de la conversation\n\n---\n\n{segment}"
+                )
+            except Exception as e:
+                print(f"OpenAI extraction error (segment {index + 1}/{len(segments)}): {e}")
+                return None
+
+    partials = [p for p in await asyncio.gather(*(_map(i, seg) for i, seg in enumerate(segments))) if p]
+    if not partials:
+        return None
+    insights = partials[0] if len(partials) == 1 else await _reduce_insights(title, partials, truncated)
+    if len(partials) < len(segments):
+        _metrics.inc("yos_fallback_total", path="insights_partial")
+        insights["partial"] = True
+    print(f"Push to YOS: insights extraits pour '{title}' ({len(partials)}/{len(segments)} segments)")
+    return insights
 
+async def _reduce_insights(title: str, partials: List[Dict[str, Any]], truncated: bool) -> Dict[str, Any]:
+    """Reduce : fusion des insights des segments par OpenAI, sinon fusion déterministe."""
+    note = "\n(La fin de la conversation a été tronquée.)" if truncated else ""
     try:
-        resp = requests.post(
-            f"{OPENAI_API_BASE}/chat/completions",
-            headers={
-                "Authorization": f"Bearer {OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json=payload,
-            timeout=30
+        insights = await _chat_json(
+            REDUCE_SYSTEM_PROMPT,
+            f"Titre de la conversation: {title}{note}\n\n---\n\n"
+            + json.dumps(partials, ensure_ascii=False)
         )
-        resp.raise_for_status()
-        data = resp.json()
-        raw = data["choices"][0]["message"]["content"]
-        insights = json.loads(raw)
-        print(f"Push to YOS: insights extraits pour '{title}'")
-        return insights
     except Exception as e:
-        print(f"OpenAI extraction error: {e}")
-        return None
+        # Repli déterministe : fusion des listes sans appel supplémentaire
+        print(f"OpenAI reduce error: {e}")
+        _metrics.inc("yos_fallback_total", path="insights_reduce_to_merge")
+        insights = None
+        for partial in partials:
+            insights = merge_insights(insights, partial)
+    return insights
+
+def _insights_complete(insights: Optional[Dict]) -> bool:
+    """Insights extraits de toute la conversation (aucun segment en échec)."""
+    return bool(insights) and not insights.get("partial")
+
+INSIGHT_LIST_KEYS = ("decisions", "canons", "todos", "entities", "insights")
+
+def merge_insights(previous: Optional[Dict], delta: Optional[Dict]) -> Optional[Dict]:
+    """Fusionne les insights d'une conversation avec ceux de sa suite (listes dédupliquées)."""
+    if not delta:
+        return previous
+    if not previous:
+        return delta
+    merged: Dict[str, Any] = {}
+    for key in INSIGHT_LIST_KEYS:
+        seen, items = set(), []
+        for value in list(previous.get(key) or []) + list(delta.get(key) or []):
+            norm = str(value).strip().lower()
+            if norm and norm not in seen:
+                seen.add(norm)
+                items.append(value)
+        merged[key] = items
+    summaries = [s for s in (previous.get("summary"), delta.get("summary")) if s]
+    merged["summary"] = "\n\nSuite : ".join(summaries)[:2000]
+    return merged
 
 def format_insights_for_notion(insights: Dict[str, Any]) -> List[dict]:
     """Convertit les insights en blocs Notion."""
@@ -377,21 +2607,8 @@ def format_insights_for_notion(insights: Dict[str, Any]) -> List[dict]:
     return blocks
 
 # --- Notion REST API helpers ---
-def _notion_headers() -> dict:
-    return {
-        "Authorization": f"Bearer {NOTION_API_KEY}",
-        "Content-Type": "application/json",
-        "Notion-Version": NOTION_API_VERSION,
-    }
-
-def _chunk_text(text: str, size: int = 1900) -> List[str]:
-    return [text[i:i+size] for i in range(0, len(text), size)]
-
-def create_notion_page(item: ArchivePayload, insights: Optional[Dict] = None) -> Optional[str]:
-    """Crée une page dans YOS Archives via REST API Notion."""
-    if not NOTION_API_KEY:
-        return None
-
+def _notion_properties(item: ArchivePayload, insights: Optional[Dict] = None) -> Dict:
+    """Propriétés de la page YOS Archives."""
     valid_sources = ["ChatGPT", "Claude", "Gemini", "Perplexity", "Manus", "Other"]
     source = item.source if item.source in valid_sources else "Other"
     valid_actions = ["push", "archive", "push+archive"]
@@ -430,172 +2647,1349 @@ def create_notion_page(item: ArchivePayload, insights: Optional[Dict] = None) ->
         filtered = [t for t in item.tags if t in valid_tags]
         if filtered:
             properties["Tags"] = {"multi_select": [{"name": t} for t in filtered]}
+    return properties
 
-    # Blocs de contenu
-    children = []
+def _notion_children(item: ArchivePayload, insights: Optional[Dict] = None, content=None):
+    """Blocs de contenu de la page : insights, puis verbatim (générateur, lecture paresseuse)."""
+    valid_actions = ["push", "archive", "push+archive"]
+    action = item.action if item.action in valid_actions else "archive"
+
+    if content is None and item.content_full:
+        content = _TextContent(item.content_full)
 
     if insights:
-        children.extend(format_insights_for_notion(insights))
-        children.append({"object": "block", "type": "divider", "divider": {}})
+        yield from format_insights_for_notion(insights)
+        yield {"object": "block", "type": "divider", "divider": {}}
 
     if item.content_summary and not insights:
-        children.append({
+        yield {
             "object": "block", "type": "callout",
             "callout": {
                 "rich_text": [{"type": "text", "text": {"content": item.content_summary[:2000]}}],
                 "icon": {"emoji": "💡"},
                 "color": "blue_background"
             }
-        })
+        }
 
-    if item.content_full and action in ("archive", "push+archive"):
-        children.append({
+    if content is not None and action in ("archive", "push+archive"):
+        yield {
             "object": "block", "type": "heading_2",
             "heading_2": {"rich_text": [{"type": "text", "text": {"content": "Verbatim"}}]}
-        })
-        for chunk in _chunk_text(item.content_full):
-            children.append({
+        }
+        for chunk in content.iter_chunks(1900):
+            yield {
                 "object": "block", "type": "paragraph",
                 "paragraph": {"rich_text": [{"type": "text", "text": {"content": chunk}}]}
-            })
+            }
+
+def _block_signature(block: Dict) -> Tuple[str, str]:
+    """(type, texte) d'un bloc, envoyé ou relu depuis Notion."""
+    kind = block.get("type", "")
+    rich_text = (block.get(kind) or {}).get("rich_text") or []
+    return kind, "".join((t.get("text") or {}).get("content") or t.get("plain_text", "") for t in rich_text)
+
+async def _notion_children_after(page_id: str, anchor: Optional[str]) -> List[Dict]:
+    """Blocs enfants de la page à partir de anchor (dernier bloc connu), ou tous."""
+    blocks: List[Dict] = []
+    cursor = anchor
+    while True:
+        params = {"page_size": 100}
+        if cursor:
+            params["start_cursor"] = cursor
+        resp = await _notion_http.request("GET", f"/blocks/{page_id}/children", params=params, timeout=15)
+        data = resp.json()
+        blocks.extend(data.get("results") or [])
+        cursor = data.get("next_cursor")
+        if not data.get("has_more") or not cursor:
+            return blocks
+
+async def _append_block_batch(page_id: str, blocks: List[Dict], anchor: Optional[str]) -> Optional[str]:
+    """Ajoute un lot de blocs ; retourne l'id du dernier bloc ajouté (ancre suivante).
+
+    L'ajout n'est pas idempotent : après un 502/503/504, la fin de la page est relue
+    et le lot n'est renvoyé que s'il n'y figure pas (une seule écriture par page à la fois).
+    """
+    attempt = 0
+    while True:
+        try:
+            resp = await _notion_http.request("PATCH", f"/blocks/{page_id}/children", idempotent=False,
+                                              json={"children": blocks}, timeout=15)
+        except httpx.HTTPStatusError as e:
+            status_code = e.response.status_code
+            if status_code == 429 or status_code not in RETRY_STATUSES or attempt >= NOTION_MAX_RETRIES:
+                raise
+            await asyncio.sleep(min(30.0, 0.5 * (2 ** attempt)))
+            tail = (await _notion_children_after(page_id, anchor))[-len(blocks):]
+            if [_block_signature(b) for b in tail] == [_block_signature(b) for b in blocks]:
+                print(f"Notion: HTTP {status_code} on append to {page_id} but blocks were written — not resent")
+                return tail[-1].get("id") or anchor
+            attempt += 1
+            print(f"Notion: HTTP {status_code} on append to {page_id}, blocks absent — "
+                  f"resend {attempt}/{NOTION_MAX_RETRIES}")
+            continue
+        results = resp.json().get("results") or []
+        return results[-1].get("id") if results else anchor
+
+async def append_notion_blocks(page_id: str, children) -> int:
+    """Ajoute les blocs (itérable, consommé paresseusement) par lots de 100, dans l'ordre."""
+    appended = 0
+    anchor: Optional[str] = None
+    children = iter(children)
+    while True:
+        blocks = list(itertools.islice(children, NOTION_BLOCKS_PER_REQUEST))
+        if not blocks:
+            return appended
+        with _metrics.stage("notion_blocks_append"):
+            anchor = await _append_block_batch(page_id, blocks, anchor)
+        appended += len(blocks)
+
+async def _append_remaining_blocks(page: Dict[str, Any], children) -> None:
+    """Blocs au-delà des 100 premiers ; en cas d'échec, la page est marquée "incomplete"."""
+    try:
+        await append_notion_blocks(page["id"], children)
+    except httpx.HTTPStatusError as e:
+        page["incomplete"] = True
+        print(f"Notion API error (blocks): {e.response.status_code} — {e.response.text[:200]}")
+    except Exception as e:
+        page["incomplete"] = True
+        print(f"Notion error (blocks): {e}")
+
+async def create_notion_page(item: ArchivePayload, insights: Optional[Dict] = None,
+                             with_children: bool = True, content=None,
+                             background_tasks: Optional[BackgroundTasks] = None) -> Optional[Dict[str, str]]:
+    """Crée une page dans YOS Archives via REST API Notion. Retourne {id, url}.
+
+    Les 100 premiers blocs partent avec la création, les suivants par
+    append_notion_blocks (en tâche de fond si background_tasks est fourni).
+    Avec with_children=False, crée seulement la coquille (propriétés) ; le
+    contenu est ajouté ensuite par finalize_notion_page.
+    """
+    if not NOTION_API_KEY:
+        return None
 
+    children = _notion_children(item, insights, content) if with_children else iter(())
     payload = {
         "parent": {"database_id": NOTION_DATABASE_ID},
-        "properties": properties,
-        "children": children[:100],
+        "properties": _notion_properties(item, insights),
+        "children": list(itertools.islice(children, NOTION_BLOCKS_PER_REQUEST)),
     }
 
     try:
-        resp = requests.post(
-            f"{NOTION_BASE_URL}/pages",
-            headers=_notion_headers(),
-            json=payload,
-            timeout=15
-        )
-        resp.raise_for_status()
-        return resp.json().get("url", "")
-    except requests.exceptions.HTTPError as e:
+        with _metrics.stage("notion_page_create"):
+            resp = await _notion_http.request("POST", "/pages", json=payload, timeout=15)
+        data = resp.json()
+        page = {"id": data.get("id", ""), "url": data.get("url", "")}
+    except httpx.HTTPStatusError as e:
         print(f"Notion API error: {e.response.status_code} — {e.response.text[:200]}")
         return None
     except Exception as e:
         print(f"Notion error: {e}")
         return None
 
+    if len(payload["children"]) == NOTION_BLOCKS_PER_REQUEST:
+        if background_tasks is not None:
+            background_tasks.add_task(_append_remaining_blocks, page, children)
+        else:
+            await _append_remaining_blocks(page, children)
+    return page
+
+async def _update_notion_page(page_id: str, properties: Optional[Dict], children) -> bool:
+    """PATCH des propriétés et ajout des blocs (en parallèle) sur une page existante."""
+    async def _update_properties():
+        if properties:
+            await _notion_http.request("PATCH", f"/pages/{page_id}",
+                                       json={"properties": properties}, timeout=15)
+
+    try:
+        await asyncio.gather(_update_properties(), append_notion_blocks(page_id, children))
+        return True
+    except httpx.HTTPStatusError as e:
+        print(f"Notion API error: {e.response.status_code} — {e.response.text[:200]}")
+        return False
+    except Exception as e:
+        print(f"Notion error: {e}")
+        return False
+
+async def finalize_notion_page(page_id: str, item: ArchivePayload, insights: Optional[Dict] = None,
+                               content=None) -> bool:
+    """Complète une page coquille : propriétés dérivées des insights + blocs de contenu."""
+    properties = _notion_properties(item, insights) if insights else None
+    return await _update_notion_page(page_id, properties, _notion_children(item, insights, content))
+
+def _notion_extension_children(item: ArchivePayload, delta_insights: Optional[Dict], delta):
+    """Blocs ajoutés à une page existante quand la conversation s'est prolongée."""
+    label = f"Suite de la conversation ({item.turn_count} tours)" if item.turn_count else "Suite de la conversation"
+    yield {
+        "object": "block", "type": "heading_2",
+        "heading_2": {"rich_text": [{"type": "text", "text": {"content": label}}]}
+    }
+    if delta_insights:
+        yield from format_insights_for_notion(delta_insights)
+        yield {"object": "block", "type": "divider", "divider": {}}
+    if item.action in ("archive", "push+archive"):
+        for chunk in delta.iter_chunks(1900):
+            yield {
+                "object": "block", "type": "paragraph",
+                "paragraph": {"rich_text": [{"type": "text", "text": {"content": chunk}}]}
+            }
+
+async def extend_notion_page(page_id: str, item: ArchivePayload, insights: Optional[Dict],
+                             delta_insights: Optional[Dict], delta) -> bool:
+    """Prolonge une page existante : propriétés (insights fusionnés) + blocs de la suite."""
+    properties = _notion_properties(item, insights)
+    return await _update_notion_page(page_id, properties, _notion_extension_children(item, delta_insights, delta))
+
 # --- Endpoints ---
 @app.get("/health")
 async def health_check():
-    pc_index = _get_pinecone_index()
-    pinecone_status = "connected" if pc_index is not None else ("key missing" if not PINECONE_API_KEY else "error")
     return {
         "status": "ok",
         "version": "2.3.0",
         "message": "YOS Archiver Endpoint is running",
         "notion": "configured" if NOTION_API_KEY else "not configured",
         "openai": "configured" if OPENAI_API_KEY else "not configured",
-        "pinecone": pinecone_status,
+        "pinecone": _pinecone_status(),
+        "pinecone_breaker": _pinecone_breaker.status(),
         "pinecone_index": PINECONE_INDEX_NAME,
-        "database_id": NOTION_DATABASE_ID
+        "database_id": NOTION_DATABASE_ID,
+        "embed_cache": _embed_cache.stats(),
+        "search_cache": _search_cache.stats(),
     }
 
-@app.post("/api/archive", response_model=ArchiveResponse)
-async def archive_conversation(item: ArchivePayload, background_tasks: BackgroundTasks, api_key: str = Depends(verify_api_key)):
-    archive_id = str(uuid.uuid4())
-    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métriques au format texte Prometheus (sans authentification, pour un scrape local)."""
+    return PlainTextResponse(_metrics.render(), media_type="text/plain; version=0.0.4")
 
-    # Extraction insights OpenAI si action = push ou push+archive
-    insights = None
-    if item.action in ("push", "push+archive") and item.content_full:
-        insights = extract_insights_openai(item.content_full, item.title)
+# --- Index des métadonnées d'archives (sert /api/archives sans lire les fichiers) ---
+ARCHIVE_LIST_FIELDS = ("archive_id", "title", "source", "action", "archived_at")
 
-    # Stockage local (pour archive et push+archive)
-    local_path = None
-    if item.action in ("archive", "push+archive"):
-        filename = os.path.join(ARCHIVES_DIR, f"{archive_id}.json")
+class _ArchiveIndex:
+    """Index SQLite des métadonnées d'archives, tenu à jour à chaque écriture locale.
+
+    Construit une seule fois depuis les fichiers existants (backfill), puis
+    maintenu par _write_archive_file.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = _open_sqlite(self.db_path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS archives ("
+                "archive_id TEXT PRIMARY KEY, title TEXT, source TEXT, action TEXT, archived_at TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS archives_by_date ON archives (archived_at, archive_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS archives_by_source ON archives (source, archived_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn = conn
+            if conn.execute("SELECT value FROM meta WHERE key = 'backfilled'").fetchone() is None:
+                self._rebuild_locked()
+        return self._conn
+
+    @staticmethod
+    def _row(record: Dict, fallback_id: str = "") -> Tuple:
+        return (
+            record.get("archive_id") or fallback_id,
+            record.get("title", "Untitled"),
+            record.get("source", "Unknown"),
+            record.get("action", "archive"),
+            record.get("archived_at", ""),
+        )
+
+    def _rebuild_locked(self) -> int:
+        rows = []
+        for filename in _list_archive_files():
+            try:
+                with open(os.path.join(ARCHIVES_DIR, filename), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    rows.append(self._row(data, filename[:-len(".json")]))
+            except Exception:
+                pass
+        db = self._conn
+        db.execute("BEGIN")
+        db.execute("DELETE FROM archives")
+        db.executemany("INSERT OR REPLACE INTO archives VALUES (?, ?, ?, ?, ?)", rows)
+        db.execute("INSERT OR REPLACE INTO meta VALUES ('backfilled', ?)",
+                   (datetime.datetime.now(datetime.timezone.utc).isoformat(),))
+        db.execute("COMMIT")
+        print(f"Archives index: rebuilt from {len(rows)} archive files")
+        return len(rows)
+
+    def rebuild(self) -> int:
+        with self._lock:
+            self._db()
+            return self._rebuild_locked()
+
+    def upsert(self, record: Dict) -> None:
+        with self._lock:
+            self._db().execute("INSERT OR REPLACE INTO archives VALUES (?, ?, ?, ?, ?)", self._row(record))
+
+    @staticmethod
+    def encode_cursor(row: Dict) -> str:
+        raw = json.dumps([row["archived_at"], row["archive_id"]]).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, str]:
+        archived_at, archive_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return archived_at, archive_id
+
+    def query(self, limit: Optional[int] = None, cursor: Optional[str] = None, order: str = "desc",
+              source: Optional[str] = None, action: Optional[str] = None,
+              date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict]:
+        """Archives triées par (archived_at, archive_id), paginées par curseur (keyset)."""
+        desc = order != "asc"
+        clauses, params = [], []
+        if cursor:
+            clauses.append("(archived_at, archive_id) < (?, ?)" if desc else "(archived_at, archive_id) > (?, ?)")
+            params.extend(self.decode_cursor(cursor))
+        if source:
+            clauses.append("source = ?")
+            params.append(source)
+        if action:
+            clauses.append("action = ?")
+            params.append(action)
+        if date_from:
+            clauses.append("archived_at >= ?")
+            params.append(date_from)
+        if date_to:
+            # Date seule (YYYY-MM-DD) : journée incluse
+            clauses.append("archived_at <= ?" if len(date_to) > 10 else "archived_at < ?")
+            params.append(date_to if len(date_to) > 10 else date_to + "T99")
+        sql = "SELECT archive_id, title, source, action, archived_at FROM archives"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        direction = "DESC" if desc else "ASC"
+        sql += f" ORDER BY archived_at {direction}, archive_id {direction}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._db().execute(sql, params).fetchall()
+        return [dict(zip(ARCHIVE_LIST_FIELDS, row)) for row in rows]
+
+_archive_index = _ArchiveIndex(ARCHIVES_INDEX_DB)
+
+class _PushFingerprints:
+    """Empreintes des pushes déjà traités, pour rendre un re-push idempotent.
+
+    Une ligne par (url, action) : sha256 et taille du verbatim, turn_count, et le
+    résultat produit (archive_id, insights, page Notion). Sans url, seul le
+    sha256 identifie la conversation.
+    """
+
+    FIELDS = ("url", "action", "content_sha256", "content_bytes", "turn_count", "archive_id",
+              "archived_at", "insights", "notion_page_id", "notion_page_url", "local_path", "updated_at")
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = _open_sqlite(self.db_path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pushes ("
+                "url TEXT NOT NULL, action TEXT NOT NULL, content_sha256 TEXT NOT NULL, content_bytes INTEGER,"
+                " turn_count INTEGER, archive_id TEXT, archived_at TEXT, insights TEXT, notion_page_id TEXT,"
+                " notion_page_url TEXT, local_path TEXT, updated_at TEXT, PRIMARY KEY (url, action))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pushes_by_sha ON pushes (content_sha256, action)")
+            self._conn = conn
+        return self._conn
+
+    def lookup(self, url: str, action: str, sha256: str) -> Optional[Dict]:
+        sql = f"SELECT {', '.join(self.FIELDS)} FROM pushes"
+        with self._lock:
+            if url:
+                row = self._db().execute(sql + " WHERE url = ? AND action = ?", (url, action)).fetchone()
+            else:
+                row = self._db().execute(sql + " WHERE url = '' AND content_sha256 = ? AND action = ?",
+                                         (sha256, action)).fetchone()
+        if row is None:
+            return None
+        fingerprint = dict(zip(self.FIELDS, row))
+        fingerprint["insights"] = json.loads(fingerprint["insights"]) if fingerprint["insights"] else None
+        return fingerprint
+
+    def record(self, url: str, action: str, sha256: str, nbytes: int, turn_count: Optional[int],
+               archive_id: str, archived_at: str, insights: Optional[Dict],
+               notion_page: Optional[Dict], local_path: Optional[str]) -> None:
+        row = (url, action, sha256, nbytes, turn_count, archive_id, archived_at,
+               json.dumps(insights, ensure_ascii=False) if insights else None,
+               notion_page["id"] if notion_page else None, notion_page["url"] if notion_page else None,
+               local_path, datetime.datetime.now(datetime.timezone.utc).isoformat())
+        with self._lock:
+            self._db().execute(f"INSERT OR REPLACE INTO pushes VALUES ({', '.join('?' * len(row))})", row)
+
+_push_fingerprints = _PushFingerprints(PUSH_FINGERPRINTS_DB)
+
+def _match_push(item: ArchivePayload, content) -> Tuple[str, Optional[Dict], str, int]:
+    """Classe un push : ("new" | "exact" | "extended", empreinte précédente, sha256, taille).
+
+    "extended" : même url, verbatim dont le préfixe est exactement le verbatim
+    déjà traité, et turn_count qui ne recule pas.
+    """
+    sha256, size = _content_digest(content)
+    try:
+        previous = _push_fingerprints.lookup(item.url or "", item.action, sha256)
+    except sqlite3.Error as e:
+        print(f"Push fingerprints error: {e}")
+        return "new", None, sha256, size
+    if previous is None:
+        return "new", None, sha256, size
+    if previous["content_sha256"] == sha256:
+        return "exact", previous, sha256, size
+    prev_bytes = previous["content_bytes"] or 0
+    if (item.url and 0 < prev_bytes < size
+            and (item.turn_count or 0) >= (previous["turn_count"] or 0)
+            and _content_prefix_sha256(content, prev_bytes) == previous["content_sha256"]):
+        return "extended", previous, sha256, size
+    return "new", previous, sha256, size
+
+def _record_push(item: ArchivePayload, sha256: str, nbytes: int, record: Dict,
+                 notion_page: Optional[Dict], local_path: Optional[str]) -> None:
+    try:
+        _push_fingerprints.record(item.url or "", item.action, sha256, nbytes, item.turn_count,
+                                  record["archive_id"], record["archived_at"], record.get("insights"),
+                                  notion_page, local_path)
+    except sqlite3.Error as e:
+        print(f"Push fingerprints error: {e}")
+
+# --- Quasi-doublons : signatures MinHash + index LSH ---
+_MINHASH_RNG = np.random.default_rng(0x6D696E68)  # permutations fixes : signatures comparables entre processus
+_MINHASH_A = _MINHASH_RNG.integers(1, 2 ** 63, NEAR_DUP_BANDS * NEAR_DUP_ROWS, dtype=np.uint64) | np.uint64(1)
+_MINHASH_B = _MINHASH_RNG.integers(0, 2 ** 63, NEAR_DUP_BANDS * NEAR_DUP_ROWS, dtype=np.uint64)
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    """Hashes 64 bits (uniques) des shingles de NEAR_DUP_SHINGLE mots du texte normalisé."""
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return np.zeros(0, dtype=np.uint64)
+    tokens = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words))
+    k = min(NEAR_DUP_SHINGLE, len(tokens))
+    n = len(tokens) - k + 1
+    hashes = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        hashes = hashes * np.uint64(0x100000001B3) + tokens[j:j + n]  # arithmétique modulo 2^64
+    return np.unique(hashes)
+
+def minhash_signature(text: str) -> Tuple[np.ndarray, int]:
+    """(signature MinHash uint32, nombre de shingles distincts) d'un verbatim."""
+    shingles = _shingle_hashes(text)
+    signature = np.full(len(_MINHASH_A), np.iinfo(np.uint32).max, dtype=np.uint32)
+    for start in range(0, len(shingles), 4096):
+        block = shingles[start:start + 4096, None]
+        hashed = ((block * _MINHASH_A + _MINHASH_B) >> np.uint64(32)).astype(np.uint32)
+        np.minimum(signature, hashed.min(axis=0), out=signature)
+    return signature, len(shingles)
+
+def _content_signature(content) -> Tuple[np.ndarray, int]:
+    with _metrics.stage("minhash"):
+        return minhash_signature(content.read(NEAR_DUP_MAX_CHARS))
+
+class _NearDuplicateIndex:
+    """Index LSH des signatures MinHash des verbatims archivés.
+
+    Chaque signature est découpée en NEAR_DUP_BANDS bandes de NEAR_DUP_ROWS valeurs ;
+    deux verbatims partageant une bande sont candidats. Les candidats sont confirmés
+    sur le containment estimé (part du plus petit contenue dans le plus grand), qui
+    reconnaît un snapshot antérieur de la même conversation. Les archives liées
+    partagent un cluster_id : celui de la première archive du groupe.
+    """
+
+    FIELDS = ("archive_id", "cluster_id", "signature", "shingles", "title", "notion_url", "archived_at")
+
+    def __init__(self, db_path: str, bands: int, rows: int):
+        self.db_path = db_path
+        self.bands = bands
+        self.rows = rows
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = _open_sqlite(self.db_path)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS signatures ("
+                "archive_id TEXT PRIMARY KEY, cluster_id TEXT NOT NULL, signature BLOB NOT NULL,"
+                " shingles INTEGER NOT NULL, title TEXT, notion_url TEXT, archived_at TEXT)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS bands (bucket INTEGER NOT NULL, archive_id TEXT NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS bands_by_bucket ON bands (bucket)")
+            conn.execute("CREATE INDEX IF NOT EXISTS bands_by_archive ON bands (archive_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS signatures_by_cluster ON signatures (cluster_id)")
+            self._conn = conn
+        return self._conn
+
+    def _buckets(self, signature: np.ndarray) -> List[int]:
+        """Une clé entière signée 64 bits par bande (numéro de bande inclus dans le hash)."""
+        buckets = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(chunk, digest_size=8, person=band.to_bytes(4, "little")).digest()
+            buckets.append(int.from_bytes(digest, "little", signed=True))
+        return buckets
+
+    @staticmethod
+    def similarity(sig_a: np.ndarray, size_a: int, sig_b: np.ndarray, size_b: int) -> Tuple[float, float]:
+        """(Jaccard estimé, containment estimé du plus petit ensemble dans le plus grand)."""
+        jaccard = float(np.mean(sig_a == sig_b))
+        if min(size_a, size_b) == 0:
+            return jaccard, 0.0
+        intersection = jaccard * (size_a + size_b) / (1.0 + jaccard)
+        return jaccard, min(1.0, intersection / min(size_a, size_b))
+
+    def lookup(self, signature: np.ndarray, shingles: int, exclude: Optional[str] = None,
+               threshold: float = NEAR_DUP_THRESHOLD) -> List[Dict]:
+        """Quasi-doublons confirmés, du plus proche au moins proche."""
+        buckets = self._buckets(signature)
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT {', '.join(self.FIELDS)} FROM signatures WHERE archive_id IN"
+                f" (SELECT DISTINCT archive_id FROM bands WHERE bucket IN ({', '.join('?' * len(buckets))}))",
+                buckets,
+            ).fetchall()
+        matches = []
+        for row in rows:
+            candidate = dict(zip(self.FIELDS, row))
+            if candidate["archive_id"] == exclude:
+                continue
+            other = np.frombuffer(candidate.pop("signature"), dtype=np.uint32)
+            if other.shape != signature.shape:
+                continue
+            jaccard, containment = self.similarity(signature, shingles, other, candidate["shingles"])
+            if containment >= threshold:
+                matches.append(dict(candidate, jaccard=round(jaccard, 4), similarity=round(containment, 4)))
+        matches.sort(key=lambda m: m["similarity"], reverse=True)
+        return matches
+
+    def add(self, archive_id: str, signature: np.ndarray, shingles: int, cluster_id: Optional[str] = None,
+            title: str = "", notion_url: Optional[str] = None, archived_at: Optional[str] = None) -> None:
+        """Ajoute (ou remplace) la signature d'une archive ; conserve son cluster existant."""
+        buckets = self._buckets(signature)
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            row = db.execute("SELECT cluster_id FROM signatures WHERE archive_id = ?", (archive_id,)).fetchone()
+            cluster = row[0] if row else (cluster_id or archive_id)
+            db.execute("DELETE FROM bands WHERE archive_id = ?", (archive_id,))
+            db.execute("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (archive_id, cluster, signature.astype(np.uint32).tobytes(), shingles, title,
+                        notion_url, archived_at))
+            db.executemany("INSERT INTO bands VALUES (?, ?)", [(b, archive_id) for b in buckets])
+            db.execute("COMMIT")
+
+    def remove(self, archive_ids: List[str]) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            db.executemany("DELETE FROM bands WHERE archive_id = ?", [(a,) for a in archive_ids])
+            db.executemany("DELETE FROM signatures WHERE archive_id = ?", [(a,) for a in archive_ids])
+            db.execute("COMMIT")
+
+    def clusters(self, archive_ids: List[str]) -> Dict[str, str]:
+        """archive_id -> cluster_id, pour les archives signées."""
+        if not archive_ids:
+            return {}
+        with self._lock:
+            rows = self._db().execute(
+                f"SELECT archive_id, cluster_id FROM signatures WHERE archive_id IN ({', '.join('?' * len(archive_ids))})",
+                archive_ids,
+            ).fetchall()
+        return dict(rows)
+
+    def has(self, archive_id: str) -> bool:
+        with self._lock:
+            return self._db().execute("SELECT 1 FROM signatures WHERE archive_id = ?", (archive_id,)).fetchone() is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            signed, clusters = self._db().execute(
+                "SELECT COUNT(*), COUNT(DISTINCT cluster_id) FROM signatures").fetchone()
+        return {"signed": signed, "clusters": clusters, "bands": self.bands, "rows": self.rows,
+                "threshold": NEAR_DUP_THRESHOLD}
+
+_near_duplicates = _NearDuplicateIndex(NEAR_DUP_DB, NEAR_DUP_BANDS, NEAR_DUP_ROWS)
+
+def _find_near_duplicate(archive_id: str, signature: np.ndarray, shingles: int) -> Optional[Dict]:
+    """Quasi-doublon le plus proche d'un verbatim, ou None (erreurs d'index non bloquantes)."""
+    if shingles == 0:
+        return None
+    try:
+        matches = _near_duplicates.lookup(signature, shingles, exclude=archive_id)
+    except sqlite3.Error as e:
+        print(f"Near-duplicate index error: {e}")
+        return None
+    return matches[0] if matches else None
+
+def _near_duplicate_check(archive_id: str, content) -> Tuple[np.ndarray, int, Optional[Dict]]:
+    """Signature MinHash du verbatim et quasi-doublon le plus proche (sans comparaison deux à deux)."""
+    signature, shingles = _content_signature(content)
+    return signature, shingles, _find_near_duplicate(archive_id, signature, shingles)
+
+def _sign_archive(archive_id: str, signature: np.ndarray, shingles: int, duplicate: Optional[Dict],
+                  title: str, notion_url: Optional[str], archived_at: str) -> None:
+    if shingles == 0:
+        return
+    try:
+        _near_duplicates.add(archive_id, signature, shingles, duplicate["cluster_id"] if duplicate else None,
+                             title, notion_url, archived_at)
+    except sqlite3.Error as e:
+        print(f"Near-duplicate index error: {e}")
+
+def _duplicate_link(duplicate: Dict) -> Dict[str, Any]:
+    """Lien vers le quasi-doublon, tel que stocké dans le record et renvoyé au client."""
+    return {
+        "archive_id": duplicate["archive_id"],
+        "cluster_id": duplicate["cluster_id"],
+        "title": duplicate["title"],
+        "notion_url": duplicate["notion_url"],
+        "similarity": duplicate["similarity"],
+    }
+
+def _sign_extended_archive(archive_id: str, content, title: str, notion_url: Optional[str],
+                           archived_at: str) -> None:
+    """Re-signe une conversation prolongée (son cluster est conservé)."""
+    signature, shingles = _content_signature(content)
+    _sign_archive(archive_id, signature, shingles, None, title, notion_url, archived_at)
+
+def _notion_duplicate_children(duplicate: Dict) -> List[Dict]:
+    text = f"Quasi-doublon de « {duplicate['title']} » (similarité {duplicate['similarity']:.0%})"
+    rich_text = [{"type": "text", "text": {"content": text[:1900]}}]
+    if duplicate.get("notion_url"):
+        rich_text.append({"type": "text", "text": {"content": " → page liée", "link": {"url": duplicate["notion_url"]}}})
+    return [{"object": "block", "type": "callout",
+             "callout": {"rich_text": rich_text, "icon": {"type": "emoji", "emoji": "🔁"}}}]
+
+def _collapse_duplicates(results: List[Dict], top_k: int) -> List[Dict]:
+    """Garde le meilleur résultat de chaque cluster de quasi-doublons ;
+    les autres archives du cluster sont listées dans "duplicates"."""
+    try:
+        clusters = _near_duplicates.clusters([r["archive_id"] for r in results])
+    except sqlite3.Error as e:
+        print(f"Near-duplicate index error: {e}")
+        return results[:top_k]
+    kept: Dict[str, Dict] = {}
+    for r in results:  # triés par pertinence décroissante
+        cluster = clusters.get(r["archive_id"], r["archive_id"])
+        if cluster not in kept:
+            kept[cluster] = dict(r, duplicates=list(r["duplicates"])) if "duplicates" in r else dict(r)
+            continue
+        best = kept[cluster]
+        duplicates = best.setdefault("duplicates", [])
+        for archive_id in [r["archive_id"]] + r.get("duplicates", []):  # déjà regroupés (fusion de lots)
+            if archive_id != best["archive_id"] and archive_id not in duplicates:
+                duplicates.append(archive_id)
+    return list(kept.values())[:top_k]
+
+async def _complete_push(notion_update, notion_page: Optional[Dict], item: ArchivePayload,
+                         fingerprint: Optional[Tuple[str, int, Dict, Optional[str]]]) -> None:
+    """Tâche de fond : mise à jour Notion (coroutine, si prévue), puis empreinte du push.
+
+    L'empreinte (sha256, taille, record, local_path) n'est mémorisée que si la page
+    Notion est complète : sinon le prochain re-push refait le travail au lieu
+    d'être pris pour un doublon (ou de ré-appendre un delta déjà envoyé).
+    """
+    ok = await notion_update if notion_update is not None else True
+    if fingerprint is None:
+        return
+    if not ok or (notion_page or {}).get("incomplete"):
+        print(f"Re-push: Notion update failed for '{item.title}' — fingerprint not recorded")
+        return
+    sha256, nbytes, record, local_path = fingerprint
+    await run_in_threadpool(_record_push, item, sha256, nbytes, record, notion_page, local_path)
+
+def _write_archive_file(archive_id: str, record: Dict) -> Optional[str]:
+    """Écrit le record d'archive sur disque (et dans l'index). Retourne le chemin, ou None."""
+    filename = os.path.join(ARCHIVES_DIR, f"{archive_id}.json")
+    try:
+        with _metrics.stage("local_archive_write"), open(filename, "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, separators=(",", ":"), default=str)
+    except Exception as e:
+        print(f"Local storage error: {e}")
+        return None
+    try:
+        _archive_index.upsert(record)
+    except sqlite3.Error as e:
+        print(f"Archives index error: {e}")
+    return filename
+
+def _store_archive(archive_id: str, record: Dict, content) -> Optional[str]:
+    """Stocke le verbatim dans le blob store, puis le record qui le référence.
+
+    Modifie record en place : content_full est remplacé par la référence au blob.
+    """
+    record.pop("content_full", None)
+    if content is not None:
         try:
-            record = item.dict()
-            record["archive_id"] = archive_id
-            record["archived_at"] = now
-            if insights:
-                record["insights"] = insights
-            with open(filename, "w", encoding="utf-8") as f:
-                json.dump(record, f, ensure_ascii=False, indent=2, default=str)
-            local_path = filename
+            with _metrics.stage("blob_write"):
+                record.update(_blob_store.put(content))
         except Exception as e:
-            print(f"Local storage error: {e}")
+            print(f"Blob storage error: {e}")
+            _metrics.inc("yos_fallback_total", path="blob_to_inline")
+            if not isinstance(content, _TextContent):
+                return None
+            record["content_full"] = content.text  # repli : verbatim inline
+    return _write_archive_file(archive_id, record)
+
+def migrate_archives_to_blobs() -> Tuple[int, int]:
+    """Convertit les records existants (verbatim inline ou .txt) au format blob."""
+    converted = skipped = 0
+    for filename in _list_archive_files():
+        filepath = os.path.join(ARCHIVES_DIR, filename)
+        try:
+            with open(filepath, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except Exception:
+            skipped += 1
+            continue
+        if not isinstance(record, dict) or record.get("content_blob") or not (
+                record.get("content_full") or record.get("content_file")):
+            skipped += 1
+            continue
+        content = _archive_content(record)
+        old_file = record.pop("content_file", None)
+        record.pop("content_sha256", None)
+        archive_id = record.get("archive_id") or filename[:-len(".json")]
+        if content is None or _store_archive(archive_id, record, content) is None:
+            skipped += 1
+            continue
+        if old_file:
+            os.remove(os.path.join(ARCHIVES_DIR, old_file))
+        converted += 1
+    return converted, skipped
 
-    # Notion
-    notion_page_url = create_notion_page(item, insights)
+def sign_archives() -> Tuple[int, int]:
+    """Signe les archives locales absentes de l'index de quasi-doublons, dans l'ordre
+    chronologique (un groupe prend l'id de sa première archive). Retourne (signées, liées)."""
+    dated = [(record.get("archived_at") or "", filename)
+             for filename, _, record in _iter_archive_records(_list_archive_files()) if isinstance(record, dict)]
+    signed = linked = 0
+    for filename, _, record in _iter_archive_records([f for _, f in sorted(dated)]):
+        if not isinstance(record, dict):
+            continue
+        archive_id = record.get("archive_id") or filename[:-len(".json")]
+        content = _archive_content(record)
+        if content is None or _near_duplicates.has(archive_id):
+            continue
+        signature, shingles, duplicate = _near_duplicate_check(archive_id, content)
+        _sign_archive(archive_id, signature, shingles, duplicate, record.get("title", ""),
+                      record.get("notion_page_url"), record.get("archived_at"))
+        signed += shingles > 0
+        linked += duplicate is not None
+    return signed, linked
+
+def _check_queue_capacity() -> None:
+    """Backpressure : refuse l'archivage quand la file d'indexation est pleine."""
+    if _mmm_jobs.is_full():
+        raise HTTPException(status_code=503, detail="MMM indexing queue full, retry later",
+                            headers={"Retry-After": "30"})
+
+@app.post("/api/archive", response_model=ArchiveResponse)
+async def archive_conversation(item: ArchivePayload, background_tasks: BackgroundTasks, api_key: str = Depends(verify_api_key)):
+    content = _TextContent(item.content_full) if item.content_full else None
+    return await _run_archive(item, content, background_tasks)
+
+@app.post("/api/archive/stream", response_model=ArchiveResponse)
+async def archive_conversation_stream(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    title: str,
+    source: str,
+    action: str,
+    url: Optional[str] = None,
+    content_summary: Optional[str] = None,
+    keywords: Optional[str] = None,
+    tags: List[str] = Query([]),
+    turn_count: Optional[int] = None,
+    push_ref: Optional[str] = None,
+    archived_by: str = "Manus",
+    api_key: str = Depends(verify_api_key),
+):
+    """Ingestion streamée : métadonnées en query string, content_full brut dans le corps.
+
+    Le corps peut être compressé (Content-Encoding: gzip, deflate ou zstd — 415 pour
+    zstd si zstandard n'est pas installé) ; il est décompressé au fil de l'eau dans
+    SPOOL_DIR sans être chargé en mémoire. 413 au-delà de MAX_CONTENT_BYTES
+    décompressés, 400 si le flux compressé est corrompu.
+    """
+    _check_queue_capacity()
+    item = ArchivePayload(
+        title=title, url=url, source=source, action=action, content_summary=content_summary,
+        keywords=keywords, tags=tags, turn_count=turn_count, push_ref=push_ref, archived_by=archived_by,
+    )
+    content = await _spool_request_body(request)
+    return await _run_archive(item, content, background_tasks)
+
+def _enqueue_mmm(record: Dict, notion_page_url: Optional[str], local_path: Optional[str] = None) -> str:
+    """Indexation MMM via la file persistante (le verbatim n'est pas indexé).
 
-    # MMM indexation en arrière-plan
-    record_for_mmm = item.dict()
-    record_for_mmm["archive_id"] = archive_id
-    record_for_mmm["archived_at"] = now
+    local_file lie l'entrée du manifeste au fichier d'archive : sans lui (push seul),
+    l'archive n'est pas un orphelin au re-indexage. Retourne "queued", ou "rejected"
+    si la file est pleine (renvoyé dans la réponse ; une archive locale est rattrapée
+    par `reindex`, un push seul doit être renvoyé).
+    """
+    record_for_mmm = {k: v for k, v in record.items() if k != "content_full"}
     record_for_mmm["notion_page_url"] = notion_page_url or ""
+    if local_path:
+        record_for_mmm["local_file"] = os.path.basename(local_path)
+    try:
+        _mmm_jobs.enqueue("index", record_for_mmm)
+    except _QueueFull as e:
+        print(f"MMM: {e} — archive {record['archive_id']} not indexed")
+        return "rejected"
+    return "queued"
+
+async def _run_archive(item: ArchivePayload, content, background_tasks: BackgroundTasks) -> ArchiveResponse:
+    """Pipeline d'archivage par étapes.
+
+    Un re-push identique (même url, même verbatim) renvoie le résultat déjà
+    produit ; une conversation prolongée est déléguée à _extend_archive.
+    Étape 1 (concurrente) : extraction des insights, écriture locale, page Notion
+    (coquille si des insights sont attendus), signature MinHash et recherche de
+    quasi-doublon. Étape 2 (chaînée) : réécriture locale avec insights et lien
+    vers le quasi-doublon ; en arrière-plan, contenu de la page Notion ; indexation
+    MMM via la file de jobs persistante.
+    """
+    try:
+        _check_queue_capacity()
+    except HTTPException:
+        if content is not None:
+            content.discard()
+        raise
+    match, previous, sha256, nbytes = "new", None, "", 0
+    if content is not None:
+        match, previous, sha256, nbytes = await run_in_threadpool(_match_push, item, content)
+    if match == "exact":
+        content.discard()
+        print(f"Re-push: '{item.title}' unchanged — archive {previous['archive_id']} reused")
+        return ArchiveResponse(
+            message=f"Action '{item.action}' already completed for: {item.title}",
+            archive_id=previous["archive_id"],
+            notion_page_url=previous["notion_page_url"],
+            local_path=previous["local_path"],
+            insights=previous["insights"]
+        )
+    if match == "extended":
+        return await _extend_archive(item, content, previous, sha256, nbytes, background_tasks)
+
+    archive_id = str(uuid.uuid4())
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    record = item.dict()
+    record["archive_id"] = archive_id
+    record["archived_at"] = now
+    keep_local = item.action in ("archive", "push+archive")
+
+    # Étape 1 — stages indépendants en parallèle
+    wants_insights = item.action in ("push", "push+archive") and content is not None
+    insights_task = asyncio.create_task(
+        extract_insights_openai(content.read(INSIGHTS_INPUT_CHARS + 1), item.title)
+    ) if wants_insights else None
+    local_task = asyncio.create_task(run_in_threadpool(_store_archive, archive_id, record, content)) if keep_local else None
+    notion_task = asyncio.create_task(create_notion_page(item, None, with_children=not wants_insights,
+                                                         content=content, background_tasks=background_tasks))
+    near_dup_task = asyncio.create_task(
+        run_in_threadpool(_near_duplicate_check, archive_id, content)
+    ) if content is not None else None
+
+    insights = await insights_task if insights_task else None
+    local_path = await local_task if local_task else None
+    notion_page = await notion_task
+    notion_page_url = notion_page["url"] if notion_page else None
+    signature, shingles, duplicate = await near_dup_task if near_dup_task else (None, 0, None)
+
+    # Étape 2 — stages dépendant des insights et du quasi-doublon
     if insights:
-        record_for_mmm["insights"] = insights
-    background_tasks.add_task(mmm_index_record, record_for_mmm)
+        record["insights"] = insights
+    if duplicate:
+        record["near_duplicate_of"] = _duplicate_link(duplicate)
+        print(f"Near-duplicate: '{item.title}' ~ '{duplicate['title']}' ({duplicate['similarity']:.2f})")
+    if (insights or duplicate) and keep_local:
+        local_path = await run_in_threadpool(_write_archive_file, archive_id, record)
+    if signature is not None:
+        await run_in_threadpool(_sign_archive, archive_id, signature, shingles, duplicate,
+                                item.title, notion_page_url, now)
+    # Empreinte mémorisée seulement si tous les stages attendus ont abouti, Notion
+    # compris : elle est donc écrite en tâche de fond, après la finalisation de la page.
+    complete = ((notion_page or not NOTION_API_KEY) and (local_path or not keep_local)
+                and (_insights_complete(insights) or not wants_insights or not OPENAI_API_KEY))
+    notion_update = None
+    if notion_page and wants_insights:
+        notion_update = finalize_notion_page(notion_page["id"], item, insights, content)
+    fingerprint = (sha256, nbytes, record, local_path) if content is not None and complete else None
+    if notion_update is not None or fingerprint is not None:
+        background_tasks.add_task(_complete_push, notion_update, notion_page, item, fingerprint)
+    if notion_page and duplicate:
+        background_tasks.add_task(append_notion_blocks, notion_page["id"], _notion_duplicate_children(duplicate))
+    if content is not None:
+        background_tasks.add_task(content.discard)  # spool supprimé après la finalisation Notion
+
+    mmm_indexed = _enqueue_mmm(record, notion_page_url, local_path)
 
     return ArchiveResponse(
         message=f"Action '{item.action}' completed for: {item.title}",
         archive_id=archive_id,
         notion_page_url=notion_page_url,
         local_path=local_path,
-        insights=insights
+        insights=insights,
+        near_duplicate_of=record.get("near_duplicate_of"),
+        mmm_indexed=mmm_indexed,
+    )
+
+async def _extend_archive(item: ArchivePayload, content, previous: Dict, sha256: str, nbytes: int,
+                          background_tasks: BackgroundTasks) -> ArchiveResponse:
+    """Conversation prolongée : même archive_id, seul le delta est traité.
+
+    Insights extraits du delta puis fusionnés avec les précédents ; blocs du
+    delta ajoutés à la page Notion existante ; record et vecteur remplacés.
+    Si l'extraction échoue (ou n'est que partielle), le delta n'est pas envoyé à
+    Notion et l'empreinte n'avance pas : le prochain re-push retraite le même delta
+    une seule fois.
+    """
+    archive_id = previous["archive_id"]
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    delta = await run_in_threadpool(_content_tail, content, previous["content_bytes"])
+    record = item.dict()
+    record["archive_id"] = archive_id
+    record["archived_at"] = previous["archived_at"] or now
+    record["updated_at"] = now
+    if previous["insights"]:
+        record["insights"] = previous["insights"]
+    keep_local = item.action in ("archive", "push+archive")
+    wants_insights = item.action in ("push", "push+archive")
+
+    insights_task = asyncio.create_task(
+        extract_insights_openai(delta.read(INSIGHTS_INPUT_CHARS + 1), item.title)
+    ) if wants_insights else None
+    local_task = asyncio.create_task(run_in_threadpool(_store_archive, archive_id, record, content)) if keep_local else None
+
+    delta_insights = await insights_task if insights_task else None
+    if delta_insights and not _insights_complete(delta_insights):
+        # Delta partiel : traité comme un échec, réextrait en entier au prochain re-push
+        print(f"Re-push: '{item.title}' delta insights partial — not merged")
+        delta_insights = None
+    local_path = await local_task if local_task else None
+    insights = merge_insights(previous["insights"], delta_insights)
+    if delta_insights:
+        record["insights"] = insights
+        if keep_local:
+            local_path = await run_in_threadpool(_write_archive_file, archive_id, record)
+
+    complete = (local_path or not keep_local) and (delta_insights or not wants_insights or not OPENAI_API_KEY)
+    notion_page, notion_update = None, None
+    if previous["notion_page_id"]:
+        notion_page = {"id": previous["notion_page_id"], "url": previous["notion_page_url"]}
+        if complete:
+            notion_update = extend_notion_page(notion_page["id"], item, insights, delta_insights, delta)
+        else:
+            print(f"Re-push: '{item.title}' incomplete — delta not appended to Notion, retried on next push")
+    if complete:
+        background_tasks.add_task(_complete_push, notion_update, notion_page, item,
+                                  (sha256, nbytes, record, local_path))
+    background_tasks.add_task(_sign_extended_archive, archive_id, content, item.title,
+                              previous["notion_page_url"], record["archived_at"])
+    background_tasks.add_task(content.discard)
+
+    mmm_indexed = _enqueue_mmm(record, previous["notion_page_url"], local_path)
+
+    print(f"Re-push: '{item.title}' extended by {len(delta.text)} chars — archive {archive_id} updated")
+    return ArchiveResponse(
+        message=f"Action '{item.action}' extended for: {item.title}",
+        archive_id=archive_id,
+        notion_page_url=previous["notion_page_url"],
+        local_path=local_path,
+        insights=insights,
+        mmm_indexed=mmm_indexed,
     )
 
+# --- Réponses en flux (NDJSON / server-sent events) ---
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+def _stream_records(records: Iterable[Dict], fmt: str, headers: Optional[Dict[str, str]] = None) -> StreamingResponse:
+    """Sérialise les records au fil de l'eau : une ligne JSON (ndjson) ou un événement (sse) par record."""
+    def _lines():
+        for record in records:
+            data = json.dumps(record, ensure_ascii=False, default=str)
+            yield f"data: {data}\n\n" if fmt == "sse" else data + "\n"
+        if fmt == "sse":
+            yield "event: end\ndata: {}\n\n"
+    return StreamingResponse(_lines(), media_type=STREAM_MEDIA_TYPES[fmt], headers=headers)
+
 # --- MMM Routes ---
 
 class MMMSearchRequest(BaseModel):
     query: str
     top_k: int = 3
     context_mode: bool = False  # Si True, formate pour injection dans prompt
+    nprobe: Optional[int] = Field(None, ge=1)  # backend local-ivf : listes scannées (défaut MMM_IVF_NPROBE)
+    mode: str = Field("semantic", pattern="^(semantic|lexical|hybrid)$")
+    stream: Optional[str] = Field(None, pattern="^(ndjson|sse)$")  # réponse en flux
+    # Filtres de métadonnées (appliqués avant scoring)
+    source: Optional[Union[str, List[str]]] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    has_notion: Optional[bool] = None
+    collapse_duplicates: bool = True  # un seul résultat par groupe de quasi-doublons
+
+def _request_filters(req) -> Optional[Dict[str, Any]]:
+    try:
+        return _search_filters(req.source, req.date_from, req.date_to, req.has_notion)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+async def _mmm_search_request(req: MMMSearchRequest) -> Tuple[List[Dict], bool]:
+    """Exécute une recherche selon req.mode ; quasi-doublons regroupés si collapse_duplicates
+    (on demande 2 × top_k résultats pour en garder top_k distincts).
+
+    Retourne (résultats, degraded) : degraded si la recherche a basculé en lexical
+    faute d'embedding de la requête, ou sur le store local faute de Pinecone.
+    """
+    if not req.collapse_duplicates:
+        return await _mmm_search_ranked(req, req.top_k)
+    results, degraded = await _mmm_search_ranked(req, req.top_k * 2)
+    return await run_in_threadpool(_collapse_duplicates, results, req.top_k), degraded
+
+async def _mmm_search_ranked(req: MMMSearchRequest, top_k: int) -> Tuple[List[Dict], bool]:
+    """Recherche selon req.mode ; sans embedding, bascule en lexical (degraded).
+    Pinecone indisponible : store local, également degraded."""
+    filters = _request_filters(req)
+    if req.mode == "lexical":
+        return await run_in_threadpool(_mmm_lexical.search, req.query, top_k, filters), False
+    query_embedding = await _embed_text_async(req.query)
+    if not query_embedding:
+        _metrics.inc("yos_fallback_total", path="semantic_to_lexical")
+        return await run_in_threadpool(_mmm_lexical.search, req.query, top_k, filters), True
+    if req.mode == "semantic":
+        return await run_in_threadpool(_mmm_vector_search, query_embedding, top_k, req.nprobe, filters)
+    depth = max(top_k * 4, 20)
+    (semantic, degraded), lexical = await asyncio.gather(
+        run_in_threadpool(_mmm_vector_search, query_embedding, depth, req.nprobe, filters),
+        run_in_threadpool(_mmm_lexical.search, req.query, depth, filters),
+    )
+    return _rrf_fuse([semantic, lexical], top_k), degraded
 
 @app.post("/api/mmm/search")
 async def mmm_search_endpoint(req: MMMSearchRequest, api_key: str = Depends(verify_api_key)):
-    """Recherche sémantique dans la mémoire YOS (MMM)."""
-    results = mmm_search(req.query, req.top_k)
+    """Recherche dans la mémoire YOS (MMM) : sémantique, lexicale (BM25) ou hybride (RRF).
+
+    Réponses mises en cache (TTL), invalidées à chaque indexation. Une réponse
+    dégradée (bascule lexicale, même vide, ou store local pendant une panne
+    Pinecone) n'est pas mise en cache et porte "degraded": true.
+    """
+    filters = _request_filters(req)
+    cache_key = _SearchCache.key(req.query, req.top_k, req.context_mode, req.mode, req.nprobe,
+                                 json.dumps(filters, sort_keys=True) if filters else None,
+                                 req.collapse_duplicates)
+    response = _search_cache.get(cache_key)
+    if response is None:
+        generation = _search_cache.generation
+        response, degraded = await _mmm_search_response(req)
+        if degraded:
+            response["degraded"] = True
+        else:
+            _search_cache.put(cache_key, generation, response)
+    if req.stream:
+        return _stream_records(_search_stream_records(response["results"], req.context_mode), req.stream)
+    return response
+
+def _search_stream_records(results: List[Dict], context_mode: bool):
+    """Flux d'une recherche : {"result"} par résultat, puis {"context"} par bloc, puis {"count"}."""
+    for r in results:
+        yield {"result": r}
+    if context_mode and results:
+        for block in _iter_context_blocks(results):
+            yield {"context": block}
+    yield {"count": len(results)}
+
+def _iter_context_blocks(results: List[Dict]):
+    """Blocs du contexte d'injection : en-tête, un bloc par résultat, pied."""
+    yield "=== Mémoire YOS — Contexte pertinent ==="
+    for i, r in enumerate(results, 1):
+        lines = [f"\n[{i}] {r['title']} ({r['source']}, {r['archived_at'][:10]})", r['chunk_text']]
+        if r.get('notion_url'):
+            lines.append(f"→ {r['notion_url']}")
+        yield "\n".join(lines)
+    yield "\n==================================="
+
+def _format_context(results: List[Dict]) -> str:
+    """Formate des résultats pour injection directe dans un prompt LLM."""
+    return "\n".join(_iter_context_blocks(results))
+
+async def _mmm_search_response(req: MMMSearchRequest) -> Tuple[Dict[str, Any], bool]:
+    results, degraded = await _mmm_search_request(req)
     if req.context_mode and results:
-        # Formate pour injection directe dans un prompt LLM
-        context_lines = ["=== Mémoire YOS — Contexte pertinent ==="]
-        for i, r in enumerate(results, 1):
-            context_lines.append(f"\n[{i}] {r['title']} ({r['source']}, {r['archived_at'][:10]})")
-            context_lines.append(r['chunk_text'])
-            if r.get('notion_url'):
-                context_lines.append(f"→ {r['notion_url']}")
-        context_lines.append("\n===================================")
-        return {"context": "\n".join(context_lines), "results": results, "count": len(results)}
-    return {"results": results, "count": len(results)}
+        return {"context": _format_context(results), "results": results, "count": len(results)}, degraded
+    return {"results": results, "count": len(results)}, degraded
+
+class MMMBatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=MMM_BATCH_MAX_QUERIES)
+    top_k: int = 3
+    mode: str = Field("semantic", pattern="^(semantic|lexical|hybrid)$")
+    nprobe: Optional[int] = Field(None, ge=1)
+    merged_context: bool = False  # Si True, contexte unique dédupliqué sur l'ensemble des requêtes
+    stream: Optional[str] = Field(None, pattern="^(ndjson|sse)$")  # réponse en flux, un record par requête
+    source: Optional[Union[str, List[str]]] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    has_notion: Optional[bool] = None
+    collapse_duplicates: bool = True
+
+def _lexical_search_many(queries: List[str], top_k: int, filters: Optional[Dict[str, Any]] = None) -> List[List[Dict]]:
+    return [_mmm_lexical.search(q, top_k, filters) for q in queries]
+
+def _collapse_duplicates_many(per_query: List[List[Dict]], top_k: int) -> List[List[Dict]]:
+    return [_collapse_duplicates(results, top_k) for results in per_query]
+
+async def _mmm_batch_search(req: MMMBatchSearchRequest) -> List[List[Dict]]:
+    """Résultats par requête ; quasi-doublons regroupés comme pour /api/mmm/search."""
+    if not req.collapse_duplicates:
+        return await _mmm_batch_ranked(req, req.top_k)
+    per_query = await _mmm_batch_ranked(req, req.top_k * 2)
+    return await run_in_threadpool(_collapse_duplicates_many, per_query, req.top_k)
+
+async def _mmm_batch_ranked(req: MMMBatchSearchRequest, top_k: int) -> List[List[Dict]]:
+    """Résultats par requête ; un seul appel embeddings pour tout le lot."""
+    filters = _request_filters(req)
+    if req.mode == "lexical":
+        return await run_in_threadpool(_lexical_search_many, req.queries, top_k, filters)
+    embeddings = await _embed_texts_async(req.queries)
+    hybrid = req.mode == "hybrid"
+    depth = max(top_k * 4, 20) if hybrid else top_k
+    tasks = []
+    if any(embeddings):
+        tasks.append(run_in_threadpool(mmm_search_many_by_vectors, embeddings, depth, req.nprobe, filters))
+    if hybrid or not all(embeddings):
+        tasks.append(run_in_threadpool(_lexical_search_many, req.queries, depth, filters))
+    outputs = await asyncio.gather(*tasks)
+    semantic = outputs.pop(0) if any(embeddings) else None
+    lexical = outputs.pop(0) if outputs else None
+    results = []
+    for i, embedding in enumerate(embeddings):
+        if not embedding:
+            _metrics.inc("yos_fallback_total", path="semantic_to_lexical")
+            results.append(lexical[i][:top_k])
+        elif req.mode == "hybrid":
+            results.append(_rrf_fuse([semantic[i], lexical[i]], top_k))
+        else:
+            results.append(semantic[i])
+    return results
+
+def _merge_batch_results(per_query: List[List[Dict]], collapse: bool = False) -> List[Dict]:
+    """Fusionne les résultats de toutes les requêtes par rang (RRF), une entrée par archive.
+
+    Les scores bruts ne sont pas comparables d'une requête à l'autre (BM25, RRF
+    hybride, cosinus, selon le backend ou la bascule lexicale) : seul le rang compte,
+    et le score fusionné est le score RRF. Avec collapse, regroupe aussi par cluster
+    de quasi-doublons : deux requêtes peuvent remonter deux archives d'un même cluster.
+    """
+    merged = _rrf_fuse(per_query, sum(len(results) for results in per_query), backend=None)
+    return _collapse_duplicates(merged, len(merged)) if collapse else merged
+
+def _batch_stream_records(req: MMMBatchSearchRequest, per_query: List[List[Dict]]):
+    for q, r in zip(req.queries, per_query):
+        yield {"query": q, "results": r, "count": len(r)}
+    if req.merged_context:
+        merged = _merge_batch_results(per_query, req.collapse_duplicates)
+        yield {"merged": merged}
+        if merged:
+            for block in _iter_context_blocks(merged):
+                yield {"context": block}
+
+@app.post("/api/mmm/search/batch")
+async def mmm_batch_search_endpoint(req: MMMBatchSearchRequest, api_key: str = Depends(verify_api_key)):
+    """Recherche de plusieurs requêtes en un appel (un seul lot d'embeddings)."""
+    per_query = await _mmm_batch_search(req)
+    if req.stream:
+        return _stream_records(_batch_stream_records(req, per_query), req.stream)
+    response: Dict[str, Any] = {
+        "results": [{"query": q, "results": r, "count": len(r)} for q, r in zip(req.queries, per_query)],
+        "count": sum(len(r) for r in per_query),
+    }
+    if req.merged_context:
+        merged = await run_in_threadpool(_merge_batch_results, per_query, req.collapse_duplicates)
+        response["merged"] = merged
+        response["context"] = _format_context(merged) if merged else ""
+    return response
+
+def _list_archive_files() -> List[str]:
+    """Fichiers d'archives locales (hors fichiers d'index)."""
+    return [f for f in os.listdir(ARCHIVES_DIR) if f.endswith(".json") and f != "mmm_index.json"]
+
+def _iter_archive_records(files: List[str]):
+    """Lit les archives une à une (streaming) : (fichier, mtime, record) ; record None si illisible."""
+    for filename in files:
+        filepath = os.path.join(ARCHIVES_DIR, filename)
+        try:
+            mtime = os.stat(filepath).st_mtime_ns
+            with open(filepath, "r", encoding="utf-8") as f:
+                yield filename, mtime, json.load(f)
+        except Exception as e:
+            print(f"Reindex error for {filename}: {e}")
+            yield filename, None, None
+
+def mmm_reindex_plan(backend: str, full: bool = False) -> Dict[str, Any]:
+    """Compare les fichiers d'archives au manifeste.
+
+    Un fichier dont le mtime correspond au manifeste (même modèle, même backend)
+    n'est pas relu ; sinon son texte embeddé est re-hashé. Retourne les fichiers
+    à indexer par catégorie, les mtimes à rafraîchir et les orphelins (entrées
+    liées à un fichier local supprimé depuis).
+    """
+    manifest = _mmm_manifest.snapshot()
+    by_file = {row["file"]: row for row in manifest.values() if row["file"]}
+    plan: Dict[str, Any] = {"new": [], "changed": [], "stale": [], "touch": [], "unchanged": 0, "orphans": []}
+    seen = set()
+    with os.scandir(ARCHIVES_DIR) as it:
+        for entry in it:
+            name = entry.name
+            if not name.endswith(".json") or name == "mmm_index.json" or not entry.is_file():
+                continue
+            mtime = entry.stat().st_mtime_ns
+            row = by_file.get(name) or manifest.get(name[:-len(".json")])
+            if row is None:
+                plan["new"].append(name)
+                continue
+            seen.add(row["archive_id"])
+            if full or row["model"] != EMBED_MODEL_KEY or row["backend"] != backend:
+                plan["stale"].append(name)
+            elif row["file_mtime"] == mtime and row["file"] == name:
+                plan["unchanged"] += 1
+            else:
+                record = next(_iter_archive_records([name]))[2]
+                if not isinstance(record, dict):
+                    continue
+                chunk_hash = _chunk_hash(_build_chunk_text(record))
+                if chunk_hash == row["chunk_hash"]:
+                    plan["touch"].append((row["archive_id"], chunk_hash, name, mtime))
+                    plan["unchanged"] += 1
+                else:
+                    plan["changed"].append(name)
+    # Orphelin : archive liée à un fichier local qui a disparu (un push seul n'a pas de fichier)
+    plan["orphans"] = [a for a, row in manifest.items() if a not in seen and row["file"]]
+    plan["backends"] = {a: manifest[a]["backend"] for a in plan["orphans"]}
+    return plan
+
+def _reindex_plan_summary(plan: Dict[str, Any], sample: int = 20) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"unchanged": plan["unchanged"], "mtime_refreshed": len(plan["touch"])}
+    for key in ("new", "changed", "stale", "orphans"):
+        summary[key] = len(plan[key])
+        if plan[key]:
+            summary[f"{key}_sample"] = [name[:-len(".json")] if name.endswith(".json") else name
+                                        for name in plan[key][:sample]]
+    summary["to_index"] = summary["new"] + summary["changed"] + summary["stale"]
+    return summary
+
+_reindex_progress: Dict[str, Any] = {"running": False}
+
+def mmm_reindex(files: List[str], backend: str, plan: Optional[Dict[str, Any]] = None) -> int:
+    """Ré-indexe des archives par lots de EMBED_BATCH_SIZE, en publiant la progression.
+
+    Avec un plan (mmm_reindex_plan) : retire aussi les orphelins et rafraîchit
+    les mtimes des archives inchangées.
+    """
+    total = len(files)
+    _reindex_progress.update({
+        "running": True, "backend": backend, "total": total, "processed": 0, "indexed": 0, "removed": 0,
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(), "finished_at": None,
+    })
+    batch: List[Tuple[str, int, Dict]] = []
+    processed = indexed = removed = 0
+    try:
+        if plan is not None:
+            if plan["touch"]:
+                _mmm_manifest.touch(plan["touch"])
+            if plan["orphans"]:
+                removed = len(mmm_remove_records(plan["orphans"], plan["backends"]))
+                _reindex_progress["removed"] = removed
+                print(f"MMM: removed {removed} orphaned archives from the index")
+        for filename, mtime, record in _iter_archive_records(files):
+            processed += 1
+            if isinstance(record, dict):
+                batch.append((filename, mtime, record))
+            if len(batch) >= EMBED_BATCH_SIZE or processed == total:
+                if batch:
+                    try:
+                        indexed += mmm_index_records([dict(r, local_file=f) for f, _, r in batch])
+                        _mmm_manifest.touch([
+                            (r.get("archive_id") or f[:-len(".json")], _chunk_hash(_build_chunk_text(r)), f, m)
+                            for f, m, r in batch
+                        ])
+                    except Exception as e:
+                        print(f"Reindex batch error: {e}")
+                    batch = []
+                _reindex_progress.update({"processed": processed, "indexed": indexed})
+                print(f"MMM: reindex progress {processed}/{total} ({indexed} indexed)")
+    finally:
+        _reindex_progress.update({
+            "running": False, "processed": processed, "indexed": indexed, "removed": removed,
+            "finished_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        })
+    print(f"MMM: re-indexed {indexed}/{total} archives via {backend}")
+    return indexed
 
 @app.post("/api/mmm/index")
-async def mmm_index_endpoint(background_tasks: BackgroundTasks, api_key: str = Depends(verify_api_key)):
-    """Re-indexe toutes les archives locales dans Pinecone (ou JSON fallback)."""
-    files = [f for f in os.listdir(ARCHIVES_DIR) if f.endswith(".json") and f != "mmm_index.json"]
-    pc_index = _get_pinecone_index()
-    backend = "pinecone" if pc_index is not None else "json-fallback"
-    if not files:
-        return {"message": "No local archives to index", "indexed": 0, "backend": backend}
-    def _reindex_all():
-        count = 0
-        for filename in files:
-            filepath = os.path.join(ARCHIVES_DIR, filename)
-            try:
-                with open(filepath, "r", encoding="utf-8") as f:
-                    record = json.load(f)
-                if mmm_index_record(record):
-                    count += 1
-            except Exception as e:
-                print(f"Reindex error for {filename}: {e}")
-        print(f"MMM: re-indexed {count}/{len(files)} archives via {backend}")
-    background_tasks.add_task(_reindex_all)
-    return {"message": f"Re-indexing {len(files)} archives in background via {backend}", "total": len(files), "backend": backend}
+async def mmm_index_endpoint(background_tasks: BackgroundTasks, dry_run: bool = False, full: bool = False,
+                             api_key: str = Depends(verify_api_key)):
+    """Re-indexe les archives locales nouvelles ou modifiées (manifeste d'indexation).
+
+    dry_run=true : retourne seulement le diff. full=true : ré-indexe tout.
+    """
+    if _reindex_progress["running"]:
+        return {"message": "Re-indexing already in progress", "progress": dict(_reindex_progress)}
+    backend = _mmm_backend_name()
+    plan = await run_in_threadpool(mmm_reindex_plan, backend, full)
+    summary = _reindex_plan_summary(plan)
+    if dry_run:
+        return {"message": "Dry run — nothing indexed", "backend": backend, "diff": summary}
+    files = plan["new"] + plan["changed"] + plan["stale"]
+    if not files and not plan["orphans"] and not plan["touch"]:
+        return {"message": "Index up to date", "indexed": 0, "backend": backend, "diff": summary}
+    _reindex_progress["running"] = True
+    background_tasks.add_task(mmm_reindex, files, backend, plan)
+    return {"message": f"Re-indexing {len(files)} archives in background via {backend}",
+            "total": len(files), "backend": backend, "diff": summary}
+
+@app.get("/api/mmm/index")
+async def mmm_index_status(api_key: str = Depends(verify_api_key)):
+    """Progression du dernier re-indexage."""
+    return dict(_reindex_progress)
+
+@app.get("/api/mmm/jobs")
+async def mmm_jobs_status(api_key: str = Depends(verify_api_key)):
+    """État de la file d'indexation MMM : profondeur, débit, erreurs récentes."""
+    return await run_in_threadpool(_mmm_jobs.stats)
 
 @app.get("/api/mmm/stats")
 async def mmm_stats(api_key: str = Depends(verify_api_key)):
-    """Statistiques de l'index MMM (Pinecone ou JSON fallback)."""
+    """Statistiques de l'index MMM (Pinecone, local-ivf ou JSON fallback)."""
+    if MMM_BACKEND == "local-ivf":
+        entries = _mmm_ivf.entries()
+        sources = {}
+        for entry in entries:
+            s = entry.get("source", "Unknown")
+            sources[s] = sources.get(s, 0) + 1
+        return {
+            "backend": "local-ivf",
+            "total_indexed": len(entries),
+            "sources": sources,
+            "store_dir": MMM_IVF_DIR,
+            "ivf": _mmm_ivf.stats(),
+            "embed_model": EMBED_MODEL,
+            "embed_dimension": EMBED_DIMENSION,
+        }
     pc_index = _get_pinecone_index()
     if pc_index is not None:
         try:
             stats = pc_index.describe_index_stats()
+            _pinecone_breaker.success()
             return {
                 "backend": "pinecone",
                 "index_name": PINECONE_INDEX_NAME,
@@ -604,9 +3998,10 @@ async def mmm_stats(api_key: str = Depends(verify_api_key)):
                 "embed_model": EMBED_MODEL,
             }
         except Exception as e:
+            _pinecone_breaker.failure(e)
             print(f"Pinecone stats error: {e}")
     # Fallback JSON
-    index = _load_mmm_index()
+    index = _mmm_store.entries()
     sources = {}
     for entry in index:
         s = entry.get("source", "Unknown")
@@ -615,31 +4010,66 @@ async def mmm_stats(api_key: str = Depends(verify_api_key)):
         "backend": "json-fallback",
         "total_indexed": len(index),
         "sources": sources,
-        "index_file": MMM_INDEX_FILE,
+        "store_dir": MMM_STORE_DIR,
+        "quantization": _mmm_store.quantization,
         "embed_model": EMBED_MODEL,
+        "embed_dimension": EMBED_DIMENSION,
     }
 
+def _iter_archive_rows(limit: Optional[int], cursor: Optional[str], order: str, source: Optional[str],
+                      action: Optional[str], date_from: Optional[str], date_to: Optional[str]):
+    """Lignes de l'index lues par pages (keyset) : mémoire constante quel que soit le volume."""
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = ARCHIVES_STREAM_PAGE if remaining is None else min(ARCHIVES_STREAM_PAGE, remaining)
+        page = _archive_index.query(page_size, cursor, order, source, action, date_from, date_to)
+        yield from page
+        if len(page) < page_size:
+            return
+        if remaining is not None:
+            remaining -= len(page)
+        cursor = _ArchiveIndex.encode_cursor(page[-1])
+
 @app.get("/api/archives", response_model=List[dict])
-async def list_archives(api_key: str = Depends(verify_api_key)):
-    archives = []
+async def list_archives(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    source: Optional[str] = None,
+    action: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fmt: str = Query("json", alias="format", pattern="^(json|ndjson|sse)$"),
+    api_key: str = Depends(verify_api_key),
+):
+    """Liste les archives depuis l'index de métadonnées, triées par archived_at.
+
+    json : page de `limit` archives (défaut 100, max 1000) ; page suivante :
+    rappeler avec cursor = en-tête X-Next-Cursor.
+    ndjson / sse : flux de toutes les archives correspondantes (ou des `limit` premières).
+    """
+    if cursor:
+        try:
+            _ArchiveIndex.decode_cursor(cursor)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    if fmt != "json":
+        return _stream_records(_iter_archive_rows(limit, cursor, order, source, action, date_from, date_to), fmt)
+    limit = limit or 100
+    if limit > 1000:
+        raise HTTPException(status_code=422, detail="limit must be <= 1000 (use format=ndjson to stream more)")
     try:
-        for filename in sorted(os.listdir(ARCHIVES_DIR), reverse=True):
-            if filename.endswith(".json"):
-                filepath = os.path.join(ARCHIVES_DIR, filename)
-                try:
-                    with open(filepath, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                    archives.append({
-                        "archive_id": data.get("archive_id", filename.replace(".json", "")),
-                        "title": data.get("title", "Untitled"),
-                        "source": data.get("source", "Unknown"),
-                        "action": data.get("action", "archive"),
-                        "archived_at": data.get("archived_at", ""),
-                    })
-                except Exception:
-                    pass
+        archives = await run_in_threadpool(
+            _archive_index.query, limit + 1, cursor, order, source, action, date_from, date_to
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if len(archives) > limit:
+        archives = archives[:limit]
+        response.headers["X-Next-Cursor"] = _ArchiveIndex.encode_cursor(archives[-1])
     return archives
 
 
@@ -805,3 +4235,76 @@ async def test_page():
 </body>
 </html>"""
     return html
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="YOS Endpoint — maintenance CLI",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python yos_endpoint.py migrate-json
+  python yos_endpoint.py compact
+  python yos_endpoint.py rebuild-archives-index
+  python yos_endpoint.py migrate-blobs
+  python yos_endpoint.py reindex --dry-run
+  python yos_endpoint.py quantization-report --sample 500
+  python yos_endpoint.py sign-archives
+        """
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    # migrate-json
+    subparsers.add_parser("migrate-json", help="Import MMM_INDEX_FILE into the binary MMM store")
+
+    # compact
+    subparsers.add_parser("compact", help="Rewrite the active local MMM store without dead rows")
+
+    # rebuild-archives-index
+    subparsers.add_parser("rebuild-archives-index", help="Rebuild the /api/archives metadata index from files")
+
+    # migrate-blobs
+    subparsers.add_parser("migrate-blobs", help="Move inline verbatims into the compressed blob store")
+
+    # reindex
+    reindex_parser = subparsers.add_parser("reindex", help="Index new/changed archives and drop orphans (manifest)")
+    reindex_parser.add_argument("--dry-run", action="store_true", help="Print the diff without indexing")
+    reindex_parser.add_argument("--full", action="store_true", help="Re-index every archive")
+
+    # sign-archives
+    subparsers.add_parser("sign-archives", help="Add existing archives to the near-duplicate (MinHash/LSH) index")
+
+    # quantization-report
+    quant_parser = subparsers.add_parser("quantization-report",
+                                         help="Compare recall@k and latency of float32/float16/int8 local scoring")
+    quant_parser.add_argument("--sample", type=int, default=200, help="Number of query vectors")
+    quant_parser.add_argument("--top-k", type=int, default=10)
+
+    args = parser.parse_args()
+
+    if args.command == "migrate-json":
+        count = _mmm_store.migrate_json()
+        print(f"Migrated {count} entries — {_mmm_store.count()} live vectors in {MMM_STORE_DIR}")
+    elif args.command == "compact":
+        (_mmm_ivf if MMM_BACKEND == "local-ivf" else _mmm_store).compact()
+    elif args.command == "rebuild-archives-index":
+        print(f"Indexed {_archive_index.rebuild()} archives in {ARCHIVES_INDEX_DB}")
+    elif args.command == "migrate-blobs":
+        converted, skipped = migrate_archives_to_blobs()
+        print(f"Converted {converted} archives to blobs in {BLOBS_DIR} ({skipped} skipped)")
+    elif args.command == "reindex":
+        backend = _mmm_backend_name()
+        plan = mmm_reindex_plan(backend, args.full)
+        print(json.dumps(_reindex_plan_summary(plan), indent=2, ensure_ascii=False))
+        if not args.dry_run:
+            mmm_reindex(plan["new"] + plan["changed"] + plan["stale"], backend, plan)
+    elif args.command == "sign-archives":
+        signed, linked = sign_archives()
+        print(f"Signed {signed} archives in {NEAR_DUP_DB} ({linked} linked to a near-duplicate)")
+    elif args.command == "quantization-report":
+        store = _mmm_ivf if MMM_BACKEND == "local-ivf" else _mmm_store
+        print(json.dumps(mmm_quantization_report(store, args.sample, args.top_k), indent=2))
+    else:
+        parser.print_help()